@@ -0,0 +1,73 @@
+"""
+So sánh auto_crop cũ (np.array + np.argwhere) với alpha_bbox (getbbox trên band alpha)
+trên ảnh RGBA lớn: thời gian và peak RSS, mỗi phép đo trong một process riêng.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_auto_crop
+"""
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from benchmarks.memory import peak_rss_kb, reset_peak_rss
+
+SIZES = [(2000, 1500), (4000, 3000), (6000, 4000)]
+MODES = ["argwhere", "getbbox", "getbbox_t10"]
+REPEAT = 3
+
+
+def cutout(size):
+    """Ảnh giả lập output rembg: món đồ đặc ở giữa + halo alpha thấp xung quanh."""
+    w, h = size
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((w // 20, h // 20, w - w // 20, h - h // 20), fill=(200, 200, 200, 6))
+    draw.ellipse((w // 5, h // 6, w * 4 // 5, h * 5 // 6), fill=(40, 60, 120, 255))
+    return img
+
+
+def legacy_bbox(img):
+    alpha = np.array(img)[:, :, 3]
+    coords = np.argwhere(alpha > 0)
+    if coords.size == 0:
+        return None
+    y_min, x_min = coords.min(axis=0)
+    y_max, x_max = coords.max(axis=0)
+    return (int(x_min), int(y_min), int(x_max) + 1, int(y_max) + 1)
+
+
+def worker(mode, width, height):
+    from services.visualizer import alpha_bbox
+
+    img = cutout((width, height))
+    reset_peak_rss()
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        if mode == "argwhere":
+            bbox = legacy_bbox(img)
+        elif mode == "getbbox":
+            bbox = alpha_bbox(img, 0)
+        else:
+            bbox = alpha_bbox(img, 10)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    print(f"{elapsed * 1000:.1f} {(peak_rss_kb() - baseline) / 1024:.1f} {bbox}")
+
+
+def main():
+    print(f"{'size':>10} {'mode':>12} {'ms':>8} {'peak RSS +MB':>13}  bbox")
+    for width, height in SIZES:
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_auto_crop", "--worker", mode, str(width), str(height)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split(maxsplit=2)
+            print(f"{width}x{height:<5} {mode:>12} {out[0]:>8} {out[1]:>13}  {out[2].strip()}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        main()
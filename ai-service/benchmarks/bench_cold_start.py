@@ -0,0 +1,94 @@
+"""
+Cold start của service: thời gian từ lúc chạy uvicorn tới /health đầu tiên trả 200,
+tới /ready báo sẵn sàng (nếu có), và tới /visualize đầu tiên xong (kèm Server-Timing).
+/visualize được gửi ngay sau /health đầu tiên (--wait-ready: chờ /ready trước).
+Ảnh món đồ được phục vụ bởi một HTTP server cục bộ.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_cold_start [--runs 3] [--wait-ready]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks import image_server
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, started, timeout=120, accept=lambda r: r.status_code == 200):
+    while time.perf_counter() - started < timeout:
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code == 404:
+                return None  # Phiên bản chưa có endpoint này
+            if accept(response):
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def run_once(image_port, wait_ready):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "THUMBNAIL_CACHE_DIR": "", "PROFILE_SAMPLE_RATE": "0"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        health = wait_for(f"{base}/health", started)
+        ready = wait_for(f"{base}/ready", started) if wait_ready else None
+        body = {
+            "items": [
+                {"image_url": f"http://127.0.0.1:{image_port}/{i}.jpg", "category": category}
+                for i, category in enumerate(["Áo", "Quần", "Giày"])
+            ],
+            "outfit_name": "Cold start",
+        }
+        visualize_started = time.perf_counter()
+        response = requests.post(f"{base}/visualize", json=body, timeout=300)
+        visualize = time.perf_counter() - started
+        if not wait_ready:
+            ready = wait_for(f"{base}/ready", started)
+        return {
+            "health": health,
+            "ready": ready,
+            "visualize": visualize,
+            "visualize_request": time.perf_counter() - visualize_started,
+            "server_timing": response.headers.get("Server-Timing", ""),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--wait-ready", action="store_true")
+    args = parser.parse_args()
+
+    image_port = image_server.start()
+    fmt = lambda value: f"{value:.2f}" if value is not None else "-"
+    print(f"{'run':>3} {'health s':>9} {'ready s':>8} {'visualize s':>12} {'request s':>10}  server-timing")
+    for run in range(1, args.runs + 1):
+        result = run_once(image_port, args.wait_ready)
+        print(
+            f"{run:>3} {fmt(result['health']):>9} {fmt(result['ready']):>8} "
+            f"{fmt(result['visualize']):>12} {fmt(result['visualize_request']):>10}  {result['server_timing']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Độ chính xác và tốc độ của engine màu nội bộ (services/colors.py).
+
+Mặc định dùng bộ mẫu tổng hợp có nhãn (món đồ nhiều sắc độ, có đổ bóng, nhiễu,
+nền trơn). Có thể chạy trên bộ ảnh thật đã gán nhãn:
+    python -m benchmarks.bench_colors --samples thư_mục
+trong đó thư_mục chứa ảnh và labels.json dạng {"ten_anh.jpg": ["Đen", "Trắng"], ...}.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_colors
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from services.colors import extract_colors
+
+# Sắc độ thực tế (khác với sắc độ mẫu trong PALETTE) -> nhãn trong bảng 12 màu
+SHADES = [
+    ((15, 15, 15), "Đen"), ((45, 42, 48), "Đen"),
+    ((250, 250, 248), "Trắng"), ((238, 236, 228), "Trắng"),
+    ((105, 105, 110), "Xám"), ((160, 162, 165), "Xám"), ((60, 62, 66), "Xám"),
+    ((215, 195, 160), "Be"), ((195, 180, 145), "Be"),
+    ((125, 80, 45), "Nâu"), ((90, 60, 40), "Nâu"), ((165, 115, 75), "Nâu"),
+    ((235, 200, 50), "Vàng"), ((215, 175, 60), "Vàng"),
+    ((235, 120, 40), "Cam"), ((210, 95, 35), "Cam"),
+    ((185, 25, 35), "Đỏ(Red)"), ((120, 20, 35), "Đỏ(Red)"), ((215, 45, 50), "Đỏ(Red)"),
+    ((235, 140, 170), "Hồng"), ((215, 70, 130), "Hồng"),
+    ((110, 55, 150), "Tím"), ((170, 140, 200), "Tím"),
+    ((35, 70, 165), "Xanh dương"), ((30, 40, 70), "Xanh dương"), ((110, 160, 210), "Xanh dương"),
+    ((80, 110, 150), "Xanh dương"),
+    ((45, 125, 65), "Xanh lá"), ((85, 100, 55), "Xanh lá"), ((130, 185, 130), "Xanh lá"),
+]
+BACKGROUNDS = [(250, 250, 250), (236, 236, 236), (244, 240, 232)]
+
+
+def synthetic_item(rng):
+    """Trả về (bytes JPEG, nhãn) cho một món đồ giả lập."""
+    w, h = 900, 1200
+    background = BACKGROUNDS[rng.integers(len(BACKGROUNDS))]
+    primary, label = SHADES[rng.integers(len(SHADES))]
+    labels = [label]
+    img = Image.new("RGB", (w, h), background)
+    draw = ImageDraw.Draw(img)
+    shape = rng.integers(3)
+    box = (int(w * 0.18), int(h * 0.15), int(w * 0.82), int(h * 0.88))
+    if shape == 0:
+        draw.rectangle(box, fill=primary)
+    elif shape == 1:
+        draw.ellipse(box, fill=primary)
+    else:
+        # Dáng áo thun: thân + tay áo
+        draw.polygon([
+            (w * 0.3, h * 0.15), (w * 0.7, h * 0.15), (w * 0.92, h * 0.35), (w * 0.78, h * 0.42),
+            (w * 0.72, h * 0.35), (w * 0.72, h * 0.88), (w * 0.28, h * 0.88), (w * 0.28, h * 0.35),
+            (w * 0.22, h * 0.42), (w * 0.08, h * 0.35),
+        ], fill=primary)
+
+    # 1/4 số mẫu dáng chữ nhật có sọc màu thứ hai chiếm khoảng 40% diện tích
+    if shape == 0 and rng.random() < 0.25:
+        secondary, second_label = SHADES[rng.integers(len(SHADES))]
+        if second_label != label:
+            for y in range(box[1], box[3], 60):
+                draw.rectangle((box[0], y, box[2], min(y + 24, box[3])), fill=secondary)
+            labels.append(second_label)
+
+    # Đổ bóng theo chiều dọc + nhiễu vải + mờ nhẹ như ảnh chụp
+    pixels = np.asarray(img).astype(np.float32)
+    shade = np.linspace(1.08, 0.9, h, dtype=np.float32)[:, None, None]
+    pixels = pixels * shade + rng.normal(0, 6, pixels.shape)
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(1.2))
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=88)
+    return buffered.getvalue(), labels
+
+
+def load_samples(directory):
+    with open(os.path.join(directory, "labels.json"), encoding="utf-8") as f:
+        labels = json.load(f)
+    for name, colors in labels.items():
+        with open(os.path.join(directory, name), "rb") as f:
+            yield f.read(), colors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", help="Thư mục ảnh có labels.json")
+    parser.add_argument("--count", type=int, default=300, help="Số mẫu tổng hợp")
+    args = parser.parse_args()
+
+    if args.samples:
+        samples = list(load_samples(args.samples))
+    else:
+        rng = np.random.default_rng(7)
+        samples = [synthetic_item(rng) for _ in range(args.count)]
+
+    timings, top1, tp, fp, fn = [], 0, 0, 0, 0
+    confusion = {}
+    for data, labels in samples:
+        start = time.perf_counter()
+        predicted = extract_colors(data)
+        timings.append((time.perf_counter() - start) * 1000)
+        if predicted and predicted[0] in labels:
+            top1 += 1
+        else:
+            key = (labels[0], predicted[0] if predicted else "-")
+            confusion[key] = confusion.get(key, 0) + 1
+        tp += len(set(predicted) & set(labels))
+        fp += len(set(predicted) - set(labels))
+        fn += len(set(labels) - set(predicted))
+
+    n = len(samples)
+    timings = np.array(timings)
+    print(f"samples: {n}")
+    print(f"top-1 accuracy (màu chính nằm trong nhãn): {top1 / n:.1%}")
+    print(f"precision: {tp / max(1, tp + fp):.1%}  recall: {tp / max(1, tp + fn):.1%}")
+    print(f"time per image: mean {timings.mean():.2f} ms, p95 {np.percentile(timings, 95):.2f} ms")
+    if confusion:
+        print("nhầm lẫn thường gặp (nhãn -> dự đoán):")
+        for (label, predicted), count in sorted(confusion.items(), key=lambda kv: -kv[1])[:8]:
+            print(f"  {label} -> {predicted}: {count}")
+
+
+if __name__ == "__main__":
+    main()
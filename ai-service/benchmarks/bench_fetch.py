@@ -0,0 +1,62 @@
+"""
+Tải ảnh món đồ cho một moodboard: tuần tự, mỗi ảnh một kết nối mới (cách cũ, requests.get)
+so với fetcher.fetch_all (song song, session keep-alive dùng chung, mỗi URL tải một lần).
+Ảnh được phục vụ bởi HTTP server cục bộ có độ trễ giả lập.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_fetch [--latency 0.3] [--rounds 5]
+"""
+import argparse
+import itertools
+import statistics
+import time
+
+import requests
+
+from benchmarks import image_server
+from services.fetcher import fetch_all
+
+# (số món, số URL khác nhau): outfit có thể lặp lại cùng một ảnh
+BOARDS = [(3, 3), (5, 4), (8, 8)]
+
+
+def serial(urls):
+    results = {}
+    for url in urls:
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        results[url] = response.content
+    return results
+
+
+def timed(fn, urls, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        results = fn(urls)
+        samples.append(time.perf_counter() - started)
+        assert all(results.get(url) for url in urls)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3, help="Độ trễ giả lập của server (giây)")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    port = image_server.start(latency=args.latency)
+    counter = itertools.count()
+    print(f"Độ trễ server {args.latency:g} s, median của {args.rounds} lần")
+    print(f"{'items':>5} {'unique':>6} {'serial s':>9} {'fetch_all s':>12} {'speedup':>8}")
+    for items, unique in BOARDS:
+        def board():
+            # URL riêng cho mỗi cách tải: không cách nào hưởng lợi từ lần tải của cách kia
+            n = next(counter)
+            return [f"http://127.0.0.1:{port}/{n}-{i % unique}.jpg" for i in range(items)]
+
+        serial_s = timed(serial, board(), args.rounds)
+        pooled_s = timed(fetch_all, board(), args.rounds)
+        print(f"{items:>5} {unique:>6} {serial_s:>9.3f} {pooled_s:>12.3f} {serial_s / pooled_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
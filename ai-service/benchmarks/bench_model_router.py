@@ -0,0 +1,91 @@
+"""
+Throughput của ModelRouter với backend giả lập (FakeModel có quota thật theo cửa sổ
+trượt 1 giây, vượt thì trả 429): một key so với nhiều key, failover sang tầng nhẹ khi
+tầng chính luôn bị 429, và phân bổ lệnh gọi theo trọng số key.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_model_router [--duration 5] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from services.model_backends import FakeModel
+from services.model_router import ModelRouter, Target
+from services.scheduler import QuotaExceededError, QuotaScheduler
+
+QUOTA_PER_SECOND = 5  # Quota giả của mỗi cặp key/model
+PROMPT = "item_ids\n i1|Áo|Đen\n i2|Quần|Xanh"
+
+# (tên, trọng số các key, tầng model: list [(model, tỉ lệ 429 chèn thêm)])
+SCENARIOS = [
+    ("1 key, flash", [1], [[("flash", 0.0)]]),
+    ("3 keys, flash", [1, 1, 1], [[("flash", 0.0)]]),
+    ("3 keys, flash 429 > lite", [1, 1, 1], [[("flash", 1.0)], [("lite", 0.0)]]),
+    ("2 keys 3:1, flash", [3, 1], [[("flash", 0.0)]]),
+]
+
+
+def build_router(key_weights, tiers, seed):
+    routes = {"suggest": []}
+    for tier in tiers:
+        entries = []
+        for model_name, rate_429 in tier:
+            for index, weight in enumerate(key_weights, 1):
+                model = FakeModel(
+                    latency="lognormal:0.05:0.3", rate_429=rate_429, retry_after=1.0,
+                    seed=seed + index, rpm=QUOTA_PER_SECOND, quota_window=1.0,
+                )
+                target = Target(f"key{index}", None, model_name, model=model)
+                target.scheduler = QuotaScheduler(QUOTA_PER_SECOND * 60, 1)
+                entries.append((target, weight))
+        routes["suggest"].append(entries)
+    return ModelRouter(routes, rng=random.Random(seed))
+
+
+async def run_scenario(router, concurrency, duration):
+    latencies, quota_errors = [], 0
+    stop_at = time.monotonic() + duration
+
+    async def call(model):
+        return await model.generate_content_async(PROMPT)
+
+    async def client():
+        nonlocal quota_errors
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                await router.run("suggest", call, deadline=time.monotonic() + 10)
+            except QuotaExceededError:
+                quota_errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, quota_errors, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"Quota giả: {QUOTA_PER_SECOND} req/s mỗi cặp key/model, {args.concurrency} client, {args.duration:g} s mỗi kịch bản")
+    print(f"{'scenario':<26} {'ok':>5} {'quota':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'failover':>9}  calls")
+    for seed, (name, key_weights, tiers) in enumerate(SCENARIOS):
+        router = build_router(key_weights, tiers, seed)
+        latencies, quota_errors, wall = await run_scenario(router, args.concurrency, args.duration)
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000 if latencies else (0, 0)
+        stats = router.stats()
+        calls = " ".join(f"{t['key']}/{t['model']}={t['calls']}" for t in stats["targets"])
+        print(
+            f"{name:<26} {len(latencies):>5} {quota_errors:>6} {len(latencies) / wall:>7.1f} "
+            f"{p50:>8.0f} {p95:>8.0f} {stats['failovers']['suggest']:>9}  {calls}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Đo thời gian nén và kích thước moodboard theo từng định dạng / kích thước.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_moodboard_encode
+"""
+import base64
+import io
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from services.visualizer import create_moodboard, encode_image
+
+SIZES = [(800, 1000), (600, 750), (400, 500)]
+OPTIONS = [("PNG", None), ("JPEG", 85), ("JPEG", 70), ("WEBP", 80), ("WEBP", 60)]
+REPEAT = 5
+
+
+def synthetic_photo(seed, size=(1600, 2000)):
+    """Ảnh giả lập ảnh chụp sản phẩm: nền sáng, mảng màu có texture."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = np.full((h, w, 3), 235, dtype=np.uint8)
+    color = rng.integers(30, 220, 3)
+    y0, y1, x0, x1 = h // 6, h * 5 // 6, w // 5, w * 4 // 5
+    noise = rng.normal(0, 18, (y1 - y0, x1 - x0, 3))
+    base[y0:y1, x0:x1] = np.clip(color + noise, 0, 255).astype(np.uint8)
+    img = Image.fromarray(base).filter(ImageFilter.GaussianBlur(1))
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=90)
+    return buffered.getvalue()
+
+
+def main():
+    items = [{"image_url": f"mem://{i}.jpg", "category": "Áo"} for i in range(4)]
+    images = {item["image_url"]: synthetic_photo(i) for i, item in enumerate(items)}
+
+    print(f"{'size':>10} {'format':>6} {'q':>4} {'encode ms':>10} {'bytes':>10} {'base64':>10}")
+    for width, height in SIZES:
+        board = create_moodboard(items, width=width, height=height, images=images)
+        for fmt, quality in OPTIONS:
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                data, _ = encode_image(board, fmt, quality)
+            elapsed = (time.perf_counter() - start) / REPEAT * 1000
+            encoded = len(base64.b64encode(data))
+            print(f"{width}x{height:<5} {fmt:>6} {quality or '-':>4} {elapsed:>10.1f} {len(data):>10} {encoded:>10}")
+
+
+if __name__ == "__main__":
+    main()
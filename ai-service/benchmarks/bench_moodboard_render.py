@@ -0,0 +1,112 @@
+"""
+Đo peak RSS và thời gian ghép moodboard 2, 4, 8 món từ ảnh 12 MP:
+compositor cũ (giải mã full + LANCZOS + frame riêng) so với compositor hiện tại
+(draft JPEG + cache thumbnail trên đĩa, lần đầu và lần sau).
+Mỗi phép đo chạy trong một process riêng để peak RSS không lẫn nhau.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_moodboard_render
+"""
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.memory import peak_rss_kb, reset_peak_rss
+
+COUNTS = [2, 4, 8]
+MODES = ["legacy", "cold", "warm"]
+SOURCE_SIZE = (4000, 3000)  # 12 MP
+
+
+def synthetic_photo(seed):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (SOURCE_SIZE[1] // 50, SOURCE_SIZE[0] // 50, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize(SOURCE_SIZE, Image.Resampling.BILINEAR)
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=90)
+    return buffered.getvalue()
+
+
+def legacy_create_moodboard(items, images, width=800, height=1000):
+    """Bản sao compositor trước đây, dùng làm mốc so sánh."""
+    canvas = Image.new("RGB", (width, height), (255, 255, 255))
+    num_items = len(items)
+    if num_items <= 2:
+        cols, rows = 1, num_items
+    elif num_items <= 4:
+        cols, rows = 2, 2
+    else:
+        cols, rows = 2, (num_items + 1) // 2
+    padding = 20
+    cell_w = (width - (cols + 1) * padding) // cols
+    cell_h = (height - (rows + 1) * padding) // rows
+    for idx, item in enumerate(items):
+        r, c = idx // cols, idx % cols
+        img = Image.open(io.BytesIO(images[item["image_url"]])).convert("RGB")
+        img.thumbnail((cell_w - 20, cell_h - 20), Image.Resampling.LANCZOS)
+        x = padding + c * (cell_w + padding) + (cell_w - img.width) // 2
+        y = padding + r * (cell_h + padding) + (cell_h - img.height) // 2
+        frame = Image.new("RGB", (img.width + 4, img.height + 4), (220, 220, 220))
+        frame.paste(img, (2, 2))
+        canvas.paste(frame, (x - 2, y - 2))
+    return canvas
+
+
+def worker(mode, count, source_dir):
+    images = {}
+    for i in range(count):
+        with open(os.path.join(source_dir, f"{i}.jpg"), "rb") as f:
+            images[f"mem://{i}.jpg"] = f.read()
+    items = [{"image_url": url, "category": "Áo"} for url in images]
+    # Import trước khi lấy mốc để chỉ đo bộ nhớ của phần ghép ảnh
+    from services.visualizer import create_moodboard
+    import services.preprocess  # noqa: F401
+    Image.init()
+    reset_peak_rss()
+    baseline = peak_rss_kb()
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        legacy_create_moodboard(items, images)
+    else:
+        create_moodboard(items, images=images)
+    elapsed = time.perf_counter() - start
+
+    peak = peak_rss_kb()
+    print(f"{elapsed * 1000:.0f} {(peak - baseline) / 1024:.1f}")
+
+
+def main():
+    source_dir = tempfile.mkdtemp(prefix="moodboard-src-")
+    cache_dir = tempfile.mkdtemp(prefix="moodboard-thumbs-")
+    for i in range(max(COUNTS)):
+        with open(os.path.join(source_dir, f"{i}.jpg"), "wb") as f:
+            f.write(synthetic_photo(i))
+
+    env = dict(os.environ, THUMBNAIL_CACHE_DIR=cache_dir)
+    print(f"{'items':>5} {'mode':>7} {'render ms':>10} {'peak RSS +MB':>13}")
+    try:
+        for count in COUNTS:
+            shutil.rmtree(cache_dir)
+            os.makedirs(cache_dir)
+            for mode in MODES:
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_moodboard_render", "--worker", mode, str(count), source_dir],
+                    env=env, capture_output=True, text=True, check=True,
+                ).stdout.split()
+                print(f"{count:>5} {mode:>7} {out[0]:>10} {out[1]:>13}")
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        main()
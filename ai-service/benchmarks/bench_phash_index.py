@@ -0,0 +1,73 @@
+"""
+Tốc độ tra cứu HammingIndex (multi-index hashing) với ~100k hash so với quét
+tuần tự bằng NumPy, và thời gian tính pHash/dHash cho một ảnh.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_phash_index
+"""
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from services.phash import HammingIndex, image_hashes
+
+SIZE = 100_000
+QUERIES = 2_000
+RADII = [4, 6, 8, 10]
+
+
+def popcount64(values):
+    # Đếm bit từng byte rồi cộng lại (vector hóa, không cần np.bitwise_count)
+    as_bytes = values.view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+
+def main():
+    rng = np.random.default_rng(11)
+    hashes = rng.integers(0, 2 ** 63, SIZE, dtype=np.int64).astype(np.uint64) * 2 + rng.integers(0, 2, SIZE).astype(np.uint64)
+    index = HammingIndex(max_entries=SIZE)
+    start = time.perf_counter()
+    for key, value in enumerate(hashes.tolist()):
+        index.add(key, value)
+    print(f"build {SIZE} entries: {time.perf_counter() - start:.2f} s")
+
+    # Truy vấn = hash có sẵn bị lật ngẫu nhiên vài bit (mô phỏng ảnh gần trùng)
+    targets = rng.integers(0, SIZE, QUERIES)
+    queries = []
+    for target in targets.tolist():
+        flipped = int(hashes[target])
+        for bit in rng.choice(64, rng.integers(0, 6), replace=False).tolist():
+            flipped ^= 1 << bit
+        queries.append(flipped)
+
+    print(f"{'radius':>6} {'index us/query':>15} {'scan us/query':>14} {'recall':>7}")
+    for radius in RADII:
+        start = time.perf_counter()
+        found = [index.search(query, radius) for query in queries]
+        index_us = (time.perf_counter() - start) / QUERIES * 1e6
+
+        start = time.perf_counter()
+        scans = []
+        for query in queries[:200]:
+            distances = popcount64(hashes ^ np.uint64(query))
+            scans.append(set(np.flatnonzero(distances <= radius).tolist()))
+        scan_us = (time.perf_counter() - start) / 200 * 1e6
+
+        recall = np.mean([
+            {key for _, key, _ in matches} == expected
+            for matches, expected in zip(found[:200], scans)
+        ])
+        print(f"{radius:>6} {index_us:>15.1f} {scan_us:>14.1f} {recall:>7.1%}")
+
+    buffered = io.BytesIO()
+    small = rng.integers(0, 255, (60, 80, 3), dtype=np.uint8)
+    Image.fromarray(small).resize((4000, 3000), Image.Resampling.BILINEAR).save(buffered, format="JPEG", quality=90)
+    data = buffered.getvalue()
+    start = time.perf_counter()
+    for _ in range(20):
+        image_hashes(data)
+    print(f"pHash + dHash of a 12 MP JPEG: {(time.perf_counter() - start) / 20 * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
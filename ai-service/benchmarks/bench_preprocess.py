@@ -0,0 +1,108 @@
+"""
+Tiền xử lý ảnh trước khi gửi cho model (preprocess.prepare_image): kích thước payload,
+thời gian giải mã/chuẩn bị và thời gian upload ước tính, so với gửi nguyên ảnh gốc.
+
+Kiểm tra độ ổn định: kết quả phân tích trên ảnh gốc và ảnh đã tiền xử lý phải như nhau.
+- Mặc định: so màu do engine màu nội bộ (phần kết quả /analyze tính tại chỗ) tìm được.
+- --gemini: gọi model thật (cần GEMINI_API_KEY) với cả hai ảnh và so category/màu.
+
+Ảnh mẫu được sinh sẵn (ảnh điện thoại 12MP có EXIF xoay, PNG lớn, JPEG nhỏ);
+--images <thư mục> để dùng ảnh thật.
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_preprocess [--mbps 10] [--images dir] [--gemini]
+"""
+import argparse
+import asyncio
+import io
+import json
+import pathlib
+import statistics
+import time
+
+from PIL import Image
+
+from services.colors import extract_colors
+from services.preprocess import prepare_image
+from tests.utils import garment_photo
+
+ROUNDS = 5
+
+
+def sample_images(directory=None):
+    if directory:
+        return [(path.name, path.read_bytes()) for path in sorted(pathlib.Path(directory).iterdir()) if path.is_file()]
+    return [
+        ("phone 12MP JPEG (EXIF 6)", garment_photo((4032, 3024), (30, 60, 150), "JPEG", orientation=6)),
+        ("PNG 1500x2000", garment_photo((1500, 2000), (180, 30, 40), "PNG")),
+        ("JPEG 800x1000", garment_photo((800, 1000), (20, 20, 20), "JPEG")),
+    ]
+
+
+def median_ms(fn):
+    samples = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def full_decode(data):
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img.convert("RGB")
+
+
+async def model_analysis(blob):
+    from services.analyzer import ANALYZE_PROMPT, extract_json_text, normalize_result
+    from services.model_client import generate_content
+
+    response = await generate_content([ANALYZE_PROMPT, blob], task="analyze")
+    return normalize_result(json.loads(extract_json_text(response.text, "{", "}")))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mbps", type=float, default=10.0, help="Băng thông upload giả định (Mbit/s)")
+    parser.add_argument("--images", help="Thư mục ảnh thật thay cho ảnh sinh sẵn")
+    parser.add_argument("--gemini", action="store_true", help="So kết quả của model thật (tốn quota)")
+    args = parser.parse_args()
+
+    def upload_ms(size):
+        return size * 8 / (args.mbps * 1e6) * 1000
+
+    print(f"Upload giả định {args.mbps:g} Mbit/s, median của {ROUNDS} lần")
+    print(
+        f"{'image':<26} {'orig KB':>8} {'sent KB':>8} {'decode ms':>10} {'prepare ms':>11} "
+        f"{'upload ms':>16} {'colors same':>12}"
+    )
+    stable = True
+    for name, data in sample_images(args.images):
+        prepared = prepare_image(data)
+        decode = median_ms(lambda: full_decode(data))
+        prepare = median_ms(lambda: prepare_image(data))
+        original_colors = extract_colors(data)
+        prepared_colors = extract_colors(prepared["data"])
+        same_colors = original_colors == prepared_colors
+        stable = stable and same_colors
+        print(
+            f"{name[:26]:<26} {len(data) / 1024:>8.0f} {len(prepared['data']) / 1024:>8.0f} {decode:>10.1f} {prepare:>11.1f} "
+            f"{upload_ms(len(data) * 4 / 3):>7.0f} -> {upload_ms(len(prepared['data']) * 4 / 3):>5.0f} "
+            f"{'yes' if same_colors else 'NO':>12}"
+        )
+        if not same_colors:
+            print(f"    colors: {original_colors} -> {prepared_colors}")
+
+        if args.gemini:
+            mime = Image.MIME.get(Image.open(io.BytesIO(data)).format, "image/jpeg")
+            original = asyncio.run(model_analysis({"mime_type": mime, "data": data}))
+            reduced = asyncio.run(model_analysis(prepared))
+            same = original["category"] == reduced["category"] and set(original["color"]) == set(reduced["color"])
+            stable = stable and same
+            print(f"    model: {original['category']} {original['color']} -> {reduced['category']} {reduced['color']}"
+                  f" ({'same' if same else 'DIFFERENT'})")
+
+    print("Kết quả phân tích không đổi sau tiền xử lý" if stable else "CÓ ẢNH CHO KẾT QUẢ KHÁC sau tiền xử lý")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Kích thước prompt /suggest theo số món trong tủ đồ: JSON indent=2 (cách cũ) so với
+bảng gọn (encode_wardrobe), bảng đã cắt theo ngân sách (fit_wardrobe_to_budget) và
+prompt cuối cùng (build_stylist_prompt, gồm cả bước lọc trước tại chỗ), kèm thời gian dựng.
+--gemini: đo thêm độ trễ model thật với prompt cũ và prompt mới (cần GEMINI_API_KEY, tốn quota).
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_prompt_budget [--gemini]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from unittest import mock
+
+from services import config, stylist
+from services.stylist import build_stylist_prompt, encode_wardrobe, estimate_tokens, fit_wardrobe_to_budget
+
+SIZES = [50, 500, 5000]
+ROUNDS = 5
+CONTEXT = ("Minimalist", "Đi làm", "Mát mẻ")
+CATEGORIES = ["Áo", "Quần", "Váy", "Giày", "Túi", "Phụ kiện"]
+COLORS = ["Đen", "Trắng", "Be", "Xanh navy", "Đỏ", "Xám"]
+
+
+def make_wardrobe(size):
+    return [
+        {
+            "id": f"{i:024x}",
+            "name": f"Món đồ số {i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "color": [COLORS[i % len(COLORS)], COLORS[(i * 7) % len(COLORS)]],
+            "tags": ["basic", "cotton", "công sở" if i % 3 else "dạo phố"],
+        }
+        for i in range(size)
+    ]
+
+
+def median_ms(fn):
+    samples = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def legacy_prompt(wardrobe):
+    # Prompt như trước khi có bảng gọn: toàn bộ tủ đồ dạng JSON indent=2, không lọc trước
+    def dump(items, budget_tokens):
+        return json.dumps(items, ensure_ascii=False, indent=2), {}
+
+    with mock.patch.object(stylist, "fit_wardrobe_to_budget", dump), \
+            mock.patch.object(config, "SUGGEST_PREFILTER_THRESHOLD", len(wardrobe)):
+        prompt, _ = build_stylist_prompt(*CONTEXT, wardrobe)
+    return prompt
+
+
+async def model_latency(prompt):
+    from services.model_client import generate_content
+
+    started = time.perf_counter()
+    await generate_content(prompt, task="suggest")
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gemini", action="store_true", help="Đo độ trễ model thật với prompt cũ/mới")
+    args = parser.parse_args()
+
+    budget = config.SUGGEST_WARDROBE_TOKEN_BUDGET
+    print(f"Token ước lượng (~{stylist.CHARS_PER_TOKEN} ký tự/token), ngân sách tủ đồ {budget}, median của {ROUNDS} lần")
+    print(
+        f"{'items':>6} {'json tok':>9} {'table tok':>10} {'budget tok':>11} {'old prompt':>11} {'new prompt':>11} "
+        f"{'fit ms':>7} {'build ms':>9}"
+    )
+    for size in SIZES:
+        wardrobe = make_wardrobe(size)
+        json_tokens = estimate_tokens(json.dumps(wardrobe, ensure_ascii=False, indent=2))
+        table_tokens = estimate_tokens(encode_wardrobe(wardrobe)[0])
+        budget_tokens = estimate_tokens(fit_wardrobe_to_budget(wardrobe, budget)[0])
+        old_prompt = legacy_prompt(wardrobe)
+        new_prompt, _ = build_stylist_prompt(*CONTEXT, wardrobe)
+        fit = median_ms(lambda: fit_wardrobe_to_budget(wardrobe, budget))
+        build = median_ms(lambda: build_stylist_prompt(*CONTEXT, wardrobe))
+        print(
+            f"{size:>6} {json_tokens:>9} {table_tokens:>10} {budget_tokens:>11} {estimate_tokens(old_prompt):>11} "
+            f"{estimate_tokens(new_prompt):>11} {fit:>7.1f} {build:>9.1f}"
+        )
+        if args.gemini:
+            old_latency = asyncio.run(model_latency(old_prompt))
+            new_latency = asyncio.run(model_latency(new_prompt))
+            print(f"    model latency: {old_latency:.2f} s -> {new_latency:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
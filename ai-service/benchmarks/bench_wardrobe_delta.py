@@ -0,0 +1,77 @@
+"""
+Kích thước body và thời gian parse + dựng tủ đồ của /suggest khi gửi toàn bộ
+wardrobe so với gửi snapshot_id + wardrobe_delta (vài món thay đổi).
+Chạy từ thư mục ai-service:  python -m benchmarks.bench_wardrobe_delta
+"""
+import json
+import time
+import warnings
+
+from models.request_models import StylistRequest
+from services.wardrobe_store import WardrobeSnapshots
+
+SIZES = [50, 200, 1000, 5000]
+CHANGED = 3
+ROUNDS = 50
+CONTEXT = {"style": "Minimalist", "occasion": "Đi làm", "weather": "Mát mẻ"}
+
+
+def make_item(i, color="Đen"):
+    return {
+        "id": f"{i:024x}",
+        "name": f"Món đồ số {i}",
+        "category": ["Áo", "Quần", "Giày", "Túi"][i % 4],
+        "color": [color, "Trắng"],
+        "tags": ["basic", "cotton"],
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)  # parse_raw/dict giống code trong main.py
+    print(f"{'items':>6} {'full KB':>8} {'full ms':>8} {'delta KB':>9} {'delta ms':>9}")
+    for size in SIZES:
+        wardrobe = [make_item(i) for i in range(size)]
+        full_body = json.dumps({**CONTEXT, "snapshot_id": "u1", "wardrobe": wardrobe}, ensure_ascii=False).encode("utf-8")
+        delta = {
+            "base_version": 1,
+            "added": [make_item(size)],
+            "changed": [make_item(i, "Be") for i in range(CHANGED)],
+            "removed": [make_item(size - 1)["id"]],
+        }
+        delta_body = json.dumps({**CONTEXT, "snapshot_id": "u1", "wardrobe_delta": delta}, ensure_ascii=False).encode("utf-8")
+
+        store = WardrobeSnapshots(max_entries=ROUNDS + 1, max_bytes=1 << 30)
+
+        def full():
+            request = StylistRequest.parse_raw(full_body)
+            store.put(request.snapshot_id, [item.dict() for item in request.wardrobe])
+
+        # Mỗi vòng delta áp dụng lên một snapshot riêng đang ở version 1
+        for k in range(ROUNDS):
+            store.put(f"s{k}", wardrobe)
+        targets = iter(range(ROUNDS))
+
+        def incremental():
+            request = StylistRequest.parse_raw(delta_body)
+            store.apply(
+                f"s{next(targets)}",
+                base_version=request.wardrobe_delta.base_version,
+                added=[item.dict() for item in request.wardrobe_delta.added],
+                changed=[item.dict() for item in request.wardrobe_delta.changed],
+                removed=request.wardrobe_delta.removed,
+            )
+
+        full_ms = timed(full)
+        delta_ms = timed(incremental)
+        print(f"{size:>6} {len(full_body) / 1024:>8.1f} {full_ms:>8.2f} {len(delta_body) / 1024:>9.1f} {delta_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""HTTP server cục bộ phục vụ ảnh món đồ JPEG cho các benchmark gọi /visualize."""
+import http.server
+import io
+import threading
+import time
+import zlib
+
+from PIL import Image, ImageDraw
+
+
+def render_item(path, size=(600, 800)):
+    # Mỗi path một màu/khối khác nhau (ảnh khác nội dung => không trúng cache theo hash)
+    seed = zlib.crc32(path.encode("utf-8"))
+    background = (245, 245, 245)
+    color = (seed & 0xFF, (seed >> 8) & 0xFF, (seed >> 16) & 0xFF)
+    img = Image.new("RGB", size, background)
+    inset = 60 + (seed >> 24) % 80
+    ImageDraw.Draw(img).rectangle((inset, inset, size[0] - inset, size[1] - inset), fill=color)
+    buffered = io.BytesIO()
+    img.save(buffered, "JPEG", quality=90)
+    return buffered.getvalue()
+
+
+def start(latency=0.0):
+    """
+    Chạy server ở cổng ngẫu nhiên (thread nền); trả về port. GET /<bất kỳ>.jpg -> ảnh JPEG.
+    latency: độ trễ giả lập (giây) trước khi trả lời mỗi request.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            data = render_item(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
@@ -0,0 +1,244 @@
+"""
+Load test end-to-end cho /analyze, /suggest và /visualize với fake model backend
+(MODEL_BACKEND=fake, không cần mạng hay quota) và ảnh từ HTTP server cục bộ.
+
+Mỗi endpoint được chạy ở từng mức concurrency (closed loop: N client, mỗi client gửi
+request kế tiếp ngay khi request trước xong) trong --duration giây; in ra p50/p95/p99,
+throughput, tỉ lệ lỗi và RSS của process service.
+
+Chạy từ thư mục ai-service:
+    python -m benchmarks.load_test --concurrency 1,8,32 --duration 10
+    python -m benchmarks.load_test --json before.json        # lưu kết quả
+    python -m benchmarks.load_test --compare before.json     # so với lần chạy trước (commit khác)
+
+Service được chạy bằng uvicorn trong process riêng, kế thừa biến môi trường hiện tại
+(FAKE_MODEL_LATENCY, FAKE_MODEL_429_RATE, GEMINI_RPM... đặt trước khi chạy để đổi kịch bản).
+"""
+import argparse
+import base64
+import io
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+from benchmarks import image_server
+from benchmarks.memory import process_rss_kb
+
+ENDPOINTS = ["analyze", "suggest", "visualize"]
+
+# Mặc định cho service khi biến môi trường chưa được đặt: quota rộng để đo chính service,
+# không đo token bucket; tắt cache đĩa để các lần chạy không ảnh hưởng nhau
+SERVICE_DEFAULTS = {
+    "GEMINI_RPM": "100000",
+    "GEMINI_BURST": "1000",
+    "GEMINI_MAX_CONCURRENCY": "64",
+    "THUMBNAIL_CACHE_DIR": "",
+    "ANALYZE_CACHE_DB": "",
+    "PROFILE_SAMPLE_RATE": "0",
+    "VISUALIZE_JOB_STORE": "memory",
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service():
+    port = free_port()
+    env = {**SERVICE_DEFAULTS, **os.environ, "MODEL_BACKEND": "fake"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            ready = requests.get(f"{base}/ready", timeout=1)
+            if ready.status_code == 200 or ready.status_code == 404:
+                return process, base
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError("Service exited during startup")
+        time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("Service did not become ready in 120 s")
+
+
+def noise_jpeg(seed, size=256):
+    # Ảnh nhiễu khác nhau cho mỗi request: không trúng cache kết quả lẫn chỉ mục ảnh gần trùng
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (size // 8, size // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).resize((size, size), Image.Resampling.BILINEAR)
+    buffered = io.BytesIO()
+    img.save(buffered, "JPEG", quality=85)
+    return buffered.getvalue()
+
+
+def make_wardrobe(size):
+    categories = ["Áo", "Quần", "Giày", "Túi xách", "Phụ kiện", "Váy"]
+    colors = ["Đen", "Trắng", "Be", "Xanh dương", "Xám", "Nâu"]
+    return [
+        {
+            "id": f"{i:024x}",
+            "name": f"Món đồ {i}",
+            "category": categories[i % len(categories)],
+            "color": [colors[i % len(colors)]],
+            "tags": ["basic"],
+        }
+        for i in range(size)
+    ]
+
+
+def request_factory(endpoint, base, image_port, wardrobe):
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def next_id():
+        with lock:
+            return next(counter)
+
+    def analyze(session):
+        image = base64.b64encode(noise_jpeg(next_id())).decode("ascii")
+        return session.post(f"{base}/analyze", json={"image_base64": image}, timeout=120)
+
+    def suggest(session):
+        # custom_context khác nhau => không bị singleflight gộp với request khác
+        return session.post(f"{base}/suggest", json={
+            "style": "Minimalist",
+            "occasion": "Đi làm",
+            "weather": "Mát mẻ",
+            "custom_context": f"load test #{next_id()}",
+            "wardrobe": wardrobe,
+        }, timeout=120)
+
+    def visualize(session):
+        n = next_id()
+        return session.post(f"{base}/visualize", json={
+            "items": [
+                {"image_url": f"http://127.0.0.1:{image_port}/{n}-{part}.jpg", "category": category}
+                for part, category in enumerate(["Áo", "Quần", "Giày"])
+            ],
+            "outfit_name": f"Load test {n}",
+            "image_format": "JPEG",
+        }, timeout=300)
+
+    return {"analyze": analyze, "suggest": suggest, "visualize": visualize}[endpoint]
+
+
+def run_level(send, concurrency, duration, pid):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    rss_samples = []
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                response = send(session)
+                ok = response.status_code == 200 and response.json().get("success", False)
+            except (requests.RequestException, ValueError):
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    def sample_rss():
+        while time.monotonic() < stop_at:
+            rss = process_rss_kb(pid)
+            if rss is not None:
+                rss_samples.append(rss)
+            time.sleep(0.2)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+        pool.submit(sample_rss)
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    result = {"concurrency": concurrency, "requests": len(latencies), "errors": errors, "seconds": round(wall, 2)}
+    result["throughput"] = round(len(latencies) / wall, 2)
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        result.update(p50_ms=round(p50 * 1000, 1), p95_ms=round(p95 * 1000, 1), p99_ms=round(p99 * 1000, 1))
+    result["rss_mb"] = round(max(rss_samples) / 1024, 1) if rss_samples else None
+    return result
+
+
+def format_row(endpoint, row, baseline=None):
+    def cell(key, width, digits=1):
+        value = row.get(key)
+        text = "-" if value is None else f"{value:.{digits}f}"
+        if baseline and baseline.get(key) and value is not None:
+            text += f" ({(value - baseline[key]) / baseline[key]:+.0%})"
+        return f"{text:>{width}}"
+
+    return (
+        f"{endpoint:<10} {row['concurrency']:>4} {row['requests']:>6} {row['errors']:>5}"
+        f"{cell('throughput', 16, 2)}{cell('p50_ms', 16)}{cell('p95_ms', 16)}{cell('p99_ms', 16)}{cell('rss_mb', 15)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="Số giây cho mỗi mức concurrency")
+    parser.add_argument("--wardrobe", type=int, default=80, help="Số món trong tủ đồ gửi lên /suggest")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để in chênh lệch")
+    args = parser.parse_args()
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            for row in json.load(f)["results"]:
+                baseline[(row["endpoint"], row["concurrency"])] = row
+
+    image_port = image_server.start()
+    process, base = start_service()
+    wardrobe = make_wardrobe(args.wardrobe)
+    results = []
+    try:
+        print(f"{'endpoint':<10} {'conc':>4} {'ok':>6} {'err':>5} {'req/s':>16} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16} {'rss MB':>15}")
+        for endpoint in endpoints:
+            send = request_factory(endpoint, base, image_port, wardrobe)
+            send(requests.Session())  # Làm nóng đường đi của endpoint, không tính vào kết quả
+            for concurrency in levels:
+                row = {"endpoint": endpoint, **run_level(send, concurrency, args.duration, process.pid)}
+                results.append(row)
+                print(format_row(endpoint, row, baseline.get((endpoint, concurrency))), flush=True)
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.json:
+        settings = {key: os.environ.get(key) for key in os.environ if key.startswith(("FAKE_MODEL_", "GEMINI_"))}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "duration": args.duration, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
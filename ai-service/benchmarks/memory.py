@@ -0,0 +1,35 @@
+"""Đo peak RSS của process hiện tại (dùng chung cho các benchmark)."""
+import resource
+
+
+def peak_rss_kb():
+    """VmHWM (Linux) hoặc ru_maxrss."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def process_rss_kb(pid, field="VmRSS"):
+    """RSS (VmRSS) hoặc peak RSS (VmHWM) của process khác, đọc từ /proc; None nếu không đọc được."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Linux >= 4.0: đặt lại VmHWM về RSS hiện tại để chỉ đo phần code phía sau
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
@@ -1,43 +1,254 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
-import re
-from models.request_models import ImageRequest, StylistRequest
-from models.response_models import AnalysisResponse, StylistResponse, VisualizationRequest, VisualizationResponse
-from services.analyzer import analyze_image_with_gemini
-from services.stylist import generate_outfit_suggestions
-from services.visualizer import create_moodboard, pil_to_base64, generate_lookbook_image_v2
+import base64
+import json
+import time
+from models.request_models import ImageRequest, BatchImageRequest, DuplicateCheckRequest, StylistRequest
+from models.response_models import AnalysisResponse, DuplicateCheckResponse, StylistResponse, SuggestedOutfit, VisualizationRequest, VisualizationResponse, VisualizationJobResponse
+from services.analyzer import analyze_image_with_gemini, analyze_image_bytes, analyze_batch, analysis_cache, find_duplicate_clusters, near_duplicate_stats
+from services.stylist import generate_outfit_suggestions, stream_outfit_suggestions
+from services.visualizer import create_moodboard, encode_image, generate_lookbook_image_v2, vision_cache, lookbook_prompt_cache, isolated_cache, get_thumbnail_cache
+from services.fetcher import fetch_all_async
+from services import bg_removal
+from services import admission, config, metrics
+from services.preprocess import ImageTooLarge, InvalidImage
+from services.model_router import router
+from services.scheduler import QuotaExceededError
+from services.singleflight import SingleFlight, request_key
+from services.jobs import QueueFull, create_job_queue
+from services.blob_store import get_blob_store
+from services.colors import color_checker
+from services.wardrobe_store import SnapshotUnknown, wardrobe_snapshots
+from services.warmup import warmup
 
 app = FastAPI(title="OOTDverse AI Service")
 
+# Gộp các request AI trùng nhau đang chạy (double-tap, retry do timeout)
+inflight = SingleFlight()
+
+# Job /visualize chạy nền (POST trả job_id ngay, GET để lấy kết quả)
+visualize_jobs = create_job_queue()
+
+# Giới hạn số request chạy cùng lúc theo endpoint + deadline của client.
+# Thêm trước instrument_requests để request bị từ chối (503) / quá hạn (504) vẫn được đo
+app.add_middleware(admission.AdmissionMiddleware)
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    # Đo thời gian từng bước (span) của request => header Server-Timing + histogram /metrics
+    timings = metrics.start_request()
+    sampled = metrics.profiler.start()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        if sampled is not None:
+            metrics.profiler.stop(sampled, f"{request.method} {request.url.path}")
+    elapsed = time.perf_counter() - start
+
+    # Nhãn theo route template (/visualize/jobs/{job_id}) để không nổ số series
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.http_request_seconds.observe(elapsed, method=request.method, path=path, status=response.status_code)
+    request_length = request.headers.get("content-length")
+    if request_length and request_length.isdigit():
+        metrics.http_request_bytes.inc(int(request_length), path=path)
+    response_length = response.headers.get("content-length")
+    if response_length and response_length.isdigit():
+        metrics.http_response_bytes.inc(int(response_length), path=path)
+
+    if config.SERVER_TIMING:
+        timings["total"] = [elapsed, 1]
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
+def cache_samples(field):
+    caches = {"analyze": analysis_cache, "vision": vision_cache, "lookbook_prompt": lookbook_prompt_cache}
+    thumbnail_cache = get_thumbnail_cache()
+    if thumbnail_cache is not None:
+        caches["thumbnail"] = thumbnail_cache
+    return [({"cache": name}, cache.stats()[field]) for name, cache in caches.items()]
+
+metrics.registry.callback("ootd_cache_hits_total", "Số lần cache trúng", "counter", lambda: cache_samples("hits"))
+metrics.registry.callback("ootd_cache_misses_total", "Số lần cache trượt", "counter", lambda: cache_samples("misses"))
+metrics.registry.callback(
+    "ootd_near_duplicate_hits_total", "Số ảnh /analyze dùng lại kết quả của ảnh gần trùng", "counter",
+    lambda: [({}, near_duplicate_stats()["hits"])]
+)
+metrics.registry.callback(
+    "ootd_singleflight_coalesced_total", "Số request được gộp vào lệnh gọi đang chạy", "counter",
+    lambda: [({}, inflight.stats()["coalesced"])]
+)
+def target_samples(field):
+    return [({"key": t["key"], "model": t["model"]}, t[field]) for t in router.stats()["targets"]]
+
+metrics.registry.callback(
+    "ootd_scheduler_rpm", "Rate hiện tại của QuotaScheduler theo cặp key/model (requests/phút)", "gauge",
+    lambda: target_samples("current_rpm")
+)
+metrics.registry.callback(
+    "ootd_scheduler_waiting", "Số lệnh gọi đang chờ quota theo cặp key/model", "gauge",
+    lambda: target_samples("waiting")
+)
+metrics.registry.callback(
+    "ootd_model_router_calls_total", "Số lệnh gọi model theo cặp key/model", "counter",
+    lambda: target_samples("calls")
+)
+metrics.registry.callback(
+    "ootd_model_router_healthy", "1 nếu cặp key/model không bị tạm ngắt vì lỗi liên tiếp", "gauge",
+    lambda: [(labels, int(value)) for labels, value in target_samples("healthy")]
+)
+metrics.registry.callback(
+    "ootd_model_router_failovers_total", "Số lệnh gọi phải chuyển sang tầng model nhẹ hơn", "counter",
+    lambda: [({"task": task}, count) for task, count in router.stats()["failovers"].items()]
+)
+metrics.registry.callback(
+    "ootd_visualize_jobs_pending", "Số job /visualize chưa xong", "gauge",
+    lambda: [({}, visualize_jobs.stats()["pending"])]
+)
+metrics.registry.callback(
+    "ootd_admission_active", "Số request đang chạy theo endpoint", "gauge",
+    lambda: [({"path": path}, stats["active"]) for path, stats in admission.stats()["endpoints"].items()]
+)
+metrics.registry.callback(
+    "ootd_admission_queued", "Số request đang xếp hàng theo endpoint", "gauge",
+    lambda: [({"path": path}, stats["queued"]) for path, stats in admission.stats()["endpoints"].items()]
+)
+metrics.registry.callback(
+    "ootd_admission_rejected_total", "Số request bị từ chối (503) theo endpoint và lý do", "counter",
+    lambda: [
+        ({"path": path, "reason": reason}, count)
+        for path, stats in admission.stats()["endpoints"].items()
+        for reason, count in stats["rejected"].items()
+    ]
+)
+metrics.registry.callback(
+    "ootd_admission_deadline_exceeded_total", "Số request bị hủy vì quá deadline của client (504)", "counter",
+    lambda: [({"path": path}, count) for path, count in admission.stats()["deadline_exceeded"].items()]
+)
+
+@app.on_event("startup")
+async def start_warm_up():
+    # SDK Gemini + session rembg load ở nền: startup xong ngay, /health trả lời được luôn,
+    # /ready báo khi nào các thành phần đã sẵn sàng
+    if config.WARM_UP_ON_STARTUP:
+        warmup.start()
+
+@app.on_event("shutdown")
+async def stop_background_removal():
+    await warmup.stop()
+    bg_removal.shutdown_pool()
+
+@app.on_event("startup")
+async def start_visualize_jobs():
+    visualize_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_visualize_jobs():
+    await visualize_jobs.stop()
+
 # ... (root and health endpoints)
 
+def render_moodboard(request: VisualizationRequest, items_data, images):
+    """Ghép moodboard và nén theo định dạng/kích thước client yêu cầu; trả về (bytes, mime_type)."""
+    width, height = request.width or 800, request.height or 1000
+    if not (100 <= width <= config.MOODBOARD_MAX_EDGE and 100 <= height <= config.MOODBOARD_MAX_EDGE):
+        raise ValueError(f"Moodboard size must be between 100 and {config.MOODBOARD_MAX_EDGE} pixels")
+    with metrics.span("moodboard"):
+        moodboard_img = create_moodboard(items_data, width=width, height=height, images=images)
+    with metrics.span("encode"):
+        return encode_image(moodboard_img, request.image_format or config.MOODBOARD_FORMAT, request.image_quality)
+
+async def build_visualization(request: VisualizationRequest):
+    if request.delivery not in ("inline", "url"):
+        raise ValueError(f"Unsupported delivery: {request.delivery}")
+
+    # 1. Tạo moodboard từ ảnh thật (Dùng Grid layout đã ổn định)
+    items_data = [item.dict() for item in request.items]
+    # Tải song song toàn bộ ảnh một lần, dùng chung cho moodboard và lookbook
+    with metrics.span("fetch"):
+        images = await fetch_all_async([item["image_url"] for item in items_data])
+    image_data, mime_type = await run_in_threadpool(render_moodboard, request, items_data, images)
+    
+    result = {"success": True, "image_mime_type": mime_type}
+    if request.delivery == "url":
+        # Lưu vào kho blob theo nội dung, client tải qua GET /blobs/{name} (có ETag)
+        store = get_blob_store()
+        with metrics.span("blob_store"):
+            name, etag = await run_in_threadpool(store.put, image_data, mime_type)
+        result["image_url"] = f"{config.BLOB_PUBLIC_BASE_URL}/blobs/{name}"
+        result["image_etag"] = etag
+    else:
+        result["image_base64"] = base64.b64encode(image_data).decode("utf-8")
+    
+    # 2. Sinh ảnh Lookbook từ AI (Phiên bản Precision Vision)
+    result["lookbook_url"] = await generate_lookbook_image_v2(
+        outfit_name=request.outfit_name,
+        items=items_data,
+        rationale=request.rationale,
+        images=images
+    )
+    
+    return result
+
 @app.post("/visualize", response_model=VisualizationResponse)
 async def get_outfit_visualization(request: VisualizationRequest):
     try:
-        # 1. Tạo moodboard từ ảnh thật (Dùng Grid layout đã ổn định)
-        items_data = [item.dict() for item in request.items]
-        moodboard_img = create_moodboard(items_data)
-        img_b64 = pil_to_base64(moodboard_img)
-        
-        # 2. Sinh ảnh Lookbook từ AI (Phiên bản Precision Vision)
-        lookbook_url = generate_lookbook_image_v2(
-            outfit_name=request.outfit_name,
-            items=items_data,
-            rationale=request.rationale
-        )
-        
-        return {
-            "success": True,
-            "image_base64": img_b64,
-            "lookbook_url": lookbook_url
-        }
+        return await inflight.do(request_key("visualize", request), lambda: build_visualization(request))
     except Exception as e:
         return {
             "success": False,
             "error": str(e)
         }
 
+@app.post("/visualize/jobs", response_model=VisualizationJobResponse, status_code=202)
+async def submit_visualization_job(request: VisualizationRequest):
+    try:
+        job_id = visualize_jobs.submit(
+            "visualize",
+            lambda: inflight.do(request_key("visualize", request), lambda: build_visualization(request))
+        )
+    except QueueFull as e:
+        return JSONResponse(
+            status_code=503,
+            content={"success": False, "error": str(e)},
+            headers={"Retry-After": "30"}
+        )
+    return {"success": True, "job_id": job_id, "status": "queued"}
+
+@app.get("/visualize/jobs/{job_id}", response_model=VisualizationJobResponse)
+async def get_visualization_job(job_id: str):
+    job = visualize_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"success": False, "job_id": job_id, "error": "Job not found or expired"}
+        )
+    return {
+        "success": job["status"] != "failed",
+        "job_id": job_id,
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+@app.get("/blobs/{name}")
+async def get_blob(name: str, request: Request):
+    blob = get_blob_store().open(name)
+    if blob is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Blob not found"})
+    path, mime_type, etag = blob
+    # Blob bất biến (tên = hash nội dung) nên client/CDN được cache vĩnh viễn
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=mime_type, headers=headers)
+
 @app.get("/")
 async def root():
     return {"status": "ok", "service": "AI Service"}
@@ -45,90 +256,398 @@ async def root():
 @app.get("/health")
 @app.head("/health")
 async def health_check():
+    # Liveness: chỉ cần event loop còn chạy, không kiểm tra model
     return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: 503 khi SDK Gemini / rembg vẫn đang warm-up
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "analyze": analysis_cache.stats(),
+        "near_duplicates": near_duplicate_stats(),
+        "vision": {**vision_cache.stats(), "isolated_images": len(isolated_cache)},
+        "lookbook_prompt": lookbook_prompt_cache.stats(),
+        "wardrobe_snapshots": wardrobe_snapshots.stats(),
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Định dạng text của Prometheus: histogram độ trễ theo route/bước, lệnh gọi model, 429, cache, bytes
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/singleflight/stats")
+async def singleflight_stats():
+    return inflight.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    # Hàng đợi, số request đang chạy, số bị từ chối/quá deadline của từng endpoint
+    return admission.stats()
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    # Tuyến model của từng task, quota/health của từng cặp API key/model (không lộ key)
+    return router.stats()
+
+@app.get("/colors/stats")
+async def colors_stats():
+    # Tỉ lệ màu Gemini khớp với engine màu nội bộ, số lần phải điền màu tại chỗ
+    return color_checker.stats()
+
+@app.get("/rembg/stats")
+async def rembg_stats():
+    # Thời gian load model và độ trễ inference, dùng để chọn REMBG_WORKERS
+    return bg_removal.stats()
+
+@app.post("/cache/invalidate")
+async def cache_invalidate():
+    # Xóa toàn bộ kết quả AI đã cache: /analyze, mô tả Vision, prompt lookbook (ví dụ sau khi chỉnh prompt thủ công)
+    removed = analysis_cache.invalidate()
+    removed += vision_cache.invalidate() + lookbook_prompt_cache.invalidate() + len(isolated_cache)
+    isolated_cache.clear()
+    return {"success": True, "removed": removed}
+
+def classify_error(e: Exception):
+    """Trả về (status_code, error_message, retry_after) cho một lỗi từ service AI."""
+    error_msg = str(e)
+    
+    if isinstance(e, ImageTooLarge):
+        return 413, error_msg, None
+
+    # Ảnh không đọc được (base64 sai, file hỏng): lỗi của client, không thử lại
+    if isinstance(e, InvalidImage):
+        return 400, error_msg, None
+
+    # Snapshot tủ đồ đã bị dọn hoặc lệch version: client gửi lại toàn bộ wardrobe
+    if isinstance(e, SnapshotUnknown):
+        return 409, error_msg, None
+    
+    # Quota/rate limit (429): scheduler đã thử lại trong deadline mà vẫn không được
+    if isinstance(e, QuotaExceededError):
+        return 429, error_msg, e.retry_after
+    
+    # Other errors - 500
+    return 500, error_msg, None
+
+def ai_error_response(e: Exception):
+    status_code, error_msg, retry_after = classify_error(e)
+    content = {
+        "success": False,
+        "error": error_msg
+    }
+    headers = None
+    if isinstance(e, SnapshotUnknown):
+        content["snapshot_unknown"] = True
+        content["snapshot_id"] = e.snapshot_id
+    if retry_after is not None:
+        content["retry_after"] = retry_after
+        headers = {"Retry-After": str(retry_after)}
+    return JSONResponse(status_code=status_code, content=content, headers=headers)
+
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_wardrobe_item(request: ImageRequest):
     try:
-        result = await analyze_image_with_gemini(request.image_base64)
+        result = await inflight.do(
+            request_key("analyze", request),
+            lambda: analyze_image_with_gemini(request.image_base64)
+        )
         return {
             "success": True,
             "data": result
         }
     except Exception as e:
-        error_msg = str(e)
-        
-        # Check if it's a quota/rate limit error (429)
-        if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-            retry_after = "60"
-            match = re.search(r'retry in ([\d.]+)s', error_msg)
-            if match:
-                retry_after = str(int(float(match.group(1))))
-            
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "success": False,
-                    "error": "Gemini API quota exceeded. Please try again later.",
-                    "retry_after": int(retry_after)
-                },
-                headers={"Retry-After": retry_after}
-            )
-        
-        # Other errors - return 500
+        return ai_error_response(e)
+
+@app.post("/analyze/batch")
+async def analyze_wardrobe_batch(request: BatchImageRequest):
+    """
+    Phân tích hàng loạt (import tủ đồ). Kết quả trả về dạng NDJSON, mỗi dòng
+    là 1 ảnh ngay khi ảnh đó xong: {"index", "id", "success", "data" | "error", "status"}.
+    """
+    ids = [item.id for item in request.images]
+
+    async def stream_results():
+        async for index, result, error in analyze_batch([item.image_base64 for item in request.images]):
+            line = {"index": index, "id": ids[index]}
+            if error is None:
+                line.update({"success": True, "status": 200, "data": result})
+            else:
+                status_code, error_msg, retry_after = classify_error(error)
+                line.update({"success": False, "status": status_code, "error": error_msg})
+                if retry_after is not None:
+                    line["retry_after"] = retry_after
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/analyze/duplicates", response_model=DuplicateCheckResponse)
+async def find_wardrobe_duplicates(request: DuplicateCheckRequest):
+    # Báo các nhóm ảnh gần trùng trong tủ đồ (chụp lại/cắt nhẹ cùng một món), không gọi Gemini
+    max_distance = request.max_distance if request.max_distance is not None else config.ANALYZE_DEDUP_DISTANCE
+    if not 0 <= max_distance <= 16:
+        return JSONResponse(status_code=400, content={"success": False, "error": "max_distance must be between 0 and 16"})
+
+    ids = [item.id for item in request.images]
+    clusters, errors = await run_in_threadpool(
+        find_duplicate_clusters, [item.image_base64 for item in request.images], max_distance
+    )
+    return {
+        "success": True,
+        "clusters": [{"indexes": group, "ids": [ids[i] for i in group]} for group in clusters],
+        "errors": [{"index": index, "id": ids[index], "error": error} for index, error in errors]
+    }
+
+class UploadTooLarge(Exception):
+    pass
+
+# Phần dư cho header multipart và các field nhỏ khác ngoài ảnh
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+async def read_multipart_file(request: Request, field: str, max_bytes: int) -> bytes:
+    """
+    Parse multipart/form-data ngay trên luồng body thay vì request.form() (spool toàn bộ upload
+    trước): chỉ giữ dữ liệu của field cần đọc, dừng ngay khi field vượt max_bytes hoặc cả body
+    vượt max_bytes + MULTIPART_OVERHEAD_BYTES (kể cả upload chunked không có Content-Length).
+    """
+    try:
+        from python_multipart import MultipartParser
+        from python_multipart.multipart import parse_options_header
+    except ModuleNotFoundError:
+        from multipart import MultipartParser
+        from multipart.multipart import parse_options_header
+
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Missing multipart boundary")
+
+    header_field = bytearray()
+    header_value = bytearray()
+    headers = {}
+    in_field = False
+    found = False
+    chunks = []
+    received = 0
+
+    def on_part_begin():
+        nonlocal in_field
+        headers.clear()
+        in_field = False
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        nonlocal in_field
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        in_field = not found and options.get(b"name") == field.encode("utf-8")
+
+    def on_part_data(data, start, end):
+        nonlocal received
+        if in_field:
+            received += end - start
+            chunks.append(data[start:end])
+
+    def on_part_end():
+        nonlocal found
+        found = found or in_field
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    body_bytes = 0
+    async for chunk in request.stream():
+        body_bytes += len(chunk)
+        if body_bytes > max_bytes + MULTIPART_OVERHEAD_BYTES:
+            raise UploadTooLarge()
+        parser.write(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge()
+    parser.finalize()
+
+    if not found:
+        raise ValueError(f'Missing "{field}" field in multipart body')
+    return b"".join(chunks)
+
+async def read_upload(request: Request, max_bytes: int) -> bytes:
+    """
+    Đọc ảnh từ multipart/form-data (field "file") hoặc body nhị phân
+    (application/octet-stream, image/*) theo từng chunk, dừng ngay khi vượt max_bytes.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise UploadTooLarge()
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        data = await read_multipart_file(request, "file", max_bytes)
+    else:
+        chunks = []
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLarge()
+            chunks.append(chunk)
+        data = b"".join(chunks)
+
+    if not data:
+        raise ValueError("Empty image upload")
+    return data
+
+@app.post("/analyze/upload", response_model=AnalysisResponse)
+async def analyze_wardrobe_item_upload(request: Request):
+    # Biến thể nhị phân của /analyze: không base64, không parse JSON
+    try:
+        image_bytes = await read_upload(request, config.ANALYZE_MAX_UPLOAD_BYTES)
+    except UploadTooLarge:
         return JSONResponse(
-            status_code=500,
+            status_code=413,
             content={
                 "success": False,
-                "error": error_msg
+                "error": f"Image exceeds {config.ANALYZE_MAX_UPLOAD_BYTES} bytes"
             }
         )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    try:
+        result = await analyze_image_bytes(image_bytes)
+        return {
+            "success": True,
+            "data": result
+        }
+    except Exception as e:
+        return ai_error_response(e)
+
+def resolve_wardrobe(request: StylistRequest):
+    """
+    Tủ đồ cho /suggest: (snapshot_id, version, wardrobe, key singleflight).
+    - wardrobe đầy đủ: dùng luôn, kèm snapshot_id thì lưu lại làm snapshot mới.
+    - snapshot_id (+ wardrobe_delta): áp dụng delta lên snapshot đã lưu.
+    Raise SnapshotUnknown nếu snapshot không còn; ValueError nếu thiếu cả hai.
+    """
+    if request.wardrobe is not None:
+        wardrobe = [item.dict() for item in request.wardrobe]
+        if not request.snapshot_id:
+            return None, None, wardrobe, request_key("suggest", request)
+        snapshot_id, version, wardrobe = wardrobe_snapshots.put(request.snapshot_id, wardrobe)
+        return snapshot_id, version, wardrobe, request_key("suggest", request)
+
+    if not request.snapshot_id:
+        raise ValueError("Either wardrobe or snapshot_id is required")
+    delta = request.wardrobe_delta
+    snapshot_id, version, wardrobe = wardrobe_snapshots.apply(
+        request.snapshot_id,
+        base_version=delta.base_version if delta else None,
+        added=[item.dict() for item in delta.added] if delta else (),
+        changed=[item.dict() for item in delta.changed] if delta else (),
+        removed=delta.removed if delta else (),
+    )
+    # Cùng snapshot + version + bối cảnh => cùng tủ đồ, gộp được với request trùng đang chạy
+    context = request.copy(update={"wardrobe_delta": None})
+    return snapshot_id, version, wardrobe, request_key(f"suggest\n{snapshot_id}:{version}", context)
 
 @app.post("/suggest", response_model=StylistResponse)
 async def get_outfit_suggestions(request: StylistRequest):
     try:
-        suggestions = await generate_outfit_suggestions(
-            style=request.style,
-            occasion=request.occasion,
-            weather=request.weather,
-            wardrobe=[item.dict() for item in request.wardrobe],
-            skin_tone=request.skin_tone,
-            custom_context=request.custom_context,
-            preferences=request.preferences.dict() if request.preferences else None
+        snapshot_id, version, wardrobe, key = resolve_wardrobe(request)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    except SnapshotUnknown as e:
+        return ai_error_response(e)
+
+    try:
+        suggestions = await inflight.do(
+            key,
+            lambda: generate_outfit_suggestions(
+                style=request.style,
+                occasion=request.occasion,
+                weather=request.weather,
+                wardrobe=wardrobe,
+                skin_tone=request.skin_tone,
+                custom_context=request.custom_context,
+                preferences=request.preferences.dict() if request.preferences else None
+            )
         )
         return {
             "success": True,
-            "suggestions": suggestions
+            "suggestions": suggestions,
+            "snapshot_id": snapshot_id,
+            "snapshot_version": version
         }
     except Exception as e:
-        error_msg = str(e)
-        
-        # Check if it's a quota/rate limit error (429)
-        if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-            # Try to extract retry delay from error message
-            retry_after = "60"  # Default 60 seconds
-            match = re.search(r'retry in ([\d.]+)s', error_msg)
-            if match:
-                retry_after = str(int(float(match.group(1))))
-            
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "success": False,
-                    "error": "Gemini API quota exceeded. Please try again later.",
-                    "retry_after": int(retry_after)
-                },
-                headers={"Retry-After": retry_after}
-            )
-        
-        # Other errors - return 500
-        return JSONResponse(
-            status_code=500,
-            content={
-                "success": False,
-                "error": error_msg
-            }
-        )
+        return ai_error_response(e)
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/suggest/stream")
+async def stream_outfit_suggestions_sse(request: StylistRequest):
+    """
+    /suggest dạng Server-Sent Events: mỗi outfit được gửi (event "outfit") ngay khi
+    model viết xong, kết thúc bằng event "done" hoặc "error".
+    """
+    try:
+        snapshot_id, version, wardrobe, _ = resolve_wardrobe(request)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    except SnapshotUnknown as e:
+        return ai_error_response(e)
+
+    async def events():
+        count = 0
+        try:
+            async for suggestion in stream_outfit_suggestions(
+                style=request.style,
+                occasion=request.occasion,
+                weather=request.weather,
+                wardrobe=wardrobe,
+                skin_tone=request.skin_tone,
+                custom_context=request.custom_context,
+                preferences=request.preferences.dict() if request.preferences else None
+            ):
+                try:
+                    outfit = SuggestedOutfit(**suggestion)
+                except Exception:
+                    continue  # Cùng ràng buộc với StylistResponse: bỏ outfit sai schema
+                count += 1
+                yield sse_event("outfit", outfit.dict())
+            done = {"success": True, "count": count}
+            if snapshot_id is not None:
+                done.update(snapshot_id=snapshot_id, snapshot_version=version)
+            yield sse_event("done", done)
+        except Exception as e:
+            status_code, error_msg, retry_after = classify_error(e)
+            data = {"success": False, "status": status_code, "error": error_msg}
+            if retry_after is not None:
+                data["retry_after"] = retry_after
+            yield sse_event("error", data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
     print("[INFO] AI Service is running on port 8000...")
@@ -4,6 +4,17 @@ from typing import List, Optional
 class ImageRequest(BaseModel):
     image_base64: str
 
+class BatchImageItem(BaseModel):
+    id: Optional[str] = None  # Id phía client để ghép kết quả trả về
+    image_base64: str
+
+class BatchImageRequest(BaseModel):
+    images: List[BatchImageItem]
+
+class DuplicateCheckRequest(BaseModel):
+    images: List[BatchImageItem]
+    max_distance: Optional[int] = None  # Ngưỡng pHash (bit), mặc định ANALYZE_DEDUP_DISTANCE
+
 class WardrobeItem(BaseModel):
     id: str
     name: str
@@ -17,6 +28,12 @@ class StylistPreferences(BaseModel):
     avoid_colors: List[str] = []
     bio: Optional[str] = ""
 
+class WardrobeDelta(BaseModel):
+    base_version: Optional[int] = None  # Version snapshot mà delta dựa trên (bỏ trống = không kiểm tra)
+    added: List[WardrobeItem] = []
+    changed: List[WardrobeItem] = []
+    removed: List[str] = []  # Id các món đã xóa
+
 class StylistRequest(BaseModel):
     style: str
     occasion: str
@@ -24,4 +41,6 @@ class StylistRequest(BaseModel):
     skin_tone: Optional[str] = "tự nhiên"
     custom_context: Optional[str] = None  # Mô tả bổ sung từ người dùng
     preferences: Optional[StylistPreferences] = None # Sở thích cá nhân từ profile
-    wardrobe: List[WardrobeItem]
+    wardrobe: Optional[List[WardrobeItem]] = None  # Toàn bộ tủ đồ (bỏ trống khi gửi delta)
+    snapshot_id: Optional[str] = None  # Khóa snapshot tủ đồ phía AI service (ví dụ user id)
+    wardrobe_delta: Optional[WardrobeDelta] = None  # Thay đổi so với snapshot, dùng thay cho wardrobe
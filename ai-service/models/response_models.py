@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class AnalysisResult(BaseModel):
@@ -7,12 +7,28 @@ class AnalysisResult(BaseModel):
     season: List[str]
     notes: str
     tags: List[str]
+    partial: bool = False  # True khi Gemini hết quota: chỉ có màu tính tại chỗ
 
 class AnalysisResponse(BaseModel):
     success: bool
     data: Optional[AnalysisResult] = None
     error: Optional[str] = None
 
+class DuplicateCluster(BaseModel):
+    indexes: List[int]
+    ids: List[Optional[str]]
+
+class DuplicateImageError(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: str
+
+class DuplicateCheckResponse(BaseModel):
+    success: bool
+    clusters: List[DuplicateCluster] = []
+    errors: List[DuplicateImageError] = []
+    error: Optional[str] = None
+
 class SuggestedOutfit(BaseModel):
     outfit_name: str
     item_ids: List[str]
@@ -22,6 +38,8 @@ class SuggestedOutfit(BaseModel):
 class StylistResponse(BaseModel):
     success: bool
     suggestions: List[SuggestedOutfit] = []
+    snapshot_id: Optional[str] = None  # Snapshot tủ đồ đã dùng (khi request có snapshot_id)
+    snapshot_version: Optional[int] = None  # Gửi lại làm wardrobe_delta.base_version ở lần sau
     error: Optional[str] = None
 
 class VisualizationItem(BaseModel):
@@ -33,9 +51,24 @@ class VisualizationRequest(BaseModel):
     outfit_name: Optional[str] = "Outfit"
     description: Optional[str] = ""
     rationale: Optional[str] = ""
+    image_format: Optional[str] = None  # PNG | JPEG | WEBP (mặc định MOODBOARD_FORMAT)
+    image_quality: Optional[int] = Field(None, ge=1, le=100)  # Chất lượng JPEG/WEBP (1-100), ngoài khoảng trả 422
+    width: Optional[int] = None  # Kích thước moodboard (mặc định 800x1000)
+    height: Optional[int] = None
+    delivery: Optional[str] = "inline"  # inline: base64 trong JSON | url: lưu blob, trả về image_url
 
 class VisualizationResponse(BaseModel):
     success: bool
     image_base64: Optional[str] = None
+    image_url: Optional[str] = None  # Khi delivery=url
+    image_etag: Optional[str] = None
+    image_mime_type: Optional[str] = None
     lookbook_url: Optional[str] = None
     error: Optional[str] = None
+
+class VisualizationJobResponse(BaseModel):
+    success: bool
+    job_id: Optional[str] = None
+    status: Optional[str] = None  # queued | running | done | failed
+    result: Optional[VisualizationResponse] = None
+    error: Optional[str] = None
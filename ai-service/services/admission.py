@@ -0,0 +1,224 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from services import config
+
+
+class Rejected(Exception):
+    """Request bị từ chối ở cửa vào (hàng đợi đầy hoặc không kịp deadline)."""
+
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionLimiter:
+    """
+    Giới hạn số request chạy đồng thời của một endpoint (limit) với hàng đợi FIFO
+    có giới hạn (max_queue). Request phải chờ quá max_wait giây hoặc quá deadline
+    của client thì bị từ chối ngay (không chờ vô ích), dựa trên ước lượng thời gian
+    chờ = vị trí trong hàng / limit * thời gian xử lý trung bình (EWMA).
+    """
+
+    def __init__(self, name, limit, max_queue, max_wait):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = deque()
+        self.service_seconds = None  # EWMA thời gian xử lý một request
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "timeout": 0}
+
+    def estimated_wait(self, position):
+        if self.service_seconds is None:
+            return 0.0
+        return math.ceil(position / self.limit) * self.service_seconds
+
+    def _reject(self, reason, retry_after):
+        self.rejected[reason] += 1
+        retry_after = max(1, math.ceil(retry_after))
+        raise Rejected(f"{self.name} is overloaded ({reason}), retry in {retry_after}s", retry_after, reason)
+
+    async def acquire(self, deadline=None):
+        """
+        Chờ tới lượt. deadline: thời điểm (time.monotonic) client bỏ cuộc.
+        Raise Rejected nếu hàng đợi đầy hoặc chắc chắn không kịp.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        position = len(self._waiters) + 1
+        wait = self.estimated_wait(position)
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", wait or self.service_seconds or 1)
+        wait_until = time.monotonic() + self.max_wait
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+        # Ước lượng chờ đã vượt max_wait/deadline => từ chối ngay thay vì xếp hàng vô ích
+        if wait > 0 and time.monotonic() + wait > wait_until:
+            self._reject("deadline", wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), max(0.0, wait_until - time.monotonic()))
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return  # Được cấp slot đúng lúc hết giờ: vẫn giữ slot
+            waiter.cancel()
+            self._reject("timeout", self.estimated_wait(len(self._waiters) + 1))
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # Đã được cấp slot nhưng caller bị hủy: trả lại
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, elapsed=None):
+        if elapsed is not None:
+            self.service_seconds = elapsed if self.service_seconds is None else 0.8 * self.service_seconds + 0.2 * elapsed
+        # Chuyển slot thẳng cho request đang chờ lâu nhất (không giảm active)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.admitted += 1
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_seconds": round(self.service_seconds, 3) if self.service_seconds is not None else None,
+        }
+
+
+def parse_limits(spec):
+    """"/analyze=16:64,/visualize=2:8" -> {path: (concurrency, max_queue)}."""
+    limits = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        path, _, values = entry.partition("=")
+        concurrency, _, queue = values.partition(":")
+        limits[path.strip()] = (int(concurrency), int(queue or 0))
+    return limits
+
+
+def parse_deadline(value, now=None):
+    """Header deadline của client (số giây còn lại) -> thời điểm time.monotonic(), None nếu không hợp lệ."""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(seconds) or seconds <= 0:
+        return None
+    return (now if now is not None else time.monotonic()) + seconds
+
+
+limiters = {
+    path: AdmissionLimiter(path, concurrency, queue, config.ADMISSION_MAX_WAIT)
+    for path, (concurrency, queue) in parse_limits(config.ADMISSION_LIMITS).items()
+}
+deadline_exceeded = {}  # path -> số request bị hủy vì quá deadline của client
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware cho các POST: xếp hàng theo limiter của endpoint (ADMISSION_LIMITS),
+    từ chối sớm bằng 503 + Retry-After, và hủy request khi quá deadline client gửi trong
+    header ADMISSION_DEADLINE_HEADER (504). Việc hủy chạy trong cùng task với endpoint nên
+    lệnh gọi model/await đang chờ bị hủy theo; code đang chạy trong thread thì chỉ bị bỏ kết quả.
+    """
+
+    def __init__(self, app, limiters=limiters, header=config.ADMISSION_DEADLINE_HEADER):
+        self.app = app
+        self.limiters = limiters
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        limiter = self.limiters.get(path)
+        deadline = parse_deadline(Headers(scope=scope).get(self.header)) if self.header else None
+        if limiter is None and deadline is None:
+            await self.app(scope, receive, send)
+            return
+
+        if limiter is not None:
+            try:
+                await limiter.acquire(deadline)
+            except Rejected as e:
+                response = JSONResponse(
+                    status_code=503,
+                    content={"success": False, "error": str(e), "retry_after": e.retry_after},
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+                await response(scope, receive, send)
+                return
+
+        started = time.monotonic()
+        response_started = False
+
+        async def send_tracking(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            if deadline is None:
+                await self.app(scope, receive, send_tracking)
+                return
+            task = asyncio.ensure_future(self.app(scope, receive, send_tracking))
+            try:
+                await asyncio.wait({task}, timeout=max(0.0, deadline - time.monotonic()))
+            finally:
+                timed_out = not task.done()
+                if timed_out:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+            if not timed_out:
+                task.result()  # Lỗi của endpoint: để middleware ngoài xử lý như bình thường
+                return
+            deadline_exceeded[path] = deadline_exceeded.get(path, 0) + 1
+            if response_started:
+                # Đang stream dở: đóng body, client tự nhận ra phản hồi bị cắt
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            response = JSONResponse(
+                status_code=504,
+                content={"success": False, "error": f"Request exceeded the client deadline ({self.header})"}
+            )
+            await response(scope, receive, send)
+        finally:
+            if limiter is not None:
+                limiter.release(time.monotonic() - started)
+
+
+def stats():
+    return {
+        "endpoints": {path: limiter.stats() for path, limiter in limiters.items()},
+        "deadline_exceeded": dict(deadline_exceeded),
+    }
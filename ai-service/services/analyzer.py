@@ -1,28 +1,28 @@
 import os
+import asyncio
 import base64
+import binascii
+import copy
+import hashlib
 import io
 import json
+import logging
 import pathlib
-import google.generativeai as genai
-from PIL import Image
 from dotenv import load_dotenv
 
 # 1. Load environment variables
-from services.config import model
+from services import config
+from services import metrics
+from services.cache import ResultCache
+from services.colors import color_checker, extract_colors
+from services.model_client import generate_content
+from services.phash import HammingIndex, duplicate_clusters, hamming, image_hashes
+from services.preprocess import InvalidImage, prepare_image
+from services.scheduler import QuotaExceededError
 
-async def analyze_image_with_gemini(image_base64: str):
-    try:
-        # --- STEP 1: IMAGE PROCESSING ---
-        if "," in image_base64:
-            base64_data = image_base64.split(",")[1]
-        else:
-            base64_data = image_base64
+logger = logging.getLogger(__name__)
 
-        image_bytes = base64.b64decode(base64_data)
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # --- STEP 2: PROMPT ---
-        prompt = """
+ANALYZE_PROMPT = """
         Bạn là chuyên gia thời trang AI. Hãy phân tích hình ảnh trang phục này và trả về kết quả dưới dạng JSON thuần túy (không dùng markdown ```json).
         
         YÊU CẦU DỮ LIỆU ĐẦU RA (BẮT BUỘC KHỚP VỚI DANH SÁCH):
@@ -42,47 +42,372 @@ async def analyze_image_with_gemini(image_base64: str):
         }
         """
 
-        # --- STEP 3: CALL GEMINI API ---
-        response = model.generate_content([prompt, image])
-        
-        # --- STEP 4: PROCESS RESULTS ---
-        if not response or not response.text:
-            raise ValueError("Gemini API returned an empty response")
+# Đổi prompt, model hoặc cấu hình tiền xử lý ảnh sẽ đổi version => cache cũ tự động bị vô hiệu
+ANALYZE_PROMPT_VERSION = hashlib.sha256(
+    f"{config.model_id('analyze')}\n{config.MODEL_IMAGE_MAX_EDGE}:{config.MODEL_IMAGE_FORMAT}\n{ANALYZE_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
+
+analysis_cache = ResultCache(
+    version=ANALYZE_PROMPT_VERSION,
+    max_entries=config.ANALYZE_CACHE_SIZE,
+    ttl=config.ANALYZE_CACHE_TTL,
+    db_path=config.ANALYZE_CACHE_DB or None,
+)
+
+# Ảnh đã phân tích, tra theo perceptual hash: ảnh chụp lại/cắt nhẹ/nén lại của cùng
+# món đồ dùng lại kết quả trong analysis_cache thay vì gọi Gemini
+near_duplicates = HammingIndex(max_entries=config.ANALYZE_DEDUP_INDEX_SIZE)
+near_duplicate_hits = 0
+
+def image_fingerprint(image_bytes: bytes):
+    """
+    (phash, dhash, các màu chính) của ảnh, dùng để nhận diện ảnh gần trùng; các màu
+    được dùng lại khi đối chiếu màu của model (check_colors) để không tính lại.
+    """
+    try:
+        p_hash, d_hash = image_hashes(image_bytes)
+        return p_hash, d_hash, extract_colors(image_bytes)
+    except OSError as e:
+        # Header đọc được nhưng pixel hỏng/cắt cụt: lỗi lúc giải mã
+        raise InvalidImage(f"Corrupt image data: {e}") from e
 
-        raw_text = response.text
-        cleaned_text = raw_text.strip()
+def main_color(colors):
+    return colors[0] if colors else None
+
+async def find_near_duplicate(image_bytes: bytes):
+    """
+    Trả về (kết quả đã cache của ảnh gần trùng hoặc None, fingerprint).
+    Gần trùng: pHash cách <= ANALYZE_DEDUP_DISTANCE bit, dHash xác nhận (<= 2 lần ngưỡng)
+    và cùng màu chính (pHash chỉ nhìn ảnh xám nên áo cùng dáng khác màu dễ trùng hash).
+    """
+    global near_duplicate_hits
+    if config.ANALYZE_DEDUP_DISTANCE <= 0:
+        return None, None
+    with metrics.span("dedup"):
+        fingerprint = await asyncio.to_thread(image_fingerprint, image_bytes)
+    p_hash, d_hash, colors = fingerprint
+    color = main_color(colors)
+    for _, key, (other_dhash, other_color) in near_duplicates.search(p_hash, config.ANALYZE_DEDUP_DISTANCE):
+        if other_color != color or hamming(d_hash, other_dhash) > 2 * config.ANALYZE_DEDUP_DISTANCE:
+            continue
+        result = analysis_cache.get(key)
+        if result is None:
+            near_duplicates.remove(key)  # Kết quả đã hết hạn khỏi cache
+            continue
+        near_duplicate_hits += 1
+        return result, fingerprint
+    return None, fingerprint
+
+def remember_fingerprint(cache_key: str, fingerprint):
+    if fingerprint is not None:
+        p_hash, d_hash, colors = fingerprint
+        near_duplicates.add(cache_key, p_hash, (d_hash, main_color(colors)))
+
+def find_duplicate_clusters(images_base64, max_distance):
+    """
+    Gom nhóm các ảnh gần trùng trong một tủ đồ (cùng tiêu chí pHash + màu chính như
+    /analyze), không gọi model. Chạy đồng bộ (dùng trong threadpool).
+    Trả về (list nhóm chỉ số, list (index, lỗi) của ảnh không đọc được).
+    """
+    hashes, colors, errors = [], [], []
+    for index, image_base64 in enumerate(images_base64):
+        try:
+            p_hash, _, image_colors = image_fingerprint(decode_base64_image(image_base64))
+            color = main_color(image_colors)
+        except Exception as e:
+            p_hash, color = None, None
+            errors.append((index, str(e)))
+        hashes.append(p_hash)
+        colors.append(color)
+    return duplicate_clusters(hashes, max_distance, labels=colors), errors
+
+def near_duplicate_stats():
+    return {"entries": len(near_duplicates), "hits": near_duplicate_hits}
+
+def extract_json_text(raw_text: str, open_char: str, close_char: str) -> str:
+    cleaned_text = raw_text.strip()
+    
+    # Find the first open and last close bracket to extract JSON if there's surrounding text
+    start_idx = cleaned_text.find(open_char)
+    end_idx = cleaned_text.rfind(close_char)
+    
+    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+        cleaned_text = cleaned_text[start_idx:end_idx + 1]
+    else:
+        # Fallback to markdown cleaning if brackets not found
+        if cleaned_text.startswith("```json"):
+            cleaned_text = cleaned_text[7:]
+        elif cleaned_text.startswith("```"):
+            cleaned_text = cleaned_text[3:]
         
-        # Find the first '{' and last '}' to extract JSON if there's surrounding text
-        start_idx = cleaned_text.find('{')
-        end_idx = cleaned_text.rfind('}')
+        if cleaned_text.endswith("```"):
+            cleaned_text = cleaned_text[:-3]
+    
+    cleaned_text = cleaned_text.strip()
+    if not cleaned_text:
+        raise ValueError("Cleaned response text is empty")
+    return cleaned_text
+
+def normalize_result(result_json: dict) -> dict:
+    if not isinstance(result_json, dict):
+        raise ValueError("Analysis result is not a JSON object")
+
+    # Ensure color and season are always lists
+    if isinstance(result_json.get("color"), str):
+        result_json["color"] = [result_json["color"]]
         
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            cleaned_text = cleaned_text[start_idx:end_idx + 1]
+    if isinstance(result_json.get("season"), str):
+        result_json["season"] = [result_json["season"]]
+    return result_json
+
+async def local_colors(image_bytes: bytes):
+    """Màu chính tính tại chỗ (không gọi model); [] nếu không đọc được ảnh."""
+    try:
+        return await asyncio.to_thread(extract_colors, image_bytes)
+    except Exception:
+        return []
+
+async def check_colors(result: dict, image_bytes: bytes, fingerprint=None) -> dict:
+    # Đối chiếu màu của Gemini với màu tính tại chỗ; model không trả về màu hợp lệ thì điền màu tại chỗ
+    if config.ANALYZE_COLOR_CHECK:
+        if fingerprint is not None:
+            local = fingerprint[2]  # Đã tính khi tìm ảnh gần trùng
         else:
-            # Fallback to markdown cleaning if brackets not found
-            if cleaned_text.startswith("```json"):
-                cleaned_text = cleaned_text[7:]
-            elif cleaned_text.startswith("```"):
-                cleaned_text = cleaned_text[3:]
-            
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]
-        
-        cleaned_text = cleaned_text.strip()
-        if not cleaned_text:
-            raise ValueError("Cleaned response text is empty")
+            with metrics.span("colors"):
+                local = await local_colors(image_bytes)
+        result["color"] = color_checker.reconcile(result.get("color"), local)
+    return result
+
+async def local_analysis(image_bytes: bytes, fingerprint=None) -> dict:
+    """Kết quả tối thiểu khi Gemini hết quota: chỉ có màu tính tại chỗ, không được cache."""
+    return {
+        "category": "",
+        "color": fingerprint[2] if fingerprint is not None else await local_colors(image_bytes),
+        "season": [],
+        "notes": "",
+        "tags": [],
+        "partial": True,
+    }
+
+def decode_base64_image(image_base64: str) -> bytes:
+    if "," in image_base64:
+        base64_data = image_base64.split(",")[1]
+    else:
+        base64_data = image_base64
+    # validate=True: ký tự lạ là lỗi rõ ràng thay vì bị bỏ qua (ra bytes rỗng/hỏng); bỏ xuống dòng trước
+    try:
+        image_bytes = base64.b64decode("".join(base64_data.split()), validate=True)
+    except binascii.Error as e:
+        raise InvalidImage(f"Invalid base64 image data: {e}") from e
+    if not image_bytes:
+        raise InvalidImage("Empty image data")
+    return image_bytes
 
-        result_json = json.loads(cleaned_text)
+async def analyze_image_with_gemini(image_base64: str):
+    # Giữ contract cũ (base64 trong JSON): giải mã rồi chuyển sang luồng xử lý bytes
+    image_bytes = decode_base64_image(image_base64)
+    return await analyze_image_bytes(image_bytes)
+
+async def analyze_image_bytes(image_bytes: bytes, fingerprint=None):
+    """
+    Phân tích một ảnh. fingerprint: đã tính sẵn (batch đã tìm ảnh gần trùng) => không
+    tìm lại ảnh gần trùng, chỉ dùng lại cho đối chiếu màu và chỉ mục ảnh gần trùng.
+    """
+    try:
+        # --- STEP 1: IMAGE PROCESSING ---
+        # Ảnh đã phân tích trước đó => trả kết quả từ cache, không tốn quota
+        cache_key = analysis_cache.key_for(image_bytes)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        # Ensure color and season are always lists
-        if isinstance(result_json.get("color"), str):
-            result_json["color"] = [result_json["color"]]
-            
-        if isinstance(result_json.get("season"), str):
-            result_json["season"] = [result_json["season"]]
+        # Ảnh gần trùng với ảnh đã phân tích (chụp lại, cắt nhẹ, nén lại) => dùng lại kết quả
+        if fingerprint is None:
+            duplicate, fingerprint = await find_near_duplicate(image_bytes)
+            if duplicate is not None:
+                return duplicate
 
+        # Thu nhỏ + nén lại trước khi gửi (ảnh điện thoại 12MP là quá thừa để phân loại)
+        with metrics.span("preprocess"):
+            image = await asyncio.to_thread(prepare_image, image_bytes)
+
+        # --- STEP 2: PROMPT ---
+        prompt = ANALYZE_PROMPT
+
+        # --- STEP 3: CALL GEMINI API ---
+        try:
+            response = await generate_content([prompt, image], task="analyze")
+        except QuotaExceededError:
+            # Hết quota Gemini => trả màu tính tại chỗ thay vì lỗi 429
+            if not config.ANALYZE_LOCAL_FALLBACK:
+                raise
+            return await local_analysis(image_bytes, fingerprint)
+        
+        # --- STEP 4: PROCESS RESULTS ---
+        if not response or not response.text:
+            raise ValueError("Gemini API returned an empty response")
+
+        result_json = normalize_result(json.loads(extract_json_text(response.text, "{", "}")))
+        result_json = await check_colors(result_json, image_bytes, fingerprint)
+
+        analysis_cache.set(cache_key, result_json)
+        remember_fingerprint(cache_key, fingerprint)
         return result_json
 
     except Exception as e:
-        # print(f"[ERROR] Service Analysis Error: {str(e)}") # Removed due to encoding issues on Windows
+        logger.warning("Service Analysis Error: %s", e)
         raise e
+
+ANALYZE_BATCH_PROMPT = ANALYZE_PROMPT + """
+        LƯU Ý: Có {count} ảnh trang phục, mỗi ảnh là MỘT món đồ riêng biệt.
+        Trả về một MẢNG JSON gồm đúng {count} object theo đúng thứ tự ảnh đã gửi,
+        mỗi object có cùng cấu trúc như ví dụ trên.
+        """
+
+async def prepare_each(images_bytes):
+    """Tiền xử lý từng ảnh riêng: list blob hoặc exception (ảnh hỏng) theo thứ tự."""
+    with metrics.span("preprocess"):
+        prepared = await asyncio.gather(
+            *(asyncio.to_thread(prepare_image, data) for data in images_bytes), return_exceptions=True
+        )
+    for item in prepared:
+        if isinstance(item, BaseException) and not isinstance(item, Exception):
+            raise item  # CancelledError...
+    return prepared
+
+async def analyze_images_packed(images_bytes, fingerprints=None, prepared=None):
+    """
+    Phân tích nhiều ảnh trong MỘT lệnh gọi Gemini; trả về list kết quả theo thứ tự.
+    fingerprints: list fingerprint (hoặc None) tương ứng, dùng lại màu đã tính.
+    prepared: list blob đã tiền xử lý (prepare_each), bỏ trống thì tiền xử lý tại đây.
+    """
+    if prepared is None:
+        with metrics.span("preprocess"):
+            prepared = await asyncio.gather(*(asyncio.to_thread(prepare_image, data) for data in images_bytes))
+    prompt = ANALYZE_BATCH_PROMPT.replace("{count}", str(len(prepared)))
+    response = await generate_content([prompt, *prepared], task="analyze")
+    if not response or not response.text:
+        raise ValueError("Gemini API returned an empty response")
+
+    results = json.loads(extract_json_text(response.text, "[", "]"))
+    if not isinstance(results, list) or len(results) != len(images_bytes):
+        raise ValueError("Packed analysis returned a mismatched number of results")
+    fingerprints = fingerprints or [None] * len(images_bytes)
+    return [
+        await check_colors(normalize_result(result), data, fingerprint)
+        for result, data, fingerprint in zip(results, images_bytes, fingerprints)
+    ]
+
+async def analyze_batch(images_base64):
+    """
+    Phân tích hàng loạt ảnh, yield (index, result, error) ngay khi từng ảnh xong.
+    - Ảnh trùng nhau chỉ phân tích 1 lần; ảnh đã có trong cache trả về ngay.
+    - Các ảnh còn lại được gộp ANALYZE_BATCH_PACK_SIZE ảnh / 1 lệnh gọi, chạy song song
+      tối đa ANALYZE_BATCH_CONCURRENCY lệnh; gói trả về sai định dạng được thử lại từng ảnh.
+    - Lỗi của một ảnh (kể cả 429) không làm hỏng cả batch.
+    """
+    queue = asyncio.Queue()
+    groups = {}  # cache_key -> (bytes, [index, ...])
+
+    def emit(indexes, result, error):
+        for index in indexes:
+            queue.put_nowait((index, copy.deepcopy(result) if result is not None else None, error))
+
+    for index, image_base64 in enumerate(images_base64):
+        try:
+            image_bytes = decode_base64_image(image_base64)
+        except Exception as e:
+            emit([index], None, e)
+            continue
+        key = analysis_cache.key_for(image_bytes)
+        groups.setdefault(key, (image_bytes, []))[1].append(index)
+
+    pending = []
+    for key, (image_bytes, indexes) in groups.items():
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            emit(indexes, cached, None)
+        else:
+            pending.append((key, image_bytes, indexes))
+
+    semaphore = asyncio.Semaphore(config.ANALYZE_BATCH_CONCURRENCY)
+    pack_size = max(1, config.ANALYZE_BATCH_PACK_SIZE)
+
+    async def run_single(key, image_bytes, indexes, fingerprint=None):
+        try:
+            emit(indexes, await analyze_image_bytes(image_bytes, fingerprint), None)
+        except Exception as e:
+            emit(indexes, None, e)
+
+    async def run_pack(pack):
+        async with semaphore:
+            fingerprints = {}
+            if len(pack) > 1:
+                # Ảnh gần trùng với ảnh đã phân tích => trả ngay, không đưa vào gói
+                to_analyze = []
+                for key, image_bytes, indexes in pack:
+                    try:
+                        duplicate, fingerprints[key] = await find_near_duplicate(image_bytes)
+                    except Exception:
+                        duplicate = None  # Ảnh hỏng: báo lỗi riêng cho ảnh đó ở bước tiền xử lý
+                    if duplicate is not None:
+                        emit(indexes, duplicate, None)
+                    else:
+                        to_analyze.append((key, image_bytes, indexes))
+                pack = to_analyze
+            blobs = {}
+            if len(pack) > 1:
+                # Giải mã + tiền xử lý từng ảnh trước khi gộp: ảnh hỏng chỉ lỗi đúng chỉ số của nó
+                to_analyze = []
+                prepared = await prepare_each([image_bytes for _, image_bytes, _ in pack])
+                for (key, image_bytes, indexes), blob in zip(pack, prepared):
+                    if isinstance(blob, Exception):
+                        emit(indexes, None, blob)
+                    else:
+                        blobs[key] = blob
+                        to_analyze.append((key, image_bytes, indexes))
+                pack = to_analyze
+            if len(pack) > 1:
+                try:
+                    results = await analyze_images_packed(
+                        [image_bytes for _, image_bytes, _ in pack],
+                        [fingerprints.get(key) for key, _, _ in pack],
+                        [blobs[key] for key, _, _ in pack],
+                    )
+                    for (key, _, indexes), result in zip(pack, results):
+                        analysis_cache.set(key, result)
+                        remember_fingerprint(key, fingerprints.get(key))
+                        emit(indexes, result, None)
+                    return
+                except ValueError:
+                    # Model trả về sai định dạng/thiếu kết quả => thử từng ảnh riêng
+                    pass
+                except QuotaExceededError as e:
+                    # Hết quota => màu tính tại chỗ (nếu bật), không gọi lại
+                    for key, image_bytes, indexes in pack:
+                        if config.ANALYZE_LOCAL_FALLBACK:
+                            emit(indexes, await local_analysis(image_bytes, fingerprints.get(key)), None)
+                        else:
+                            emit(indexes, None, e)
+                    return
+                except Exception as e:
+                    # Lỗi gọi API (timeout...) => báo lỗi cho các ảnh trong gói, không gọi lại
+                    for _, _, indexes in pack:
+                        emit(indexes, None, e)
+                    return
+            for key, image_bytes, indexes in pack:
+                await run_single(key, image_bytes, indexes, fingerprints.get(key))
+
+    tasks = [
+        asyncio.create_task(run_pack(pending[i:i + pack_size]))
+        for i in range(0, len(pending), pack_size)
+    ]
+    remaining = len(images_base64)
+    try:
+        while remaining:
+            yield await queue.get()
+            remaining -= 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
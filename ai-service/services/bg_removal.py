@@ -0,0 +1,180 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+from services import config
+
+logger = logging.getLogger(__name__)
+
+# Session rembg dùng lâu dài trong mỗi process (tránh load lại model ONNX mỗi lần)
+_session = None
+_session_lock = threading.Lock()
+_load_seconds = None
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_error = None  # Lỗi import rembg / load session: ghi nhận một lần, không thử lại mỗi request
+_stats = {
+    "load_seconds": None,
+    "inferences": 0,
+    "inference_seconds_total": 0.0,
+    "inference_seconds_max": 0.0,
+}
+
+
+def get_session():
+    global _session, _load_seconds
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                from rembg import new_session
+                started = time.perf_counter()
+                _session = new_session(config.REMBG_MODEL)
+                _load_seconds = time.perf_counter() - started
+    return _session
+
+
+def warm_up():
+    """Load model và chạy thử 1 lần inference để các lần sau không bị chậm."""
+    remove_background(Image.new("RGB", (64, 64), (255, 255, 255)))
+    return _load_seconds
+
+
+def remove_background(img):
+    """Tách nền + auto-crop trong process hiện tại, dùng session dùng chung."""
+    from rembg import remove
+    from services.visualizer import auto_crop
+    return auto_crop(remove(img, session=get_session()))
+
+
+class RembgUnavailable(Exception):
+    """rembg không import/load được; ảnh gốc được dùng thay cho ảnh đã tách nền."""
+
+
+def _worker_load_seconds(_):
+    return _load_seconds
+
+
+def _remove_background_worker(data):
+    # Chạy trong process con: nhận bytes ảnh gốc, trả về pixel RGBA đã cắt sát
+    started = time.perf_counter()
+    img = remove_background(Image.open(io.BytesIO(data))).convert("RGBA")
+    elapsed = time.perf_counter() - started
+    return img.size, img.tobytes(), elapsed, _load_seconds
+
+
+def _record(elapsed, load_seconds):
+    _stats["inferences"] += 1
+    _stats["inference_seconds_total"] += elapsed
+    _stats["inference_seconds_max"] = max(_stats["inference_seconds_max"], elapsed)
+    if load_seconds is not None:
+        _stats["load_seconds"] = load_seconds
+
+
+def start_pool():
+    """
+    Khởi tạo pool tách nền. REMBG_WORKERS > 0: pool process (mỗi process giữ
+    1 session và warm-up khi khởi động); = 0: chạy trong thread của process chính.
+    Lỗi (thiếu rembg, không load được model) được ghi nhận một lần: các lần gọi sau
+    ném RembgUnavailable ngay, không import/load lại.
+    """
+    global _pool, _pool_error
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+        if _pool_error is not None:
+            raise RembgUnavailable(_pool_error)
+        pool = None
+        try:
+            if config.REMBG_WORKERS > 0:
+                pool = ProcessPoolExecutor(
+                    max_workers=config.REMBG_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_up,
+                )
+                # Process con chỉ được tạo khi có việc: gửi mỗi worker một việc rỗng để chúng load model ngay
+                load_seconds = [s for s in pool.map(_worker_load_seconds, range(config.REMBG_WORKERS)) if s is not None]
+                _stats["load_seconds"] = max(load_seconds, default=None)
+            else:
+                _stats["load_seconds"] = warm_up()
+                pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rembg")
+        except Exception as e:
+            logger.exception("rembg unavailable, using original images")
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            _pool_error = f"{type(e).__name__}: {e}"
+            raise RembgUnavailable(_pool_error) from e
+        _pool = pool
+        return _pool
+
+
+def is_ready():
+    return _pool is not None
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _original(data):
+    # Dự phòng khi không tách nền được: ảnh gốc (None nếu không đọc được)
+    try:
+        return Image.open(io.BytesIO(data)).convert("RGBA")
+    except Exception:
+        return None
+
+
+async def remove_backgrounds(datas):
+    """
+    Tách nền song song cho nhiều ảnh (bytes), không chặn event loop.
+    Trả về list PIL Image RGBA theo đúng thứ tự; ảnh tách nền lỗi (hoặc rembg không
+    dùng được) trả về ảnh gốc, ảnh không đọc được trả về None.
+    """
+    pool = _pool
+    if pool is None and _pool_error is None:
+        try:
+            pool = await asyncio.to_thread(start_pool)
+        except RembgUnavailable:
+            pass  # Đã log trong start_pool
+    loop = asyncio.get_running_loop()
+
+    async def run_one(data):
+        if data is None:
+            return None
+        if pool is None:
+            return _original(data)
+        try:
+            size, raw, elapsed, load_seconds = await loop.run_in_executor(
+                pool, _remove_background_worker, data
+            )
+        except Exception:
+            logger.exception("Background removal failed, using the original image")
+            return _original(data)
+        _record(elapsed, load_seconds)
+        return Image.frombytes("RGBA", size, raw)
+
+    return await asyncio.gather(*(run_one(data) for data in datas))
+
+
+def stats():
+    inferences = _stats["inferences"]
+    return {
+        "workers": config.REMBG_WORKERS,
+        "model": config.REMBG_MODEL,
+        "load_seconds": _stats["load_seconds"],
+        "error": _pool_error,
+        "inferences": inferences,
+        "inference_seconds_avg": (
+            round(_stats["inference_seconds_total"] / inferences, 4) if inferences else None
+        ),
+        "inference_seconds_max": round(_stats["inference_seconds_max"], 4),
+    }
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import re
+
+from services import config
+from services.cache import DiskCache
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+_MIME_TYPES = {ext: mime for mime, ext in _EXTENSIONS.items()}
+_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.(png|jpg|webp)$")
+
+
+class BlobStore(DiskCache):
+    """
+    Kho file theo nội dung trên đĩa cục bộ: tên file = sha256(bytes) + đuôi,
+    nên cùng một ảnh chỉ lưu một lần và ETag chính là hash.
+    Vượt quá max_bytes thì xóa các blob cũ nhất (theo mtime, như DiskCache).
+    """
+
+    def _is_entry(self, name):
+        return bool(_NAME_PATTERN.match(name))
+
+    def put(self, data: bytes, mime_type: str):
+        """Lưu bytes, trả về (tên blob, etag)."""
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.{_EXTENSIONS.get(mime_type, 'bin')}"
+        # Đã có: chỉ đánh dấu vừa dùng để không bị dọn sớm
+        if not self.touch(name):
+            self.set(name, data)
+        return name, digest
+
+    def open(self, name):
+        """Trả về (path, mime_type, etag) nếu blob tồn tại, ngược lại None."""
+        match = _NAME_PATTERN.match(name)
+        if not match:
+            return None
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        return path, _MIME_TYPES[match.group(2)], match.group(1)
+
+    def stats(self):
+        return {"blobs": len(self), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+blob_store = None
+
+
+def get_blob_store():
+    """Tạo kho blob ở lần dùng đầu tiên (chỉ khi có request delivery=url)."""
+    global blob_store
+    if blob_store is None:
+        blob_store = BlobStore(config.BLOB_STORE_DIR, config.BLOB_STORE_MAX_BYTES)
+    return blob_store
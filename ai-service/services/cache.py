@@ -0,0 +1,275 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(data: bytes, version: str = "") -> str:
+    """Khóa nội dung: sha256 của version + bytes (đổi version là đổi khóa)."""
+    digest = hashlib.sha256()
+    digest.update(version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Cache trong bộ nhớ, loại bỏ theo LRU (số lượng) và TTL (giây).
+    An toàn khi dùng từ nhiều thread.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Cache bytes trên đĩa, mỗi khóa một file. Vượt quá max_bytes thì xóa các
+    file ít được dùng gần đây nhất (theo mtime, được cập nhật mỗi lần get/touch).
+    Dùng chung cho thumbnail và kho blob (services.blob_store).
+    """
+
+    def __init__(self, root, max_bytes, suffix=""):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._sizes = {
+            entry.name: entry.stat().st_size
+            for entry in os.scandir(root)
+            if entry.is_file() and self._is_entry(entry.name)
+        }
+        self._total = sum(self._sizes.values())
+        self.hits = 0
+        self.misses = 0
+
+    def _is_entry(self, name):
+        return name.endswith(self.suffix) and not name.endswith(".tmp")
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def touch(self, key):
+        """Đánh dấu vừa dùng (không đọc file); False nếu khóa không có trên đĩa."""
+        try:
+            os.utime(self._path(key + self.suffix))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get(self, key):
+        name = key + self.suffix
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+            os.utime(self._path(name))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, key, data: bytes):
+        name = key + self.suffix
+        # Ghi ra file tạm rồi rename để reader không bao giờ thấy file dở dang
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        with self._lock:
+            self._total += len(data) - self._sizes.get(name, 0)
+            self._sizes[name] = len(data)
+            if self._total > self.max_bytes:
+                self._prune()
+
+    def _prune(self):
+        def mtime(name):
+            try:
+                return os.path.getmtime(self._path(name))
+            except FileNotFoundError:
+                return 0.0
+
+        for name in sorted(self._sizes, key=mtime):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            self._total -= self._sizes.pop(name)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._sizes),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class SQLiteStore:
+    """Tầng lưu trữ trên đĩa (SQLite) để cache sống sót qua các lần restart."""
+
+    def __init__(self, path, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, version TEXT, value TEXT, created_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl and created_at + self.ttl < time.time():
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return json.loads(value)
+
+    def set(self, key, value, version=""):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, version, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, version, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            if self.ttl:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,)
+                )
+            self._conn.commit()
+
+    def delete_other_versions(self, version):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM cache WHERE version != ?", (version,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResultCache:
+    """
+    Cache kết quả AI theo nội dung: tầng LRU trong bộ nhớ + tầng SQLite tùy chọn.
+    Giá trị phải serialize được sang JSON; mỗi lần get trả về một bản sao.
+    """
+
+    def __init__(self, version="", max_entries=1024, ttl=None, db_path=None):
+        self.version = version
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk = SQLiteStore(db_path, ttl=ttl) if db_path else None
+        if self.disk is not None:
+            # Bỏ các mục của prompt/model cũ còn sót trên đĩa
+            self.disk.delete_other_versions(version)
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, data: bytes) -> str:
+        return content_key(data, self.version)
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value, version=self.version)
+
+    def invalidate(self, version=None):
+        """
+        Xóa cache. Nếu truyền version mới (ví dụ khi prompt thay đổi) thì chỉ
+        giữ lại các mục trên đĩa thuộc version đó; trả về số mục đã xóa.
+        """
+        removed = len(self.memory)
+        self.memory.clear()
+        if version is not None:
+            self.version = version
+        if self.disk is not None:
+            if version is None:
+                removed += len(self.disk)
+                self.disk.clear()
+            else:
+                removed += self.disk.delete_other_versions(version)
+        return removed
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else None,
+        }
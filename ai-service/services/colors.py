@@ -0,0 +1,166 @@
+import numpy as np
+from PIL import Image
+
+from services.preprocess import open_image
+
+# Bảng 12 màu mà prompt /analyze yêu cầu Gemini chọn; mỗi màu có vài sắc độ mẫu (sRGB)
+PALETTE = {
+    "Đen": [(20, 20, 22), (40, 40, 45)],
+    "Trắng": [(245, 245, 245), (232, 232, 226)],
+    "Xám": [(128, 128, 128), (180, 180, 182), (85, 85, 90)],
+    "Be": [(225, 205, 170), (208, 188, 150), (240, 228, 205)],
+    "Nâu": [(110, 70, 40), (150, 100, 60), (75, 50, 32)],
+    "Vàng": [(240, 210, 40), (228, 190, 75), (250, 235, 130)],
+    "Cam": [(240, 130, 30), (220, 100, 45), (245, 165, 100)],
+    "Đỏ(Red)": [(200, 30, 35), (140, 22, 35), (225, 60, 60)],
+    "Hồng": [(240, 150, 180), (225, 80, 140), (250, 205, 215)],
+    "Tím": [(120, 60, 160), (180, 145, 210), (80, 40, 100)],
+    "Xanh dương": [(30, 80, 180), (28, 38, 80), (125, 170, 220), (70, 100, 140)],
+    "Xanh lá": [(40, 140, 60), (105, 170, 80), (70, 85, 45), (155, 205, 160)],
+}
+COLOR_NAMES = list(PALETTE)
+
+# Tên màu khác model hay trả về thay cho tên trong bảng
+COLOR_ALIASES = {
+    "black": "Đen", "white": "Trắng", "kem": "Be", "beige": "Be", "grey": "Xám", "gray": "Xám",
+    "brown": "Nâu", "yellow": "Vàng", "orange": "Cam", "red": "Đỏ(Red)", "pink": "Hồng",
+    "purple": "Tím", "blue": "Xanh dương", "navy": "Xanh dương", "xanh navy": "Xanh dương",
+    "denim": "Xanh dương", "green": "Xanh lá", "xanh rêu": "Xanh lá", "olive": "Xanh lá",
+}
+
+SAMPLE_EDGE = 64          # Ảnh được thu nhỏ về cạnh dài này trước khi tính
+BACKGROUND_DELTA_E = 12.0  # Pixel gần màu viền hơn ngưỡng này bị coi là nền
+MIN_SHARE = 0.15           # Màu chiếm ít hơn tỉ lệ này của món đồ bị bỏ qua
+MAX_COLORS = 3
+
+
+def srgb_to_lab(rgb):
+    """rgb: mảng (..., 3) uint8/float 0-255 -> CIE Lab (D65)."""
+    c = np.asarray(rgb, dtype=np.float32) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([
+        116.0 * f[..., 1] - 16.0,
+        500.0 * (f[..., 0] - f[..., 1]),
+        200.0 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+_PROTOTYPES = np.array([rgb for name in COLOR_NAMES for rgb in PALETTE[name]], dtype=np.float32)
+_PROTOTYPE_LAB = srgb_to_lab(_PROTOTYPES)
+_PROTOTYPE_COLOR = np.array([i for i, name in enumerate(COLOR_NAMES) for _ in PALETTE[name]])
+
+
+def _load_pixels(source):
+    """Thu nhỏ ảnh (draft JPEG) và trả về (rgb HxWx3 uint8, alpha HxW hoặc None)."""
+    if isinstance(source, (bytes, bytearray)):
+        img = open_image(bytes(source), draft_size=SAMPLE_EDGE)
+    else:
+        img = source.copy()
+    img.thumbnail((SAMPLE_EDGE, SAMPLE_EDGE), Image.Resampling.BILINEAR)
+
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = np.asarray(img.convert("RGBA"))
+        return rgba[..., :3], rgba[..., 3]
+    return np.asarray(img.convert("RGB")), None
+
+
+def foreground_mask(lab, alpha=None):
+    """
+    Ảnh có alpha (đã tách nền): dùng alpha. Ngược lại ước lượng màu nền từ viền
+    ảnh (ảnh sản phẩm thường chụp trên nền trơn) và loại các pixel gần màu đó.
+    """
+    if alpha is not None:
+        mask = alpha > 127
+    else:
+        border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+        background = np.median(border, axis=0)
+        border_distance = np.linalg.norm(border - background, axis=1)
+        if np.mean(border_distance < BACKGROUND_DELTA_E) < 0.6:
+            # Viền không đồng nhất (ảnh chụp cận, nền lộn xộn) => dùng toàn bộ ảnh
+            return np.ones(lab.shape[:2], dtype=bool)
+        mask = np.linalg.norm(lab - background, axis=-1) >= BACKGROUND_DELTA_E
+    if mask.mean() < 0.05:
+        return np.ones(lab.shape[:2], dtype=bool)
+    return mask
+
+
+def color_shares(source):
+    """Tỉ lệ diện tích món đồ theo từng màu trong bảng, dạng dict tên -> share (giảm dần)."""
+    rgb, alpha = _load_pixels(source)
+    lab = srgb_to_lab(rgb)
+    pixels = lab[foreground_mask(lab, alpha)]
+
+    # Gán mỗi pixel cho sắc độ mẫu gần nhất (khoảng cách Lab), rồi đếm theo màu
+    distances = ((pixels[:, None, :] - _PROTOTYPE_LAB[None, :, :]) ** 2).sum(axis=-1)
+    counts = np.bincount(_PROTOTYPE_COLOR[distances.argmin(axis=1)], minlength=len(COLOR_NAMES))
+    shares = counts / max(1, counts.sum())
+    order = np.argsort(-shares, kind="stable")
+    return {COLOR_NAMES[i]: round(float(shares[i]), 4) for i in order if shares[i] > 0}
+
+
+def extract_colors(source, max_colors=MAX_COLORS, min_share=MIN_SHARE):
+    """
+    Các màu chính của món đồ (tên trong bảng 12 màu), màu chiếm nhiều nhất đứng trước.
+    source: bytes ảnh hoặc PIL Image. Chạy vài ms trên CPU, không gọi model.
+    """
+    shares = color_shares(source)
+    colors = [name for name, share in shares.items() if share >= min_share][:max_colors]
+    return colors or list(shares)[:1]
+
+
+def normalize_color_names(colors):
+    """Đưa tên màu model trả về về đúng tên trong bảng ("đỏ" -> "Đỏ(Red)"); bỏ tên lạ."""
+    normalized = []
+    for color in colors or []:
+        text = str(color).strip().lower()
+        match = COLOR_ALIASES.get(text)
+        for name in COLOR_NAMES:
+            if match:
+                break
+            base = name.split("(")[0].lower()
+            if text == name.lower() or text == base or text.startswith(base + " ") or text.startswith(base + "("):
+                match = name
+        if match and match not in normalized:
+            normalized.append(match)
+    return normalized
+
+
+class ColorChecker:
+    """Đối chiếu màu Gemini trả về với màu tính tại chỗ và đếm tỉ lệ khớp."""
+
+    def __init__(self):
+        self.checked = 0
+        self.agreed = 0
+        self.filled = 0
+
+    def reconcile(self, model_colors, local_colors):
+        """
+        Trả về danh sách màu cuối cùng: màu của model (chuẩn hóa theo bảng);
+        nếu model không trả về màu hợp lệ nào thì dùng màu tính tại chỗ.
+        """
+        colors = normalize_color_names(model_colors)
+        if not colors:
+            self.filled += 1
+            return list(local_colors)
+        self.checked += 1
+        if local_colors and local_colors[0] in colors:
+            self.agreed += 1
+        return colors
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "agreed": self.agreed,
+            "agreement_rate": round(self.agreed / self.checked, 4) if self.checked else 0.0,
+            "filled": self.filled,
+        }
+
+
+color_checker = ColorChecker()
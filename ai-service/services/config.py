@@ -1,6 +1,5 @@
 import os
 import pathlib
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 # 1. Load environment variables
@@ -13,8 +12,128 @@ if not api_key:
     # Optional: Fallback to local check if needed
     pass
 
-genai.configure(api_key=api_key)
+# Nhiều API key để cộng quota: "key1,key2*2" (trọng số sau *), bỏ trống = chỉ dùng GEMINI_API_KEY
+GEMINI_API_KEYS = os.getenv("GEMINI_API_KEYS", "")
 
 # Model configuration
 MODEL_NAME = 'gemini-2.5-flash' # Using for vision capabilities
-model = genai.GenerativeModel(MODEL_NAME)
+MODEL_LITE_NAME = 'gemini-2.5-flash-lite'  # Tầng nhẹ: bước chỉ có text, dự phòng khi tầng chính bị 429
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini").lower()  # gemini | fake (giả lập, không cần mạng, dùng cho benchmark)
+# Model cho từng loại lệnh gọi: các tầng cách nhau bởi ">" (thứ tự failover khi bị 429),
+# trong một tầng "model*trọng số" cách nhau bởi dấu phẩy; mỗi model được gọi qua mọi API key
+MODEL_ROUTES = {
+    "analyze": os.getenv("MODEL_ROUTE_ANALYZE", f"{MODEL_NAME}>{MODEL_LITE_NAME}"),
+    "suggest": os.getenv("MODEL_ROUTE_SUGGEST", f"{MODEL_NAME}>{MODEL_LITE_NAME}"),
+    "vision": os.getenv("MODEL_ROUTE_VISION", f"{MODEL_NAME}>{MODEL_LITE_NAME}"),
+    "prompt": os.getenv("MODEL_ROUTE_PROMPT", f"{MODEL_LITE_NAME}>{MODEL_NAME}"),
+}
+
+def model_id(task):
+    # Tên model trong khóa cache: đổi tuyến model của task thì cache cũ tự vô hiệu,
+    # kết quả của fake backend không bao giờ lẫn với kết quả Gemini thật
+    route = MODEL_ROUTES[task]
+    return route if MODEL_BACKEND == "gemini" else f"{MODEL_BACKEND}:{route}"
+
+# Fake backend (MODEL_BACKEND=fake)
+FAKE_MODEL_LATENCY = os.getenv("FAKE_MODEL_LATENCY", "lognormal:0.8:0.4")  # fixed:<s> | uniform:<min>:<max> | lognormal:<median>:<sigma>
+FAKE_MODEL_429_RATE = float(os.getenv("FAKE_MODEL_429_RATE", "0"))  # Xác suất một lệnh gọi trả về 429
+FAKE_MODEL_RETRY_AFTER = float(os.getenv("FAKE_MODEL_RETRY_AFTER", "2"))  # Gợi ý "retry in Ns" trong lỗi 429 giả
+FAKE_MODEL_CHUNK_CHARS = int(os.getenv("FAKE_MODEL_CHUNK_CHARS", "24"))  # Số ký tự mỗi chunk khi stream
+FAKE_MODEL_CHUNK_DELAY = float(os.getenv("FAKE_MODEL_CHUNK_DELAY", "0.02"))  # Độ trễ giữa các chunk (giây)
+FAKE_MODEL_RESPONSES = os.getenv("FAKE_MODEL_RESPONSES", "")  # File JSON {analyze|analyze_batch|vision|suggest|lookbook_prompt: text}
+FAKE_MODEL_SEED = int(os.getenv("FAKE_MODEL_SEED", "1234"))  # Seed cho độ trễ và lỗi 429 (chạy lại cho cùng kết quả)
+FAKE_MODEL_RPM = float(os.getenv("FAKE_MODEL_RPM", "0"))  # Quota giả của mỗi cặp key/model (requests/phút), vượt thì trả 429 (0 = không giới hạn)
+
+# 3. Model client limits
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))  # Số lệnh gọi Gemini chạy song song tối đa
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))  # Timeout mặc định cho mỗi lệnh gọi (giây)
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))  # Quota requests/phút của mỗi cặp API key/model
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "5"))  # Số request tối đa được gửi dồn một lúc
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))  # Số lần thử lại khi gặp 429
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1"))  # Backoff cơ sở (giây)
+GEMINI_RETRY_DEADLINE = float(os.getenv("GEMINI_RETRY_DEADLINE", "45"))  # Tổng thời gian tối đa kể cả chờ/thử lại (giây)
+MODEL_ROUTER_FAILURE_THRESHOLD = int(os.getenv("MODEL_ROUTER_FAILURE_THRESHOLD", "3"))  # Số lỗi liên tiếp (không phải 429) để tạm ngắt một cặp key/model
+MODEL_ROUTER_COOLDOWN = float(os.getenv("MODEL_ROUTER_COOLDOWN", "30"))  # Thời gian tạm ngắt (giây) trước khi thử lại cặp đó
+
+# 4. Analysis result cache
+ANALYZE_CACHE_SIZE = int(os.getenv("ANALYZE_CACHE_SIZE", "1024"))  # Số kết quả giữ trong bộ nhớ
+ANALYZE_CACHE_TTL = float(os.getenv("ANALYZE_CACHE_TTL", "604800"))  # Thời gian sống (giây), mặc định 7 ngày
+ANALYZE_CACHE_DB = os.getenv("ANALYZE_CACHE_DB", "")  # Đường dẫn SQLite cho tầng đĩa (bỏ trống = tắt)
+ANALYZE_BATCH_PACK_SIZE = int(os.getenv("ANALYZE_BATCH_PACK_SIZE", "4"))  # Số ảnh gộp trong 1 lệnh gọi /analyze/batch
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_CONCURRENCY", "4"))  # Số lệnh gọi song song của 1 batch
+ANALYZE_COLOR_CHECK = os.getenv("ANALYZE_COLOR_CHECK", "true").lower() == "true"  # Đối chiếu/điền màu bằng engine màu nội bộ
+ANALYZE_LOCAL_FALLBACK = os.getenv("ANALYZE_LOCAL_FALLBACK", "true").lower() == "true"  # Trả màu tính tại chỗ khi hết quota
+ANALYZE_DEDUP_DISTANCE = int(os.getenv("ANALYZE_DEDUP_DISTANCE", "6"))  # Ngưỡng pHash (bit) để coi 2 ảnh là gần trùng (0 = tắt)
+ANALYZE_DEDUP_INDEX_SIZE = int(os.getenv("ANALYZE_DEDUP_INDEX_SIZE", "100000"))  # Số ảnh tối đa trong chỉ mục ảnh gần trùng
+ANALYZE_MAX_UPLOAD_BYTES = int(os.getenv("ANALYZE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))  # Giới hạn ảnh upload
+
+# 5. Image fetching
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))  # Timeout cho mỗi lần tải ảnh (giây)
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "15"))  # Deadline tổng cho cả lượt tải (giây)
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(15 * 1024 * 1024)))  # Kích thước tối đa mỗi ảnh
+FETCH_MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "8"))  # Số kết nối tối đa tới mỗi host
+FETCH_MAX_HOSTS = int(os.getenv("FETCH_MAX_HOSTS", "10"))  # Số host giữ connection pool
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "16"))  # Số thread tải ảnh
+
+# 6. Background removal (rembg)
+REMBG_MODEL = os.getenv("REMBG_MODEL", "u2net")  # Model rembg
+REMBG_WORKERS = int(os.getenv("REMBG_WORKERS", "0"))  # Số process tách nền (0 = chạy trong process chính)
+AUTO_CROP_ALPHA_THRESHOLD = int(os.getenv("AUTO_CROP_ALPHA_THRESHOLD", "10"))  # Alpha <= ngưỡng bị coi là nền khi cắt sát (bỏ viền mờ)
+
+# 7. Image preprocessing before model calls
+MODEL_IMAGE_MAX_EDGE = int(os.getenv("MODEL_IMAGE_MAX_EDGE", "1024"))  # Cạnh dài tối đa của ảnh gửi cho Gemini
+MODEL_IMAGE_FORMAT = os.getenv("MODEL_IMAGE_FORMAT", "JPEG")  # JPEG hoặc WEBP
+MODEL_IMAGE_QUALITY = int(os.getenv("MODEL_IMAGE_QUALITY", "85"))  # Chất lượng nén
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "50000000"))  # Từ chối ảnh lớn hơn (chống decompression bomb)
+
+# 8. Stylist prompt
+SUGGEST_WARDROBE_TOKEN_BUDGET = int(os.getenv("SUGGEST_WARDROBE_TOKEN_BUDGET", "6000"))  # Ngân sách token cho danh sách tủ đồ
+SUGGEST_PREFILTER_THRESHOLD = int(os.getenv("SUGGEST_PREFILTER_THRESHOLD", "60"))  # Tủ đồ lớn hơn sẽ được lọc trước tại chỗ
+SUGGEST_PREFILTER_PER_ROLE = int(os.getenv("SUGGEST_PREFILTER_PER_ROLE", "12"))  # Số món giữ lại cho mỗi loại (áo, quần, giày...)
+SUGGEST_LOCAL_FALLBACK = os.getenv("SUGGEST_LOCAL_FALLBACK", "true").lower() == "true"  # Gợi ý nội bộ khi hết quota
+
+# 9. Visualization jobs
+VISUALIZE_JOB_WORKERS = int(os.getenv("VISUALIZE_JOB_WORKERS", "2"))  # Số job /visualize chạy cùng lúc
+VISUALIZE_JOB_MAX_PENDING = int(os.getenv("VISUALIZE_JOB_MAX_PENDING", "100"))  # Số job chưa xong tối đa
+VISUALIZE_JOB_TTL = float(os.getenv("VISUALIZE_JOB_TTL", "3600"))  # Giữ kết quả job trong bao lâu (giây)
+VISUALIZE_JOB_MAX_FINISHED = int(os.getenv("VISUALIZE_JOB_MAX_FINISHED", "200"))  # Số job đã xong giữ lại tối đa (bỏ job cũ nhất)
+VISUALIZE_JOB_STORE = os.getenv("VISUALIZE_JOB_STORE", "memory")  # memory hoặc sqlite
+VISUALIZE_JOB_DB = os.getenv("VISUALIZE_JOB_DB", "visualize_jobs.db")  # File SQLite khi dùng store sqlite
+
+# 10. Lookbook vision cache
+VISION_CACHE_SIZE = int(os.getenv("VISION_CACHE_SIZE", "512"))  # Số mô tả Vision / prompt lookbook giữ trong bộ nhớ
+VISION_ISOLATED_CACHE_SIZE = int(os.getenv("VISION_ISOLATED_CACHE_SIZE", "64"))  # Số ảnh đã tách nền giữ trong bộ nhớ
+VISION_CACHE_TTL = float(os.getenv("VISION_CACHE_TTL", "86400"))  # Thời gian sống (giây), mặc định 1 ngày
+
+# 11. Moodboard output
+MOODBOARD_FORMAT = os.getenv("MOODBOARD_FORMAT", "PNG")  # Định dạng mặc định: PNG, JPEG hoặc WEBP
+MOODBOARD_QUALITY = int(os.getenv("MOODBOARD_QUALITY", "80"))  # Chất lượng nén JPEG/WEBP
+MOODBOARD_PNG_COMPRESS_LEVEL = int(os.getenv("MOODBOARD_PNG_COMPRESS_LEVEL", "6"))  # 1 = nhanh nhất, 9 = nhỏ nhất
+MOODBOARD_WEBP_METHOD = int(os.getenv("MOODBOARD_WEBP_METHOD", "4"))  # 0 = nhanh nhất, 6 = nhỏ nhất
+MOODBOARD_MAX_EDGE = int(os.getenv("MOODBOARD_MAX_EDGE", "2000"))  # Kích thước moodboard tối đa client được yêu cầu
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", "thumbnails")  # Cache thumbnail món đồ trên đĩa (bỏ trống = tắt)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # Dung lượng tối đa cache thumbnail
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")  # Thư mục lưu moodboard khi delivery=url
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(512 * 1024 * 1024)))  # Dung lượng tối đa, vượt thì xóa blob cũ nhất
+BLOB_PUBLIC_BASE_URL = os.getenv("BLOB_PUBLIC_BASE_URL", "")  # Tiền tố URL trả về cho client (bỏ trống = đường dẫn tương đối)
+
+# 12. Observability
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"  # Gửi header Server-Timing (thời gian từng bước)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Tỉ lệ request được cProfile (0 = tắt, 0.01 = 1%)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # Thư mục ghi file .prof
+
+# 13. Wardrobe snapshots (/suggest delta sync)
+WARDROBE_SNAPSHOT_MAX_ENTRIES = int(os.getenv("WARDROBE_SNAPSHOT_MAX_ENTRIES", "1000"))  # Số snapshot tủ đồ tối đa (LRU)
+WARDROBE_SNAPSHOT_TTL = int(os.getenv("WARDROBE_SNAPSHOT_TTL", "86400"))  # Snapshot không dùng quá thời gian này (giây) bị xóa
+WARDROBE_SNAPSHOT_MAX_BYTES = int(os.getenv("WARDROBE_SNAPSHOT_MAX_BYTES", str(64 * 1024 * 1024)))  # Ngân sách bộ nhớ cho mọi snapshot
+
+# 14. Startup
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"  # Load SDK Gemini + rembg ở nền sau khi khởi động (false = load ở request đầu tiên)
+
+# 15. Admission control (giới hạn theo endpoint, deadline của client)
+ADMISSION_LIMITS = os.getenv(
+    "ADMISSION_LIMITS",
+    "/analyze=16:64,/analyze/upload=16:64,/analyze/batch=2:4,/suggest=8:32,/suggest/stream=8:32,/visualize=2:8"
+)  # POST path=số request chạy cùng lúc:số request được xếp hàng (path không có trong danh sách thì không giới hạn)
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))  # Thời gian chờ trong hàng tối đa (giây), quá thì trả 503
+ADMISSION_DEADLINE_HEADER = os.getenv("ADMISSION_DEADLINE_HEADER", "X-Request-Timeout")  # Header client gửi số giây nó còn chờ; quá hạn thì hủy request (504)
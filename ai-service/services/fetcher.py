@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from services import config, metrics
+
+_session = None
+_session_lock = threading.Lock()
+
+_executor = ThreadPoolExecutor(max_workers=config.FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+
+
+class FetchError(Exception):
+    pass
+
+
+def get_session():
+    """
+    Session dùng chung: giữ kết nối keep-alive, giới hạn số kết nối mỗi host.
+    Tạo ở lần tải đầu tiên (hoặc lúc warm-up) để import requests không làm chậm khởi động.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=config.FETCH_MAX_HOSTS,
+                    pool_maxsize=config.FETCH_MAX_PER_HOST,
+                    pool_block=True,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def fetch_bytes(url, timeout=None, max_bytes=None):
+    """Tải nội dung một URL, dừng sớm nếu vượt quá max_bytes."""
+    timeout = timeout if timeout is not None else config.FETCH_TIMEOUT
+    max_bytes = max_bytes if max_bytes is not None else config.FETCH_MAX_BYTES
+
+    with get_session().get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise FetchError(f"Response too large ({declared} bytes): {url}")
+
+        chunks = []
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            received += len(chunk)
+            if received > max_bytes:
+                raise FetchError(f"Response exceeded {max_bytes} bytes: {url}")
+            chunks.append(chunk)
+        metrics.fetch_bytes.inc(received)
+        return b"".join(chunks)
+
+
+def fetch_all(urls, deadline=None, max_bytes=None):
+    """
+    Tải song song nhiều URL (mỗi URL chỉ tải 1 lần).
+    Trả về dict url -> bytes; URL lỗi hoặc quá deadline có giá trị None.
+    """
+    deadline = deadline if deadline is not None else config.FETCH_DEADLINE
+    unique_urls = list(dict.fromkeys(url for url in urls if url))
+    if not unique_urls:
+        return {}
+
+    started = time.monotonic()
+    futures = {
+        url: _executor.submit(fetch_bytes, url, min(config.FETCH_TIMEOUT, deadline), max_bytes)
+        for url in unique_urls
+    }
+    wait(futures.values(), timeout=max(0.0, deadline - (time.monotonic() - started)))
+
+    results = {}
+    for url, future in futures.items():
+        if future.done() and future.exception() is None:
+            results[url] = future.result()
+        else:
+            future.cancel()
+            results[url] = None
+    return results
+
+
+async def fetch_all_async(urls, deadline=None, max_bytes=None):
+    return await asyncio.to_thread(fetch_all, urls, deadline, max_bytes)
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from services import config
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MemoryJobStore:
+    """Lưu trạng thái job trong bộ nhớ của process."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, kind):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": STATUS_QUEUED,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+
+    def update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(status=status, result=result, error=error, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def cleanup(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in (STATUS_DONE, STATUS_FAILED) and job["updated_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def trim(self, max_finished):
+        # Chỉ giữ max_finished job đã xong gần nhất (mỗi kết quả có thể là cả ảnh base64)
+        with self._lock:
+            finished = sorted(
+                (job["updated_at"], job_id) for job_id, job in self._jobs.items()
+                if job["status"] in (STATUS_DONE, STATUS_FAILED)
+            )
+            evicted = finished[:max(0, len(finished) - max_finished)]
+            for _, job_id in evicted:
+                del self._jobs[job_id]
+        return len(evicted)
+
+    def fail_unfinished(self, error):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] in (STATUS_QUEUED, STATUS_RUNNING):
+                    job.update(status=STATUS_FAILED, error=error, updated_at=time.time())
+
+
+class SQLiteJobStore:
+    """Lưu trạng thái job trong SQLite để GET vẫn trả lời được sau khi restart."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, kind TEXT, status TEXT, result TEXT, error TEXT,"
+            " created_at REAL, updated_at REAL)"
+        )
+        self._conn.commit()
+
+    def create(self, job_id, kind):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, STATUS_QUEUED, now, now),
+            )
+            self._conn.commit()
+
+    def update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, status, result, error, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+
+    def cleanup(self, ttl):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_DONE, STATUS_FAILED, time.time() - ttl),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def trim(self, max_finished):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE job_id IN ("
+                " SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (STATUS_DONE, STATUS_FAILED, max_finished),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def fail_unfinished(self, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?)",
+                (STATUS_FAILED, error, time.time(), STATUS_QUEUED, STATUS_RUNNING),
+            )
+            self._conn.commit()
+
+
+class JobQueue:
+    """
+    Hàng đợi job chạy nền trong event loop: tối đa `workers` job chạy cùng lúc,
+    tối đa `max_pending` job chưa xong; job đã xong bị xóa sau `ttl` giây, và chỉ giữ
+    tối đa `max_finished` job đã xong (bỏ job cũ nhất trước).
+    """
+
+    def __init__(self, store, workers, max_pending, ttl, max_finished):
+        self.store = store
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._semaphore = asyncio.Semaphore(workers)
+        self._tasks = set()
+        self._cleaner = None
+        # Job dang dở từ lần chạy trước (SQLite) sẽ không bao giờ xong
+        self.store.fail_unfinished("Interrupted by service restart")
+
+    def submit(self, kind, fn):
+        """fn: coroutine function trả về kết quả JSON-serializable. Trả về job_id."""
+        if len(self._tasks) >= self.max_pending:
+            raise QueueFull(f"Too many pending jobs ({self.max_pending})")
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, kind)
+        task = asyncio.create_task(self._run(job_id, fn))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _run(self, job_id, fn):
+        async with self._semaphore:
+            self.store.update(job_id, STATUS_RUNNING)
+            try:
+                result = await fn()
+            except Exception as e:
+                self.store.update(job_id, STATUS_FAILED, error=str(e))
+            else:
+                self.store.update(job_id, STATUS_DONE, result=result)
+            self.store.trim(self.max_finished)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    async def _clean_periodically(self):
+        while True:
+            await asyncio.sleep(max(1.0, min(self.ttl, 60.0)))
+            self.store.cleanup(self.ttl)
+
+    def start(self):
+        if self._cleaner is None:
+            self._cleaner = asyncio.create_task(self._clean_periodically())
+
+    async def stop(self):
+        for task in [self._cleaner, *self._tasks]:
+            if task is not None:
+                task.cancel()
+        self._cleaner = None
+
+    def stats(self):
+        return {"pending": len(self._tasks), "max_pending": self.max_pending, "max_finished": self.max_finished}
+
+
+def create_job_queue():
+    if config.VISUALIZE_JOB_STORE == "sqlite":
+        store = SQLiteJobStore(config.VISUALIZE_JOB_DB)
+    else:
+        store = MemoryJobStore()
+    return JobQueue(
+        store,
+        workers=config.VISUALIZE_JOB_WORKERS,
+        max_pending=config.VISUALIZE_JOB_MAX_PENDING,
+        ttl=config.VISUALIZE_JOB_TTL,
+        max_finished=config.VISUALIZE_JOB_MAX_FINISHED,
+    )
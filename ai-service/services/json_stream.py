@@ -0,0 +1,62 @@
+import json
+
+
+class JsonArrayStream:
+    """
+    Parser tăng dần cho một mảng JSON các object được stream từng đoạn text.
+    feed() trả về các object vừa đóng ngoặc xong, không cần chờ hết mảng.
+    Bỏ qua mọi text bao quanh mảng (markdown ```json, lời dẫn...).
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._done = False
+
+    def feed(self, text):
+        objects = []
+        for char in text:
+            if self._done:
+                break
+            if not self._in_array:
+                if char == "[":
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # Giữa các phần tử: chỉ quan tâm tới '{' mở object và ']' đóng mảng
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                elif char == "]":
+                    self._done = True
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._buffer)))
+                    except ValueError:
+                        pass  # Bỏ qua object hỏng, tiếp tục với phần tử sau
+                    self._buffer = []
+        return objects
+
+    @property
+    def done(self):
+        return self._done
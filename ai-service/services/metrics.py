@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from services import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(zip(self.label_names, key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                labels = list(zip(self.label_names, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    le = _format_labels(labels + [("le", _format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {entry[-2]!r}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    """Tập metric xuất ra /metrics theo định dạng text của Prometheus."""
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def callback(self, name, help_text, metric_type, fn):
+        """Metric đọc lúc scrape: fn() trả về list (dict labels, value)."""
+        self._callbacks.append((name, help_text, metric_type, fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, metric_type, fn in self._callbacks:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in fn():
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "ootd_http_request_seconds", "Thời gian xử lý request HTTP", ("method", "path", "status")
+)
+http_request_bytes = registry.counter(
+    "ootd_http_request_bytes_total", "Số byte body request nhận vào", ("path",)
+)
+http_response_bytes = registry.counter(
+    "ootd_http_response_bytes_total", "Số byte body response trả ra (khi biết Content-Length)", ("path",)
+)
+stage_seconds = registry.histogram(
+    "ootd_stage_seconds", "Thời gian từng bước xử lý (fetch, rembg, vision, model, encode...)", ("stage",)
+)
+model_calls = registry.counter(
+    "ootd_model_calls_total", "Số lệnh gọi Gemini theo kết quả", ("kind", "outcome")
+)
+model_call_seconds = registry.histogram(
+    "ootd_model_call_seconds", "Thời gian một lệnh gọi Gemini (kể cả chờ quota)", ("kind",)
+)
+model_throttled = registry.counter("ootd_model_throttled_total", "Số lần Gemini trả về 429")
+model_input_bytes = registry.counter("ootd_model_image_bytes_total", "Số byte ảnh gửi lên Gemini")
+fetch_bytes = registry.counter("ootd_fetch_bytes_total", "Số byte ảnh tải về từ URL món đồ")
+
+# Thời gian từng bước của request hiện tại, dùng cho header Server-Timing
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    """Bắt đầu thu thập span cho request hiện tại; trả về dict name -> [giây, số lần]."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def record(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def span(stage):
+    """Đo thời gian một bước: `with span("rembg"): ...` (dùng được trong cả code async)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def server_timing(timings):
+    """Giá trị header Server-Timing: `fetch;dur=12.3, rembg;dur=80.1;desc="x2"`."""
+    parts = []
+    for stage, (seconds, count) in timings.items():
+        part = f"{stage};dur={seconds * 1000:.1f}"
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+class SampledProfiler:
+    """
+    Chạy cProfile cho một phần nhỏ request (PROFILE_SAMPLE_RATE) và ghi file .prof
+    vào PROFILE_DIR (xem bằng snakeviz / pstats). Chỉ profile một request mỗi lúc;
+    cProfile chỉ thấy thread event loop, phần chạy trong threadpool/process pool không có.
+    """
+
+    def __init__(self, rate, directory):
+        self.rate = rate
+        self.directory = directory
+        self._active = False
+        self.samples = 0
+
+    def start(self):
+        if self.rate <= 0 or self._active or random.random() >= self.rate:
+            return None
+        self._active = True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Đã có profiler khác đang chạy trong process
+            self._active = False
+            return None
+        return profiler
+
+    def stop(self, profiler, label):
+        profiler.disable()
+        self._active = False
+        os.makedirs(self.directory, exist_ok=True)
+        name = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "root"
+        profiler.dump_stats(os.path.join(self.directory, f"{int(time.time() * 1000)}-{name}.prof"))
+        self.samples += 1
+
+
+profiler = SampledProfiler(config.PROFILE_SAMPLE_RATE, config.PROFILE_DIR)
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+
+from services import config
+
+
+class ModelResponse:
+    """Kết quả một lệnh gọi (hoặc một chunk khi stream): chỉ cần thuộc tính text."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class ModelBackend:
+    """
+    Giao diện mà model_client cần từ một model (trùng với google.generativeai.GenerativeModel):
+    - generate_content(contents, stream=False, **kwargs): đồng bộ; stream=True trả về iterator chunk.
+    - generate_content_async(contents, stream=False, **kwargs): tùy chọn; stream=True trả về
+      object có __aiter__. Có hàm này thì model_client không cần chạy trong thread pool.
+    contents: str hoặc list gồm prompt (str) và ảnh dạng {"mime_type", "data"}.
+    """
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        raise NotImplementedError
+
+
+def create_model(model_name, api_key=None):
+    """Tạo model theo MODEL_BACKEND (gemini | fake) cho một cặp model/API key."""
+    if config.MODEL_BACKEND == "gemini":
+        import google.generativeai as genai
+        if api_key is None or api_key == config.api_key:
+            genai.configure(api_key=config.api_key)
+            return genai.GenerativeModel(model_name)
+        return GeminiKeyModel(model_name, api_key)
+    if config.MODEL_BACKEND == "fake":
+        return FakeModel.from_config()
+    raise ValueError(f"Unknown MODEL_BACKEND: {config.MODEL_BACKEND}")
+
+
+class GeminiKeyModel(ModelBackend):
+    """
+    Model Gemini gọi bằng API key riêng: genai.configure của google-generativeai chỉ giữ
+    một key toàn cục, nên các key khác dùng client của SDK google-genai (mỗi
+    genai.Client giữ key của nó, đều là API công khai).
+    """
+
+    def __init__(self, model_name, api_key):
+        from google import genai
+
+        self.model_name = model_name
+        self.client = genai.Client(api_key=api_key)
+
+    @staticmethod
+    def _contents(contents):
+        # Ảnh dạng {"mime_type", "data"} như GenerativeModel nhận => Part của google-genai
+        from google.genai import types
+
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        return [
+            types.Part.from_bytes(data=part["data"], mime_type=part["mime_type"]) if isinstance(part, dict) else part
+            for part in parts
+        ]
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        models = self.client.models
+        method = models.generate_content_stream if stream else models.generate_content
+        return method(model=self.model_name, contents=self._contents(contents), **kwargs)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        models = self.client.aio.models
+        method = models.generate_content_stream if stream else models.generate_content
+        return await method(model=self.model_name, contents=self._contents(contents), **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Fake backend: không cần mạng/quota, dùng cho benchmark và kiểm thử tải
+# ---------------------------------------------------------------------------
+
+FAKE_ANALYSIS = {
+    "category": "Áo",
+    "color": ["Trắng", "Xanh dương"],
+    "season": ["Mùa Hạ", "Mùa Thu"],
+    "notes": "Phù hợp mặc đi chơi, phối với quần jean.",
+    "tags": ["casual", "cotton", "basic"],
+}
+FAKE_VISION = "A plain white cotton crew-neck t-shirt with short sleeves and a relaxed fit."
+FAKE_LOOKBOOK_PROMPT = (
+    "Photorealistic full-body fashion photo of a model in a white cotton t-shirt and light denim jeans, "
+    "studio lighting, 8k, professional fashion photography"
+)
+_WARDROBE_ROW = re.compile(r"^\s*(i\d+)\|", re.MULTILINE)
+
+
+def parse_latency(spec):
+    """
+    "fixed:0.2" | "uniform:0.1:0.5" | "lognormal:<median>:<sigma>" (giây)
+    -> hàm rng -> độ trễ.
+    """
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0.0, sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def classify_contents(contents):
+    """Đoán loại lệnh gọi từ prompt/ảnh: analyze, analyze_batch, vision, suggest, lookbook_prompt."""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    prompt = next((part for part in parts if isinstance(part, str)), "")
+    images = sum(1 for part in parts if not isinstance(part, str))
+    if images > 1:
+        return "analyze_batch", images, prompt
+    if images == 1:
+        return ("analyze" if '"category"' in prompt else "vision"), images, prompt
+    if "item_ids" in prompt:
+        return "suggest", 0, prompt
+    return "lookbook_prompt", 0, prompt
+
+
+def fake_suggestions(prompt, count=3, per_outfit=4):
+    # Lấy các id ngắn (i1, i2...) có trong bảng tủ đồ của prompt, chia đều cho các outfit
+    ids = _WARDROBE_ROW.findall(prompt) or ["i1"]
+    outfits = []
+    for n in range(count):
+        picked = [ids[(n + k * count) % len(ids)] for k in range(per_outfit)]
+        outfits.append({
+            "outfit_name": f"Fake Outfit {n + 1}",
+            "item_ids": list(dict.fromkeys(picked)),
+            "description": "Bộ đồ sinh bởi fake backend",
+            "rationale": "Phản hồi cố định dùng cho benchmark, không phải gợi ý thật.",
+        })
+    return outfits
+
+
+class FakeStream:
+    """Stream chunk cho cả API đồng bộ (iter) và async (aiter)."""
+
+    def __init__(self, model, chunks, first_delay):
+        self.model = model
+        self.chunks = chunks
+        self.first_delay = first_delay
+
+    def __iter__(self):
+        for index, chunk in enumerate(self.chunks):
+            time.sleep(self.first_delay if index == 0 else self.model.chunk_delay)
+            yield ModelResponse(chunk)
+
+    async def _agen(self):
+        for index, chunk in enumerate(self.chunks):
+            await asyncio.sleep(self.first_delay if index == 0 else self.model.chunk_delay)
+            yield ModelResponse(chunk)
+
+    def __aiter__(self):
+        return self._agen()
+
+
+class FakeModel(ModelBackend):
+    """
+    Model giả lập, xác định theo seed: trả về JSON/text dựng sẵn theo loại lệnh gọi,
+    độ trễ theo phân phối cấu hình, chèn lỗi 429 với xác suất rate_429,
+    stream theo từng chunk chunk_chars ký tự.
+    responses: dict loại lệnh gọi -> text, thay cho phản hồi mặc định.
+    rpm: quota giả (số request trong cửa sổ trượt quota_window giây, mặc định 1 phút) của
+    instance, vượt thì trả 429 như Gemini; mỗi cặp key/model của router có instance riêng
+    (0 = không giới hạn).
+    """
+
+    def __init__(self, latency="fixed:0.2", rate_429=0.0, retry_after=2.0,
+                 chunk_chars=24, chunk_delay=0.02, responses=None, seed=1234, rpm=0.0, quota_window=60.0):
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.responses = responses or {}
+        self.rng = random.Random(seed)
+        self.rpm = rpm
+        self.quota_window = quota_window
+        self._window = deque()
+        self.calls = {}
+
+    @classmethod
+    def from_config(cls):
+        responses = None
+        if config.FAKE_MODEL_RESPONSES:
+            with open(config.FAKE_MODEL_RESPONSES, encoding="utf-8") as f:
+                responses = json.load(f)
+        return cls(
+            latency=config.FAKE_MODEL_LATENCY,
+            rate_429=config.FAKE_MODEL_429_RATE,
+            retry_after=config.FAKE_MODEL_RETRY_AFTER,
+            chunk_chars=config.FAKE_MODEL_CHUNK_CHARS,
+            chunk_delay=config.FAKE_MODEL_CHUNK_DELAY,
+            responses=responses,
+            seed=config.FAKE_MODEL_SEED,
+            rpm=config.FAKE_MODEL_RPM,
+        )
+
+    def respond(self, contents):
+        """(độ trễ, text) cho một lệnh gọi; ném lỗi 429 giống Gemini khi bị chèn lỗi."""
+        kind, images, prompt = classify_contents(contents)
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+        delay = self.latency(self.rng)
+        if self.rate_429 and self.rng.random() < self.rate_429:
+            raise Exception(f"429 Resource has been exhausted (fake). Please retry in {self.retry_after}s")
+        if self.rpm:
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= self.quota_window:
+                self._window.popleft()
+            if len(self._window) >= self.rpm:
+                retry_in = self.quota_window - (now - self._window[0])
+                raise Exception(f"429 Quota exceeded (fake, {self.rpm:g} rpm). Please retry in {retry_in:.1f}s")
+            self._window.append(now)
+
+        if kind in self.responses:
+            return delay, self.responses[kind]
+        if kind == "analyze":
+            text = json.dumps(FAKE_ANALYSIS, ensure_ascii=False)
+        elif kind == "analyze_batch":
+            text = json.dumps([FAKE_ANALYSIS] * images, ensure_ascii=False)
+        elif kind == "suggest":
+            text = json.dumps(fake_suggestions(prompt), ensure_ascii=False)
+        elif kind == "vision":
+            text = FAKE_VISION
+        else:
+            text = FAKE_LOOKBOOK_PROMPT
+        return delay, text
+
+    def _chunks(self, text):
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        delay, text = self.respond(contents)
+        if stream:
+            return FakeStream(self, self._chunks(text), delay)
+        time.sleep(delay)
+        return ModelResponse(text)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        delay, text = self.respond(contents)
+        if stream:
+            return FakeStream(self, self._chunks(text), delay)
+        await asyncio.sleep(delay)
+        return ModelResponse(text)
@@ -0,0 +1,146 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import config, metrics
+from services.model_router import router
+from services.scheduler import PRIORITY_INTERACTIVE, QuotaExceededError
+
+# Executor có giới hạn cho trường hợp model chỉ có API đồng bộ
+_executor = ThreadPoolExecutor(
+    max_workers=config.GEMINI_MAX_CONCURRENCY,
+    thread_name_prefix="gemini",
+)
+_semaphore = asyncio.Semaphore(config.GEMINI_MAX_CONCURRENCY)
+
+
+def _count_image_bytes(contents):
+    if isinstance(contents, (list, tuple)):
+        size = sum(len(part["data"]) for part in contents if isinstance(part, dict) and "data" in part)
+        if size:
+            metrics.model_input_bytes.inc(size)
+
+
+def _outcome(error):
+    # GeneratorExit: caller ngừng đọc stream sớm (đã đủ dữ liệu), không phải lỗi
+    if error is None or isinstance(error, GeneratorExit):
+        return "ok"
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    return "quota" if isinstance(error, QuotaExceededError) else "error"
+
+
+async def _call_model(model, contents, **kwargs):
+    native_async = getattr(model, "generate_content_async", None)
+    if native_async is not None:
+        return await native_async(contents, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    call = functools.partial(model.generate_content, contents, **kwargs)
+    return await loop.run_in_executor(_executor, call)
+
+
+async def generate_content(contents, task, timeout=None, priority=PRIORITY_INTERACTIVE, deadline=None, **kwargs):
+    """
+    Gọi Gemini mà không chặn event loop.
+    task (analyze, suggest, vision, prompt) chọn tuyến model/API key của ModelRouter.
+    Dùng API async gốc nếu có, ngược lại chạy trong executor có giới hạn.
+    Số lệnh gọi đồng thời bị chặn bởi GEMINI_MAX_CONCURRENCY; quá timeout
+    (hoặc khi task bị hủy) lệnh gọi sẽ bị hủy và ném asyncio.TimeoutError/CancelledError.
+    Mọi lệnh gọi đi qua QuotaScheduler của cặp key/model (token bucket + ưu tiên),
+    gặp 429 thì router chuyển sang key/tầng khác hoặc thử lại; chỉ được thử lại trước deadline (giây, mặc định GEMINI_RETRY_DEADLINE);
+    hết quota sẽ ném QuotaExceededError.
+    """
+    timeout = timeout if timeout is not None else config.GEMINI_TIMEOUT
+    deadline = deadline if deadline is not None else config.GEMINI_RETRY_DEADLINE
+
+    async def call(model):
+        async with _semaphore:
+            return await asyncio.wait_for(_call_model(model, contents, **kwargs), timeout)
+
+    _count_image_bytes(contents)
+    start = time.perf_counter()
+    error = None
+    try:
+        return await router.run(task, call, priority=priority, deadline=time.monotonic() + deadline)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.record("model", elapsed)
+        metrics.model_call_seconds.observe(elapsed, kind="generate")
+        metrics.model_calls.inc(kind="generate", outcome=_outcome(error))
+
+
+def _next_chunk_text(iterator):
+    # Chạy trong executor: lấy chunk kế tiếp của stream đồng bộ (None khi hết)
+    for chunk in iterator:
+        return getattr(chunk, "text", "") or ""
+    return None
+
+
+async def stream_content(contents, task, timeout=None, priority=PRIORITY_INTERACTIVE, deadline=None, **kwargs):
+    """
+    Phiên bản streaming của generate_content: yield từng đoạn text ngay khi model trả về.
+    Việc mở stream (tới chunk đầu tiên) đi qua ModelRouter nên vẫn được retry/failover khi 429;
+    timeout áp dụng cho từng chunk; slot GEMINI_MAX_CONCURRENCY được giữ theo từng lần mở stream
+    tới khi đọc hết (hoặc bỏ dở) stream.
+    """
+    timeout = timeout if timeout is not None else config.GEMINI_TIMEOUT
+    deadline = deadline if deadline is not None else config.GEMINI_RETRY_DEADLINE
+    loop = asyncio.get_running_loop()
+
+    async def next_text(iterator):
+        if hasattr(iterator, "__anext__"):
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                return None
+            return getattr(chunk, "text", "") or ""
+        return await asyncio.wait_for(loop.run_in_executor(_executor, _next_chunk_text, iterator), timeout)
+
+    holding = False
+
+    async def open_stream(model):
+        # Giữ slot GEMINI_MAX_CONCURRENCY từ lúc mở stream tới hết vòng đọc chunk,
+        # nhưng không giữ trong lúc router backoff giữa các lần thử
+        nonlocal holding
+        await _semaphore.acquire()
+        holding = True
+        try:
+            native_async = getattr(model, "generate_content_async", None)
+            if native_async is not None:
+                response = await asyncio.wait_for(native_async(contents, stream=True, **kwargs), timeout)
+                iterator = response.__aiter__()
+            else:
+                call = functools.partial(model.generate_content, contents, stream=True, **kwargs)
+                response = await asyncio.wait_for(loop.run_in_executor(_executor, call), timeout)
+                iterator = iter(response)
+            return iterator, await next_text(iterator)
+        except BaseException:
+            holding = False
+            _semaphore.release()
+            raise
+
+    _count_image_bytes(contents)
+    start = time.perf_counter()
+    error = None
+    try:
+        iterator, text = await router.run(task, open_stream, priority=priority, deadline=time.monotonic() + deadline)
+        metrics.record("model_first_chunk", time.perf_counter() - start)
+        while text is not None:
+            if text:
+                yield text
+            text = await next_text(iterator)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if holding:
+            _semaphore.release()
+        elapsed = time.perf_counter() - start
+        metrics.record("model", elapsed)
+        metrics.model_call_seconds.observe(elapsed, kind="stream")
+        metrics.model_calls.inc(kind="stream", outcome=_outcome(error))
@@ -0,0 +1,246 @@
+import asyncio
+import random
+import threading
+import time
+
+from services import config
+from services.model_backends import create_model
+from services.scheduler import PRIORITY_INTERACTIVE, QuotaExceededError, QuotaScheduler, is_quota_error, parse_retry_after
+
+TASKS = ("analyze", "suggest", "vision", "prompt")
+
+
+class Rerouted(Exception):
+    """Cặp key/model đang chờ vừa bị 429: lệnh gọi đang xếp hàng được chọn lại cặp khác."""
+
+
+def parse_weighted(spec):
+    """"a*3,b" -> [("a", 3.0), ("b", 1.0)]."""
+    entries = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, weight = entry.rpartition("*") if "*" in entry else (entry, "", "1")
+        entries.append((name.strip(), float(weight)))
+    return entries
+
+
+def parse_route(spec):
+    """"gemini-2.5-flash*3,gemini-2.0-flash>gemini-2.5-flash-lite" -> list tầng (thứ tự failover)."""
+    return [parse_weighted(tier) for tier in spec.split(">") if tier.strip()]
+
+
+class Target:
+    """
+    Một cặp (API key, model): quota riêng (QuotaScheduler) và health riêng.
+    Lỗi không phải 429 liên tiếp MODEL_ROUTER_FAILURE_THRESHOLD lần => tạm ngắt
+    MODEL_ROUTER_COOLDOWN giây (router chuyển sang cặp khác).
+    """
+
+    def __init__(self, key_label, api_key, model_name, model=None):
+        self.key_label = key_label
+        self.api_key = api_key
+        self.model_name = model_name
+        self.scheduler = QuotaScheduler(config.GEMINI_RPM, config.GEMINI_BURST)
+        self.model = model
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.open_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def get_model(self):
+        # Đồng bộ (import SDK ở lần đầu): gọi trong thread
+        if self.model is None:
+            with self._lock:
+                if self.model is None:
+                    self.model = create_model(self.model_name, self.api_key)
+        return self.model
+
+    def available(self, now):
+        return now >= self.open_until and now >= self.scheduler.blocked_until
+
+    def throttled(self):
+        # Rate còn đang giảm sau 429 (AIMD chưa hồi phục hết)
+        return self.scheduler.rate < self.scheduler.max_rate
+
+    def ready_at(self):
+        return max(self.open_until, self.scheduler.blocked_until)
+
+    def on_success(self):
+        self.failures = 0
+        self.scheduler.on_success()
+
+    def on_error(self):
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= config.MODEL_ROUTER_FAILURE_THRESHOLD:
+            self.failures = 0
+            self.open_until = time.monotonic() + config.MODEL_ROUTER_COOLDOWN
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "key": self.key_label,
+            "model": self.model_name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "healthy": now >= self.open_until,
+            "paused_seconds": round(max(0.0, self.ready_at() - now), 2),
+            **self.scheduler.stats(),
+        }
+
+
+class ModelRouter:
+    """
+    Chọn cặp key/model cho từng loại lệnh gọi (analyze, suggest, vision, prompt).
+    routes: task -> list tầng, mỗi tầng là list (Target, trọng số), chọn ngẫu nhiên theo
+    trọng số trong tầng. Tầng chính bị 429 (hết token, rate chưa hồi phục) thì dùng tầng
+    nhẹ hơn; gặp 429 thì thử ngay cặp khác (key khác cùng tầng trước, rồi tầng nhẹ hơn).
+    """
+
+    def __init__(self, routes, rng=None):
+        self.routes = routes
+        self.rng = rng or random.Random()
+        self.failovers = {task: 0 for task in routes}
+        self.retries = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls):
+        keys = parse_weighted(config.GEMINI_API_KEYS) or [(config.api_key, 1.0)]
+        targets = {}
+        routes = {}
+        for task in TASKS:
+            tiers = []
+            for tier in parse_route(config.MODEL_ROUTES[task]):
+                entries = []
+                for model_name, model_weight in tier:
+                    for index, (api_key, key_weight) in enumerate(keys, 1):
+                        # Cùng cặp key/model dùng chung quota giữa các task
+                        target = targets.get((index, model_name))
+                        if target is None:
+                            target = targets[(index, model_name)] = Target(f"key{index}", api_key, model_name)
+                        entries.append((target, model_weight * key_weight))
+                tiers.append(entries)
+            routes[task] = tiers
+        return cls(routes)
+
+    def targets(self):
+        unique = {}
+        for tiers in self.routes.values():
+            for tier in tiers:
+                for target, _ in tier:
+                    unique[id(target)] = target
+        return list(unique.values())
+
+    def _choose(self, entries):
+        total = sum(weight for _, weight in entries)
+        point = self.rng.uniform(0, total)
+        for target, weight in entries:
+            point -= weight
+            if point <= 0:
+                return target
+        return entries[-1][0]
+
+    def pick(self, task, exclude=()):
+        """(target, số thứ tự tầng), (None, None) nếu mọi cặp đều đang bị 429/ngắt."""
+        now = time.monotonic()
+        fallback = None, None
+        for tier_index, tier in enumerate(self.routes[task]):
+            candidates = [(t, w) for t, w in tier if t not in exclude and t.available(now) and w > 0]
+            if not candidates:
+                continue
+            # Gửi được ngay: dùng luôn; tầng chưa bị 429 thì xếp hàng chờ token của tầng đó
+            ready = [(t, w) for t, w in candidates if t.scheduler.has_token(now)]
+            if ready:
+                return self._choose(ready), tier_index
+            pacing = [(t, w) for t, w in candidates if not t.throttled()]
+            if pacing:
+                return self._choose(pacing), tier_index
+            # Tầng đang hồi phục sau 429 và hết token: thử tầng nhẹ hơn trước
+            if fallback[0] is None:
+                fallback = self._choose(candidates), tier_index
+        return fallback
+
+    def soonest(self, task):
+        # Mọi cặp đều bị 429/ngắt: chờ cặp được mở lại sớm nhất (ưu tiên tầng đầu khi bằng nhau)
+        ranked = [
+            (target.ready_at(), tier_index, target)
+            for tier_index, tier in enumerate(self.routes[task]) for target, _ in tier
+        ]
+        ready_at, tier_index, target = min(ranked, key=lambda item: item[:2])
+        return target, tier_index
+
+    def _quota_error(self, task):
+        self.rejected += 1
+        retry_after = min(target.scheduler.retry_after() for tier in self.routes[task] for target, _ in tier)
+        return QuotaExceededError("Gemini API quota exceeded. Please try again later.", retry_after=retry_after)
+
+    async def run(self, task, call, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        Chạy call(model) (coroutine function) trên cặp key/model do router chọn, trong deadline
+        (time.monotonic()). Khi mọi cặp đều bị 429: backoff có jitter rồi thử lại,
+        tối đa GEMINI_MAX_RETRIES vòng; hết quota ném QuotaExceededError.
+        """
+        throttled = set()
+        rounds = 0
+        while True:
+            target, tier_index = self.pick(task, throttled)
+            if target is None:
+                rounds += 1
+                target, tier_index = self.soonest(task)
+                backoff = max(target.ready_at() - time.monotonic(), config.GEMINI_RETRY_BASE_DELAY * (2 ** (rounds - 1)))
+                backoff *= random.uniform(0.5, 1.5)
+                if rounds > config.GEMINI_MAX_RETRIES or (deadline is not None and time.monotonic() + backoff >= deadline):
+                    raise self._quota_error(task) from None
+                self.retries += 1
+                await asyncio.sleep(backoff)
+                throttled.clear()
+
+            try:
+                await target.scheduler.acquire(priority, deadline)
+            except QuotaExceededError:
+                raise self._quota_error(task) from None
+            except Rerouted:
+                continue
+            model = target.model or await asyncio.to_thread(target.get_model)
+            target.calls += 1
+            try:
+                result = await call(model)
+            except Exception as e:
+                if not is_quota_error(e):
+                    target.on_error()
+                    raise
+                target.scheduler.on_throttled(parse_retry_after(e))
+                target.scheduler.reject_waiters(Rerouted())
+                throttled.add(target)
+                continue
+            target.on_success()
+            if tier_index > 0:
+                self.failovers[task] += 1  # Một lần cho mỗi lệnh gọi được tầng dự phòng phục vụ
+            return result
+
+    def load(self):
+        # Warm-up: tạo model cho mọi cặp key/model
+        for target in self.targets():
+            target.get_model()
+
+    def loaded(self):
+        return all(target.model is not None for target in self.targets())
+
+    def stats(self):
+        return {
+            "routes": {
+                task: [[f"{target.key_label}/{target.model_name}*{weight:g}" for target, weight in tier] for tier in tiers]
+                for task, tiers in self.routes.items()
+            },
+            "targets": [target.stats() for target in self.targets()],
+            "failovers": dict(self.failovers),
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+
+router = ModelRouter.from_config()
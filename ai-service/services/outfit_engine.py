@@ -0,0 +1,205 @@
+import re
+
+import numpy as np
+
+# Vai trò của món đồ trong outfit, theo category của WardrobeItem
+ROLE_TOP = "top"
+ROLE_BOTTOM = "bottom"
+ROLE_SHOES = "shoes"
+ROLE_BAG = "bag"
+ROLE_ACCESSORY = "accessory"
+
+_ROLE_KEYWORDS = [
+    (ROLE_SHOES, ("giày", "dép", "sneaker", "boot", "shoe", "sandal")),
+    (ROLE_BAG, ("túi", "balo", "bag", "ví")),
+    (ROLE_BOTTOM, ("quần", "váy", "chân váy", "skirt", "pants", "jean", "short")),
+    (ROLE_TOP, ("áo", "shirt", "top", "jacket", "coat", "blazer", "hoodie", "sweater")),
+    (ROLE_ACCESSORY, ("phụ kiện", "mũ", "nón", "kính", "đồng hồ", "vòng", "khăn", "accessory")),
+]
+
+NEUTRAL_COLORS = {"đen", "trắng", "be", "xám", "nâu"}
+
+# Từ khóa bối cảnh -> từ khóa nên có trong tags/tên món đồ
+_CONTEXT_HINTS = {
+    "formal": (
+        ("wedding", "cưới", "công sở", "work", "office", "event", "sự kiện", "tiệc", "party", "formal", "họp"),
+        ("formal", "elegant", "office", "classic", "blazer", "sơ mi", "shirt", "lịch sự", "vest", "heels", "cao gót"),
+    ),
+    "casual": (
+        ("casual", "dạo phố", "street", "đi chơi", "cafe", "weekend", "du lịch", "travel"),
+        ("casual", "streetwear", "basic", "sneaker", "jean", "denim", "t-shirt", "thun", "hoodie"),
+    ),
+    "sport": (
+        ("gym", "thể thao", "sport", "chạy", "running", "yoga"),
+        ("sport", "sporty", "athletic", "running", "gym", "sneaker"),
+    ),
+    "hot": (
+        ("nóng", "hot", "hè", "summer", "nắng", "sunny"),
+        ("summer", "light", "linen", "short", "cotton", "sandal", "ngắn tay", "tank"),
+    ),
+    "cold": (
+        ("lạnh", "cold", "đông", "winter", "rét", "mưa", "rain"),
+        ("winter", "coat", "jacket", "wool", "len", "sweater", "hoodie", "dài tay", "boot", "khoác"),
+    ),
+}
+
+
+def item_role(item):
+    category = (item.get("category") or "").lower()
+    for role, keywords in _ROLE_KEYWORDS:
+        if any(keyword in category for keyword in keywords):
+            return role
+    return ROLE_ACCESSORY
+
+
+def _tokens(text):
+    return set(re.findall(r"\w+", (text or "").lower()))
+
+
+def _item_text(item):
+    parts = [item.get("name") or "", item.get("category") or ""] + list(item.get("tags") or [])
+    return " ".join(parts).lower()
+
+
+def _lower_set(values):
+    return {str(v).strip().lower() for v in (values or []) if str(v).strip()}
+
+
+def score_items(wardrobe, style="", occasion="", weather="", preferences=None):
+    """
+    Chấm điểm từng món đồ (vector hóa bằng NumPy) theo dịp, thời tiết,
+    phong cách và màu yêu thích / cần tránh. Trả về np.ndarray cùng thứ tự wardrobe.
+    """
+    preferences = preferences or {}
+    n = len(wardrobe)
+    if n == 0:
+        return np.zeros(0)
+
+    context = f"{style} {occasion} {weather} " + " ".join(preferences.get("favorite_styles", []) or [])
+    context = context.lower()
+
+    # Ma trận đặc trưng: mỗi cột là 1 nhóm từ khóa được bối cảnh kích hoạt
+    active = [hints for triggers, hints in _CONTEXT_HINTS.values() if any(t in context for t in triggers)]
+    context_tokens = _tokens(context)
+    texts = [_item_text(item) for item in wardrobe]
+
+    hint_matrix = np.array(
+        [[any(hint in text for hint in hints) for hints in active] for text in texts],
+        dtype=np.float32,
+    ).reshape(n, len(active))
+    keyword_overlap = np.array(
+        [len(context_tokens & _tokens(text)) for text in texts], dtype=np.float32
+    )
+
+    favorite = _lower_set(preferences.get("favorite_colors"))
+    avoid = _lower_set(preferences.get("avoid_colors"))
+    colors = [_lower_set(item.get("color")) for item in wardrobe]
+    favorite_hits = np.array([len(c & favorite) for c in colors], dtype=np.float32)
+    avoid_hits = np.array([len(c & avoid) for c in colors], dtype=np.float32)
+    neutral = np.array([bool(c) and c <= NEUTRAL_COLORS for c in colors], dtype=np.float32)
+
+    return (
+        2.0 * hint_matrix.sum(axis=1)
+        + 0.5 * keyword_overlap
+        + 1.5 * favorite_hits
+        - 5.0 * avoid_hits
+        + 0.25 * neutral
+    )
+
+
+def shortlist(wardrobe, scores, per_role):
+    """Giữ lại per_role món điểm cao nhất cho mỗi vai trò (giữ thứ tự gốc)."""
+    roles = np.array([item_role(item) for item in wardrobe])
+    keep = np.zeros(len(wardrobe), dtype=bool)
+    for role in set(roles.tolist()):
+        indexes = np.flatnonzero(roles == role)
+        best = indexes[np.argsort(-scores[indexes], kind="stable")[:per_role]]
+        keep[best] = True
+    return [item for item, kept in zip(wardrobe, keep) if kept]
+
+
+def build_candidates(wardrobe, scores, limit=10, per_role=5):
+    """
+    Sinh outfit hợp lệ (Áo + Quần/Váy + Giày, kèm túi/phụ kiện nếu có) và xếp hạng.
+    Điểm outfit = tổng điểm món đồ + thưởng phối màu (có màu trung tính, không
+    trùng màu nổi giữa áo và quần). Trả về list (score, [index, ...]);
+    limit=None trả về mọi tổ hợp.
+    """
+    roles = [item_role(item) for item in wardrobe]
+
+    def top_indexes(role):
+        indexes = np.array([i for i, r in enumerate(roles) if r == role], dtype=int)
+        if indexes.size == 0:
+            return indexes
+        return indexes[np.argsort(-scores[indexes], kind="stable")[:per_role]]
+
+    tops, bottoms, shoes = top_indexes(ROLE_TOP), top_indexes(ROLE_BOTTOM), top_indexes(ROLE_SHOES)
+    if tops.size == 0 or bottoms.size == 0:
+        return []
+
+    colors = [_lower_set(item.get("color")) for item in wardrobe]
+
+    def harmony(a, b):
+        bold_a, bold_b = colors[a] - NEUTRAL_COLORS, colors[b] - NEUTRAL_COLORS
+        bonus = 0.5 if (colors[a] & NEUTRAL_COLORS or colors[b] & NEUTRAL_COLORS) else 0.0
+        clash = 1.0 if bold_a and bold_b and not (bold_a & bold_b) else 0.0
+        return bonus - clash
+
+    pair = np.array([[harmony(t, b) for b in bottoms] for t in tops], dtype=np.float32)
+    shoe_scores = scores[shoes] if shoes.size else np.zeros(1)
+    total = (
+        scores[tops][:, None, None]
+        + scores[bottoms][None, :, None]
+        + shoe_scores[None, None, :]
+        + pair[:, :, None]
+    )
+
+    order = np.argsort(-total, axis=None, kind="stable")[:limit]
+    extras = [
+        idx for role in (ROLE_BAG, ROLE_ACCESSORY)
+        for idx in top_indexes(role)[:1].tolist()
+    ]
+    candidates = []
+    for flat in order:
+        t, b, s = np.unravel_index(flat, total.shape)
+        indexes = [int(tops[t]), int(bottoms[b])]
+        if shoes.size:
+            indexes.append(int(shoes[s]))
+        candidates.append((float(total[t, b, s]), indexes + extras))
+    return candidates
+
+
+def fallback_suggestions(wardrobe, style="", occasion="", weather="", preferences=None, count=3):
+    """
+    Gợi ý xác định (không cần Gemini) khi hết quota: chọn các outfit điểm cao
+    nhất, ưu tiên không lặp lại áo/quần giữa các bộ.
+    """
+    scores = score_items(wardrobe, style, occasion, weather, preferences)
+    candidates = build_candidates(wardrobe, scores, limit=None)
+
+    chosen, used = [], set()
+    for _, indexes in candidates:
+        if set(indexes[:2]) & used:
+            continue
+        chosen.append(indexes)
+        used.update(indexes[:2])
+        if len(chosen) == count:
+            break
+    for _, indexes in candidates:
+        if len(chosen) == count:
+            break
+        if indexes not in chosen:
+            chosen.append(indexes)
+
+    suggestions = []
+    for number, indexes in enumerate(chosen, start=1):
+        items = [wardrobe[i] for i in indexes]
+        names = ", ".join(item.get("name") or item.get("category", "") for item in items)
+        suggestions.append({
+            "outfit_name": f"{style or 'Outfit'} #{number}".strip(),
+            "item_ids": [item.get("id") for item in items],
+            "description": names,
+            "rationale": f"Gợi ý tự động dựa trên dịp {occasion}, thời tiết {weather} và màu sắc yêu thích của bạn.",
+        })
+    return suggestions
+
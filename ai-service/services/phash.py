@@ -0,0 +1,188 @@
+import threading
+from collections import OrderedDict
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+from services.preprocess import open_image
+
+HASH_BITS = 64
+
+
+def _open_gray(source):
+    """Ảnh xám từ bytes hoặc PIL Image; JPEG được giải mã kiểu draft (nhỏ, nhanh)."""
+    if isinstance(source, (bytes, bytearray)):
+        img = open_image(bytes(source), draft_size=128, draft_mode="L")
+    else:
+        img = source
+    return img.convert("L")
+
+
+def _resized(gray, size):
+    return np.asarray(gray.resize(size, Image.Resampling.BOX), dtype=np.float32)
+
+
+def _pack_bits(bits):
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), "big")
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _dhash_gray(gray):
+    pixels = _resized(gray, (9, 8))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _phash_gray(gray):
+    low = (_DCT_32 @ _resized(gray, (32, 32)) @ _DCT_32.T)[:8, :8]
+    # Bỏ hệ số DC (độ sáng trung bình) khi tính median để hash không phụ thuộc độ sáng
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+
+def dhash(source) -> int:
+    """Difference hash 64 bit: so sánh độ sáng các pixel kề nhau theo hàng (ảnh 9x8)."""
+    return _dhash_gray(_open_gray(source))
+
+
+def phash(source) -> int:
+    """
+    Perceptual hash 64 bit: DCT 2 chiều của ảnh xám 32x32, lấy khối tần số thấp
+    8x8 và so với median. Bền với resize, nén lại, chỉnh sáng nhẹ.
+    """
+    return _phash_gray(_open_gray(source))
+
+
+def image_hashes(source):
+    """(phash, dhash) của ảnh, chỉ giải mã ảnh một lần."""
+    gray = _open_gray(source)
+    return _phash_gray(gray), _dhash_gray(gray)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class HammingIndex:
+    """
+    Multi-index hashing cho hash 64 bit: chia hash thành `chunks` đoạn, mỗi đoạn một
+    bảng băm. Hai hash cách nhau <= r bit thì ít nhất một đoạn cách nhau <= r // chunks
+    bit (nguyên lý Dirichlet), nên chỉ cần dò các giá trị lân cận của từng đoạn rồi kiểm
+    tra khoảng cách đầy đủ trên số ít ứng viên.
+    Giữ tối đa max_entries mục, bỏ mục cũ nhất khi đầy. An toàn khi dùng từ nhiều thread.
+    """
+
+    def __init__(self, max_entries=100_000, chunks=4):
+        self.max_entries = max_entries
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._entries = OrderedDict()  # key -> (hash, value)
+        self._probes = {}
+        self._lock = threading.Lock()
+
+    def _chunk_values(self, value):
+        return [(value >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def _probe_masks(self, radius):
+        # Mọi mặt nạ lật <= radius bit trong một đoạn (radius 2, đoạn 16 bit: 137 mặt nạ)
+        masks = self._probes.get(radius)
+        if masks is None:
+            masks = [0]
+            for flips in range(1, radius + 1):
+                for bits in combinations(range(self.chunk_bits), flips):
+                    masks.append(sum(1 << b for b in bits))
+            self._probes[radius] = masks
+        return masks
+
+    def add(self, key, hash_value, value=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (hash_value, value)
+            for table, chunk in zip(self._tables, self._chunk_values(hash_value)):
+                table.setdefault(chunk, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        hash_value, _ = self._entries.pop(key)
+        for table, chunk in zip(self._tables, self._chunk_values(hash_value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[chunk]
+
+    def remove(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def search(self, hash_value, radius):
+        """Các mục cách hash_value <= radius bit: list (distance, key, value), gần nhất trước."""
+        masks = self._probe_masks(radius // self.chunks)
+        with self._lock:
+            candidates = set()
+            for table, chunk in zip(self._tables, self._chunk_values(hash_value)):
+                for mask in masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+            matches = []
+            for key in candidates:
+                other, value = self._entries[key]
+                distance = (hash_value ^ other).bit_count()
+                if distance <= radius:
+                    matches.append((distance, key, value))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def clear(self):
+        with self._lock:
+            for table in self._tables:
+                table.clear()
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def duplicate_clusters(hashes, radius, labels=None):
+    """
+    Gom nhóm các hash gần nhau (<= radius bit, bắc cầu) bằng union-find.
+    hashes: list int (None = bỏ qua). labels: tùy chọn, chỉ gom các ảnh cùng nhãn
+    (ví dụ cùng màu chính). Trả về list nhóm (list chỉ số) có từ 2 phần tử.
+    """
+    index = HammingIndex(max_entries=max(1, len(hashes)))
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, hash_value in enumerate(hashes):
+        if hash_value is None:
+            continue
+        for _, j, _ in index.search(hash_value, radius):
+            if labels is None or labels[i] == labels[j]:
+                parent[find(i)] = find(j)
+        index.add(i, hash_value)
+
+    groups = {}
+    for i, hash_value in enumerate(hashes):
+        if hash_value is not None:
+            groups.setdefault(find(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
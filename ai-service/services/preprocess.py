@@ -0,0 +1,70 @@
+import io
+
+from PIL import Image, ImageOps
+
+from services import config
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class InvalidImage(ValueError):
+    """Dữ liệu không phải ảnh đọc được (base64 sai, file hỏng hoặc bị cắt cụt)."""
+
+
+def open_image(data: bytes, max_pixels=None, draft_size=None, draft_mode="RGB"):
+    """
+    Mở ảnh từ bytes, từ chối decompression bomb trước khi giải mã pixel.
+    draft_size: cạnh hoặc (w, h); với JPEG, giải mã ở độ phân giải giảm (nhanh hơn nhiều)
+    nhưng vẫn >= kích thước này, theo mode draft_mode ("RGB", "L"...).
+    """
+    max_pixels = max_pixels if max_pixels is not None else config.MAX_IMAGE_PIXELS
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    except Image.UnidentifiedImageError as e:
+        raise InvalidImage(f"Cannot identify image data ({len(data)} bytes)") from e
+    except OSError as e:
+        raise InvalidImage(f"Corrupt image data: {e}") from e
+
+    width, height = img.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"Image has {width * height} pixels, limit is {max_pixels}")
+
+    if draft_size and img.format == "JPEG":
+        if isinstance(draft_size, int):
+            draft_size = (draft_size, draft_size)
+        img.draft(draft_mode, draft_size)
+    return img
+
+
+def prepare_image(source, max_edge=None, fmt=None, quality=None):
+    """
+    Chuẩn bị ảnh trước khi gửi cho Gemini: xoay theo EXIF, thu nhỏ về cạnh dài
+    max_edge và nén lại (JPEG/WebP). source là bytes hoặc PIL Image.
+    Trả về blob {"mime_type", "data"} dùng trực tiếp trong generate_content.
+    """
+    max_edge = max_edge or config.MODEL_IMAGE_MAX_EDGE
+    fmt = (fmt or config.MODEL_IMAGE_FORMAT).upper()
+    quality = quality or config.MODEL_IMAGE_QUALITY
+
+    if isinstance(source, (bytes, bytearray)):
+        img = open_image(bytes(source), draft_size=max_edge)
+        try:
+            # Pixel chỉ được giải mã ở đây: file cắt cụt/hỏng báo lỗi lúc này
+            img = ImageOps.exif_transpose(img).convert("RGB")
+        except OSError as e:
+            raise InvalidImage(f"Corrupt image data: {e}") from e
+    else:
+        img = source.convert("RGB")
+
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.BICUBIC)
+
+    buffered = io.BytesIO()
+    img.save(buffered, format=fmt, quality=quality)
+    return {"mime_type": _MIME_TYPES.get(fmt, "image/jpeg"), "data": buffered.getvalue()}
@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import itertools
+import re
+import time
+
+from services import metrics
+
+# Độ ưu tiên: số nhỏ hơn được phục vụ trước
+PRIORITY_INTERACTIVE = 0  # /analyze, /suggest: người dùng đang chờ
+PRIORITY_BACKGROUND = 1   # vision/prompt cho lookbook
+
+
+class QuotaExceededError(Exception):
+    """Gemini trả về 429 và không thể thử lại trong deadline của caller."""
+
+    def __init__(self, message, retry_after=60):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_quota_error(e: Exception) -> bool:
+    if isinstance(e, QuotaExceededError):
+        return True
+    if type(e).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    error_msg = str(e).lower()
+    return "429" in error_msg or "quota" in error_msg or "rate limit" in error_msg
+
+
+def parse_retry_after(e: Exception):
+    """Lấy gợi ý thời gian chờ (giây) từ lỗi 429 nếu có."""
+    error_msg = str(e)
+    match = re.search(r"retry in ([\d.]+)\s*s", error_msg) or re.search(
+        r"retry_delay\s*\{\s*seconds:\s*(\d+)", error_msg
+    )
+    return float(match.group(1)) if match else None
+
+
+class QuotaScheduler:
+    """
+    Token bucket theo requests/phút đặt trước mọi lệnh gọi model.
+    - Request chờ theo độ ưu tiên (interactive trước background).
+    - Khi gặp 429: giảm rate (học giới hạn thực tế) và tạm dừng theo retry hint;
+      mỗi lần thành công tăng rate dần trở lại mức cấu hình (AIMD).
+    """
+
+    def __init__(self, rpm, burst):
+        self.max_rate = rpm / 60.0
+        self.rate = self.max_rate
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+        self.throttled = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and now >= self.blocked_until:
+            _, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < 1:
+                break
+            self.tokens -= 1
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        # Loại bỏ waiter đã hủy/timeout ở đầu heap rồi hẹn giờ lượt cấp token tiếp theo
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters:
+            delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.001)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority=PRIORITY_INTERACTIVE, deadline=None):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._timer is None:
+            self._dispatch()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QuotaExceededError(
+                "Gemini API quota exceeded. Please try again later.",
+                retry_after=self.retry_after(),
+            )
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttled(self, retry_after=None):
+        self.throttled += 1
+        metrics.model_throttled.inc()
+        now = time.monotonic()
+        self.rate = max(self.max_rate * 0.1, self.rate * 0.5)
+        self.tokens = 0.0
+        self.updated = now
+        self.blocked_until = max(self.blocked_until, now + (retry_after or 1.0))
+
+    def retry_after(self):
+        wait = max(self.blocked_until - time.monotonic(), 1.0 / self.rate)
+        return max(1, int(wait + 0.999))
+
+    def reject_waiters(self, exc):
+        """Ném exc cho mọi lệnh gọi đang chờ token (để router chuyển chúng sang cặp key/model khác)."""
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.set_exception(exc)
+        self._waiters.clear()
+
+    def has_token(self, now=None):
+        """Có thể gửi ngay (còn token, không bị tạm dừng sau 429)."""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        return self.tokens >= 1 and now >= self.blocked_until and not any(not future.done() for _, _, future in self._waiters)
+
+    def stats(self):
+        return {
+            "configured_rpm": round(self.max_rate * 60, 2),
+            "current_rpm": round(self.rate * 60, 2),
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+import json
+
+
+def request_key(kind: str, request) -> str:
+    """Hash chuẩn hóa của một request model (Pydantic) để nhận diện request trùng."""
+    payload = json.dumps(request.dict(), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{kind}\n{payload}".encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Gộp các lệnh gọi trùng khóa đang chạy: request đến sau sẽ chờ chung kết quả
+    của lệnh gọi đầu tiên thay vì gọi Gemini lần nữa. Kết quả dùng chung, không
+    được sửa đổi.
+    cache: tùy chọn, object có get(key)/set(key, value) (ví dụ LRUCache) để giữ
+    kết quả sau khi lệnh gọi kết thúc.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._inflight = {}  # key -> [task, số caller đang chờ]
+        self.calls = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    async def do(self, key, fn):
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            entry = [task, 0]
+            self._inflight[key] = entry
+            task.add_done_callback(lambda _: self._finish(key, entry))
+        else:
+            self.coalesced += 1
+
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            # Chỉ hủy lệnh gọi thật khi không còn caller nào chờ kết quả
+            if not entry[0].done() and entry[1] == 1:
+                entry[0].cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _finish(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+        task = entry[0]
+        if self.cache is not None and not task.cancelled() and task.exception() is None:
+            self.cache.set(key, task.result())
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "in_flight": len(self._inflight),
+        }
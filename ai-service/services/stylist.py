@@ -1,14 +1,102 @@
 import os
 import json
+import logging
 import pathlib
-import google.generativeai as genai
+from collections import deque
 from typing import List, Dict
 from dotenv import load_dotenv
 
 # 1. Load environment variables
-from services.config import model
+from services import config, metrics
+from services.json_stream import JsonArrayStream
+from services.model_client import generate_content, stream_content
+from services.outfit_engine import fallback_suggestions, score_items, shortlist
+from services.scheduler import QuotaExceededError
 
-async def generate_outfit_suggestions(
+logger = logging.getLogger(__name__)
+
+WARDROBE_COLUMNS = "id|name|category|color|tags"
+CHARS_PER_TOKEN = 3  # Ước lượng thô cho văn bản tiếng Việt có dấu
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _cell(value) -> str:
+    if isinstance(value, list):
+        value = ",".join(str(v) for v in value)
+    return str(value or "").replace("|", "/").replace("\n", " ").strip()
+
+def encode_wardrobe(wardrobe: List[Dict], include_tags: bool = True):
+    """
+    Mã hóa tủ đồ dạng bảng gọn: 1 dòng header + 1 dòng/món, id thật được thay
+    bằng id ngắn (i1, i2...). Trả về (text, short_id -> id thật).
+    """
+    id_map = {}
+    lines = [WARDROBE_COLUMNS]
+    for index, item in enumerate(wardrobe, start=1):
+        short_id = f"i{index}"
+        id_map[short_id] = item.get("id")
+        tags = item.get("tags", []) if include_tags else []
+        lines.append("|".join([
+            short_id,
+            _cell(item.get("name")),
+            _cell(item.get("category")),
+            _cell(item.get("color", [])),
+            _cell(tags),
+        ]))
+    return "\n".join(lines), id_map
+
+def fit_wardrobe_to_budget(wardrobe: List[Dict], budget_tokens: int):
+    """
+    Giữ phần mô tả tủ đồ trong ngân sách token: bỏ tags trước, sau đó lấy
+    lần lượt từng món của mỗi category (round-robin) cho tới khi đầy ngân sách
+    và tóm tắt số món bị lược bỏ. Trả về (text, id_map).
+    """
+    text, id_map = encode_wardrobe(wardrobe)
+    if estimate_tokens(text) <= budget_tokens:
+        return text, id_map
+
+    text, id_map = encode_wardrobe(wardrobe, include_tags=False)
+    if estimate_tokens(text) <= budget_tokens:
+        return text, id_map
+
+    by_category = {}
+    for item in wardrobe:
+        by_category.setdefault(item.get("category") or "Khác", []).append(item)
+
+    # Round-robin giữa các category để món nào cũng có đại diện
+    ordered = []
+    queues = [deque(items) for items in by_category.values()]
+    while any(queues):
+        for queue in queues:
+            if queue:
+                ordered.append(queue.popleft())
+
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    used = len(WARDROBE_COLUMNS)
+    kept = []
+    for item in ordered:
+        row_chars = len(_cell(item.get("name"))) + len(_cell(item.get("category"))) + len(_cell(item.get("color", []))) + 12
+        if used + row_chars > budget_chars:
+            break
+        kept.append(item)
+        used += row_chars
+
+    kept_ids = {id(item) for item in kept}
+    kept = [item for item in wardrobe if id(item) in kept_ids]  # Giữ thứ tự gốc
+    text, id_map = encode_wardrobe(kept, include_tags=False)
+
+    omitted = {}
+    for item in wardrobe:
+        if id(item) not in kept_ids:
+            category = item.get("category") or "Khác"
+            omitted[category] = omitted.get(category, 0) + 1
+    if omitted:
+        summary = ", ".join(f"{category} x{count}" for category, count in omitted.items())
+        text += f"\n(Đã lược bớt {sum(omitted.values())} món: {summary})"
+    return text, id_map
+
+def build_stylist_prompt(
     style: str, 
     occasion: str, 
     weather: str, 
@@ -17,31 +105,38 @@ async def generate_outfit_suggestions(
     custom_context: str = None,
     preferences: Dict = None
 ):
-    try:
-        # --- STEP 1: PREPARE DATA ---
-        wardrobe_description = json.dumps(wardrobe, ensure_ascii=False, indent=2)
+    """Dựng prompt cho Stylist; trả về (prompt, short_id -> id thật)."""
+    # --- STEP 1: PREPARE DATA ---
+    # Tủ đồ lớn: lọc trước tại chỗ, chỉ gửi các món điểm cao nhất mỗi loại cho model
+    prompt_wardrobe = wardrobe
+    if len(wardrobe) > config.SUGGEST_PREFILTER_THRESHOLD:
+        scores = score_items(wardrobe, style, occasion, weather, preferences)
+        prompt_wardrobe = shortlist(wardrobe, scores, config.SUGGEST_PREFILTER_PER_ROLE)
+
+    # Bảng gọn thay cho JSON indent=2 (tiết kiệm hàng nghìn token với tủ đồ lớn)
+    wardrobe_description, id_map = fit_wardrobe_to_budget(prompt_wardrobe, config.SUGGEST_WARDROBE_TOKEN_BUDGET)
+    
+    # Build preferences section if provided
+    preference_section = ""
+    if preferences:
+        fav_styles = ", ".join(preferences.get('favorite_styles', []))
+        fav_colors = ", ".join(preferences.get('favorite_colors', []))
+        avoid_colors = ", ".join(preferences.get('avoid_colors', []))
+        bio = preferences.get('bio', "")
         
-        # Build preferences section if provided
-        preference_section = ""
-        if preferences:
-            fav_styles = ", ".join(preferences.get('favorite_styles', []))
-            fav_colors = ", ".join(preferences.get('favorite_colors', []))
-            avoid_colors = ", ".join(preferences.get('avoid_colors', []))
-            bio = preferences.get('bio', "")
-            
-            preference_section = "\n        SỞ THÍCH CÁ NHÂN (PROFILE):"
-            if fav_styles: preference_section += f"\n        - Phong cách yêu thích: {fav_styles}"
-            if fav_colors: preference_section += f"\n        - Màu sắc yêu thích: {fav_colors}"
-            if avoid_colors: preference_section += f"\n        - Màu sắc cần tránh: {avoid_colors}"
-            if bio: preference_section += f"\n        - Giới thiệu bản thân: {bio}"
-
-        # Build custom context section if provided
-        custom_context_section = ""
-        if custom_context and custom_context.strip():
-            custom_context_section = f"\n        - Mô tả bổ sung từ người dùng: {custom_context}"
-
-        # --- STEP 2: PROMPT ---
-        prompt = f"""
+        preference_section = "\n        SỞ THÍCH CÁ NHÂN (PROFILE):"
+        if fav_styles: preference_section += f"\n        - Phong cách yêu thích: {fav_styles}"
+        if fav_colors: preference_section += f"\n        - Màu sắc yêu thích: {fav_colors}"
+        if avoid_colors: preference_section += f"\n        - Màu sắc cần tránh: {avoid_colors}"
+        if bio: preference_section += f"\n        - Giới thiệu bản thân: {bio}"
+
+    # Build custom context section if provided
+    custom_context_section = ""
+    if custom_context and custom_context.strip():
+        custom_context_section = f"\n        - Mô tả bổ sung từ người dùng: {custom_context}"
+
+    # --- STEP 2: PROMPT ---
+    prompt = f"""
         Bạn là một chuyên gia tư vấn thời trang AI chuyên nghiệp (AI Stylist) có kiến thức sâu rộng về:
         - Xu hướng thời trang hiện tại trên toàn cầu và các nền tảng mạng xã hội (TikTok, Instagram).
         - Cách phối hợp màu sắc và chất liệu theo từng tông da và thời tiết.
@@ -55,7 +150,7 @@ async def generate_outfit_suggestions(
         - Thời tiết hiện tại: {weather}
         - Tông da người mặc: {skin_tone}{preference_section}{custom_context_section}
 
-        DANH SÁCH TỦ ĐỒ (WARDROBE):
+        DANH SÁCH TỦ ĐỒ (WARDROBE) - mỗi dòng 1 món, các cột cách nhau bởi "|" theo header:
         {wardrobe_description}
 
         YÊU CẦU PHÂN TÍCH:
@@ -63,12 +158,12 @@ async def generate_outfit_suggestions(
         2. Mỗi bộ trang phục phải là một outfit HOÀN CHỈNH: ưu tiên phối hợp Áo + Quần/Váy + Giày + Túi/Phụ kiện. Cố gắng phối từ 3-5 món để bộ đồ nhìn chuyên nghiệp và có "gu".
         3. RÀNG BUỘC CHẶT CHẼ: Nếu bối cảnh yêu cầu sự trang trọng (ví dụ: Wedding, Event, Work), hãy lựa chọn các món đồ lịch sự, sang trọng. Nếu là dạo phố (Streetwear, Casual), hãy ưu tiên sự thoải mái và phá cách.
         4. TÍNH TOÁN XU HƯỚNG: Sử dụng kiến thức về xu hướng TikTok/Instagram hiện nay để tạo nên các bản phối "trendy".
-        5. Mỗi bộ trang phục phải sử dụng đúng 'id' của các món đồ có thật trong DANH SÁCH TỦ ĐỒ.
+        5. Mỗi bộ trang phục phải sử dụng đúng 'id' (cột đầu tiên, ví dụ "i3") của các món đồ có thật trong DANH SÁCH TỦ ĐỒ.
         6. Trả về kết quả dưới dạng JSON thuần túy (không dùng markdown ```json) với cấu trúc sau:
            [
              {{
                "outfit_name": "Tên bộ đồ (ví dụ: Minimalist Office Style)",
-               "item_ids": ["id1", "id2", "id3", "id4"],
+               "item_ids": ["i1", "i2", "i3", "i4"],
                "description": "Mô tả ngắn gọn về các món đồ đã chọn",
                "rationale": "Giải thích chi tiết tại sao bộ đồ này phù hợp với bối cảnh, thời tiết, tông da và nó đang bắt kịp xu hướng nào"
              }},
@@ -79,9 +174,46 @@ async def generate_outfit_suggestions(
         - Luôn ưu tiên phối thêm GIÀY và PHỤ KIỆN để hoàn thiện outfit.
         - Phản hồi hoàn toàn bằng tiếng Việt.
         """
+    return prompt, id_map
+
+def map_item_ids(suggestions: List[Dict], id_map: Dict) -> List[Dict]:
+    # Đổi id ngắn về WardrobeItem.id thật, bỏ id không tồn tại
+    real_ids = set(id_map.values())
+    for suggestion in suggestions:
+        if isinstance(suggestion, dict):
+            suggestion["item_ids"] = [
+                id_map.get(item_id, item_id)
+                for item_id in suggestion.get("item_ids", [])
+                if item_id in id_map or item_id in real_ids
+            ]
+    return suggestions
+
+async def generate_outfit_suggestions(
+    style: str, 
+    occasion: str, 
+    weather: str, 
+    wardrobe: List[Dict],
+    skin_tone: str = "tự nhiên",
+    custom_context: str = None,
+    preferences: Dict = None
+):
+    try:
+        with metrics.span("prompt"):
+            prompt, id_map = build_stylist_prompt(
+                style, occasion, weather, wardrobe, skin_tone, custom_context, preferences
+            )
 
         # --- STEP 3: CALL GEMINI API ---
-        response = model.generate_content(prompt)
+        try:
+            response = await generate_content(prompt, task="suggest")
+        except QuotaExceededError:
+            # Hết quota Gemini => trả gợi ý xác định từ engine nội bộ thay vì lỗi 429
+            if not config.SUGGEST_LOCAL_FALLBACK:
+                raise
+            suggestions = fallback_suggestions(wardrobe, style, occasion, weather, preferences)
+            if not suggestions:
+                raise
+            return suggestions
         
         # --- STEP 4: PROCESS RESULTS ---
         if not response or not response.text:
@@ -121,8 +253,43 @@ async def generate_outfit_suggestions(
         if not isinstance(suggestions, list):
             suggestions = [suggestions]
 
-        return suggestions
+        return map_item_ids(suggestions, id_map)
 
     except Exception as e:
-        # print(f"[ERROR] Stylist Service Error: {str(e)}") # Removed due to encoding issues on Windows
+        logger.warning("Stylist Service Error: %s", e)
         raise e
+
+async def stream_outfit_suggestions(
+    style: str, 
+    occasion: str, 
+    weather: str, 
+    wardrobe: List[Dict],
+    skin_tone: str = "tự nhiên",
+    custom_context: str = None,
+    preferences: Dict = None
+):
+    """
+    Phiên bản streaming của generate_outfit_suggestions: yield từng outfit
+    ngay khi object JSON của nó được model viết xong.
+    """
+    with metrics.span("prompt"):
+        prompt, id_map = build_stylist_prompt(
+            style, occasion, weather, wardrobe, skin_tone, custom_context, preferences
+        )
+    parser = JsonArrayStream()
+    try:
+        async for text in stream_content(prompt, task="suggest"):
+            for suggestion in parser.feed(text):
+                if isinstance(suggestion, dict):
+                    yield map_item_ids([suggestion], id_map)[0]
+            if parser.done:
+                break
+    except QuotaExceededError:
+        # Hết quota trước khi model kịp trả lời => dùng gợi ý nội bộ
+        if not config.SUGGEST_LOCAL_FALLBACK:
+            raise
+        suggestions = fallback_suggestions(wardrobe, style, occasion, weather, preferences)
+        if not suggestions:
+            raise
+        for suggestion in suggestions:
+            yield suggestion
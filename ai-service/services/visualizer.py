@@ -1,133 +1,217 @@
-from PIL import Image
+from PIL import Image, ImageDraw
+import asyncio
 import io
-import requests
-import base64
-import numpy as np
+import json
+import logging
+import random
+import threading
+from urllib.parse import quote
 
-def auto_crop(img):
+from services import config, metrics
+from services.cache import DiskCache, LRUCache, ResultCache, content_key
+from services.fetcher import fetch_all, fetch_all_async
+
+logger = logging.getLogger(__name__)
+
+# Đổi model Gemini / rembg hoặc cỡ ảnh gửi model thì mô tả cũ không còn dùng được
+VISION_CACHE_VERSION = f"{config.model_id('vision')}:{config.REMBG_MODEL}:{config.MODEL_IMAGE_MAX_EDGE}"
+
+# Ảnh đã tách nền + auto-crop, theo hash nội dung ảnh gốc (ảnh PIL, chỉ giữ trong bộ nhớ)
+isolated_cache = LRUCache(max_entries=config.VISION_ISOLATED_CACHE_SIZE, ttl=config.VISION_CACHE_TTL)
+# Mô tả Vision (tiếng Anh), theo hash nội dung ảnh gốc + category
+vision_cache = ResultCache(
+    version=VISION_CACHE_VERSION, max_entries=config.VISION_CACHE_SIZE, ttl=config.VISION_CACHE_TTL
+)
+# Prompt lookbook, theo (outfit_name, analyzed_items, rationale)
+lookbook_prompt_cache = ResultCache(
+    version=config.model_id("prompt"), max_entries=config.VISION_CACHE_SIZE, ttl=config.VISION_CACHE_TTL
+)
+
+def alpha_bbox(img, threshold=0):
+    """
+    Bounding box (left, top, right, bottom) của vùng có alpha > threshold, None nếu
+    ảnh trong suốt hoàn toàn. Chạy hoàn toàn trong C của Pillow: chỉ cấp phát một
+    band alpha 8-bit, không tạo mảng tọa độ như np.argwhere.
+    """
+    alpha = img.getchannel("A")
+    if threshold > 0:
+        # Bỏ viền mờ (halo) rembg để lại: alpha <= threshold coi như trong suốt
+        alpha = alpha.point([0] * (threshold + 1) + [255] * (255 - threshold))
+    return alpha.getbbox()
+
+def auto_crop(img, threshold=None):
     """
     Cắt sát ảnh dựa trên alpha channel (vùng không trong suốt)
+    threshold: alpha tối thiểu được coi là món đồ (mặc định AUTO_CROP_ALPHA_THRESHOLD).
     """
     if img.mode != 'RGBA':
         return img
     
-    # Chuyển sang numpy array để tìm bounding box
-    np_img = np.array(img)
-    alpha = np_img[:, :, 3]
-    
-    # Tìm các pixel có alpha > 0
-    bg_coords = np.argwhere(alpha > 0)
-    if bg_coords.size == 0:
+    threshold = config.AUTO_CROP_ALPHA_THRESHOLD if threshold is None else threshold
+    bbox = alpha_bbox(img, threshold)
+    if bbox is None:
         return img
-        
-    y_min, x_min = bg_coords.min(axis=0)
-    y_max, x_max = bg_coords.max(axis=0)
     
     # Cắt ảnh
-    return img.crop((x_min, y_min, x_max + 1, y_max + 1))
+    return img.crop(bbox)
 
-def download_image(url, remove_bg=False):
-    """Tải ảnh và trả về PIL Image, tùy chọn tách nền và auto-crop"""
+# Thumbnail từng món đồ theo đúng kích thước ô của lưới moodboard (JPEG trên đĩa)
+thumbnail_cache = None
+_thumbnail_cache_lock = threading.Lock()
+
+def get_thumbnail_cache():
+    """Tạo cache thumbnail ở lần dùng đầu tiên (import module, ví dụ trong worker rembg, không tạo thư mục)."""
+    global thumbnail_cache
+    if thumbnail_cache is None and config.THUMBNAIL_CACHE_DIR:
+        with _thumbnail_cache_lock:
+            if thumbnail_cache is None:
+                thumbnail_cache = DiskCache(config.THUMBNAIL_CACHE_DIR, config.THUMBNAIL_CACHE_MAX_BYTES, suffix=".jpg")
+    return thumbnail_cache
+
+def moodboard_layout(num_items, width, height, padding=20):
+    """Chia lưới theo số món (thường 2-4 món); trả về (cols, cell_w, cell_h)."""
+    if num_items <= 2:
+        cols, rows = 1, max(num_items, 1)
+    elif num_items <= 4:
+        cols, rows = 2, 2
+    else:
+        cols, rows = 2, (num_items + 1) // 2
+    cell_w = (width - (cols + 1) * padding) // cols
+    cell_h = (height - (rows + 1) * padding) // rows
+    return cols, cell_w, cell_h
+
+def placeholder_thumbnail(size):
+    # Ảnh dummy 400x400, thu nhỏ nếu ô nhỏ hơn
+    side = min(400, *size)
+    return Image.new("RGB", (side, side), (240, 240, 240))
+
+def load_thumbnail(data, size):
+    """
+    Trả về ảnh RGB vừa khung size (giữ aspect ratio). JPEG được giải mã ở độ
+    phân giải giảm (draft) nên bộ nhớ tỉ lệ với kích thước ô chứ không theo ảnh gốc;
+    kết quả được cache trên đĩa theo hash nội dung + size.
+    """
+    from services.preprocess import open_image
+
+    if data is None:
+        return placeholder_thumbnail(size)
+    cache = get_thumbnail_cache()
+    key = content_key(data, f"thumb:{size[0]}x{size[1]}") if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return Image.open(io.BytesIO(cached))
     try:
-        response = requests.get(url, timeout=10)
-        img = Image.open(io.BytesIO(response.content))
-        
-        if remove_bg:
-            from rembg import remove
-            img = remove(img)
-            img = auto_crop(img)
-            
-        return img.convert("RGBA") if remove_bg else img.convert("RGB")
+        img = open_image(data, draft_size=size)
+        img = img.convert("RGB")
+        img.thumbnail(size, Image.Resampling.LANCZOS)
     except Exception as e:
-        # print(f"[ERROR] Process failed for {url}: {str(e)}")
-        # Trả về ảnh dummy nếu lỗi
-        return Image.new("RGB", (400, 400), (240, 240, 240))
+        # Trả về ảnh dummy nếu lỗi (không cache để lần sau thử lại)
+        return placeholder_thumbnail(size)
+    if key is not None:
+        buffered = io.BytesIO()
+        img.save(buffered, format="JPEG", quality=90)
+        cache.set(key, buffered.getvalue())
+    return img
 
-def create_moodboard(items, width=800, height=1000):
+def create_moodboard(items, width=800, height=1000, images=None):
     """
     Tạo moodboard dạng lưới (Grid/Frames) giữ nguyên ảnh gốc.
+    images: dict url -> bytes đã tải sẵn (nếu không có sẽ tải song song tại đây).
     """
+    if images is None:
+        images = fetch_all([item["image_url"] for item in items])
+
     # Nền xám nhạt trung tính
     canvas = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(canvas)
     
-    # Chia khung dựa trên số lượng item (thường là 2-4 món)
-    num_items = len(items)
-    if num_items <= 2:
-        cols, rows = 1, num_items
-    elif num_items <= 4:
-        cols, rows = 2, 2
-    else:
-        cols, rows = 2, (num_items + 1) // 2
-
-    # Kích thước mỗi cell
     padding = 20
-    cell_w = (width - (cols + 1) * padding) // cols
-    cell_h = (height - (rows + 1) * padding) // rows
+    inner_padding = 10
+    cols, cell_w, cell_h = moodboard_layout(len(items), width, height, padding)
+    target = (cell_w - inner_padding * 2, cell_h - inner_padding * 2)
 
     for idx, item in enumerate(items):
         r, c = idx // cols, idx % cols
         
-        # Tải ảnh
-        img = download_image(item["image_url"])
-        
-        # Resize ảnh khớp vào cell (thêm padding nhỏ trong cell)
-        inner_padding = 10
-        target_w = cell_w - inner_padding * 2
-        target_h = cell_h - inner_padding * 2
-        
-        # Thumbnail giữ aspect ratio
-        img.thumbnail((target_w, target_h), Image.Resampling.LANCZOS)
+        # Ảnh đã được tải song song từ trước; thumbnail giữ aspect ratio
+        img = load_thumbnail(images.get(item["image_url"]), target)
         
         # Tính toán vị trí x, y để căn giữa trong cell
         x = padding + c * (cell_w + padding) + (cell_w - img.width) // 2
         y = padding + r * (cell_h + padding) + (cell_h - img.height) // 2
         
-        # Vẽ một khung viền nhẹ (Optional)
-        # Bằng cách paste ảnh lên một frame trắng lớn hơn chút
-        frame = Image.new("RGB", (img.width + 4, img.height + 4), (220, 220, 220))
-        frame.paste(img, (2, 2))
-        
-        canvas.paste(frame, (x-2, y-2))
+        # Khung viền nhẹ 2px vẽ thẳng lên canvas rồi paste ảnh vào giữa
+        draw.rectangle((x - 2, y - 2, x + img.width + 1, y + img.height + 1), outline=(220, 220, 220), width=2)
+        canvas.paste(img, (x, y))
     
     return canvas
 
-def pil_to_base64(pil_img):
+MOODBOARD_FORMATS = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+def encode_image(pil_img, fmt="PNG", quality=None):
+    """
+    Nén ảnh moodboard, trả về (bytes, mime_type).
+    PNG: lossless (chậm, nặng); JPEG/WEBP: lossy theo quality, nhanh và nhẹ hơn nhiều.
+    """
+    fmt = (fmt or "PNG").upper()
+    if fmt == "JPG":
+        fmt = "JPEG"
+    if fmt not in MOODBOARD_FORMATS:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    quality = quality or config.MOODBOARD_QUALITY
+
     buffered = io.BytesIO()
-    pil_img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+    if fmt == "PNG":
+        pil_img.save(buffered, format="PNG", compress_level=config.MOODBOARD_PNG_COMPRESS_LEVEL)
+    elif fmt == "JPEG":
+        pil_img.convert("RGB").save(buffered, format="JPEG", quality=quality)
+    else:
+        pil_img.save(buffered, format="WEBP", quality=quality, method=config.MOODBOARD_WEBP_METHOD)
+    return buffered.getvalue(), MOODBOARD_FORMATS[fmt]
 
-def analyze_item_vision(img, category="món đồ"):
+async def describe_item_vision(img, category="món đồ"):
     """
-    Sử dụng Gemini Vision để phân tích chi tiết ảnh món đồ đã được cô lập.
+    Gọi Gemini Vision mô tả ảnh món đồ đã được cô lập; lỗi được ném ra cho caller.
     """
-    try:
-        from services.config import model 
-        
-        # Chuyển đổi RGB để Gemini dễ xử lý (loại bỏ alpha if needed)
-        analysis_img = img.convert("RGB")
-        
-        prompt = f"""
-        Đây là ảnh thực tế của một {category} trong tủ đồ. 
-        Hãy mô tả cực kỳ chi tiết các đặc điểm sau của nó để sinh ảnh AI:
-        1. Màu sắc chính xác (ví dụ: xanh navy, denim sáng, trắng kem).
-        2. Chất liệu (ví dụ: cotton, len, da, lụa).
-        3. Họa tiết/Họa tiết in (ví dụ: trơn, kẻ sọc, có hình in graphic ở ngực, thêu hoa).
-        4. Kiểu dáng/Form (ví dụ: cổ tròn, form rộng oversize, tay dài, quần suông).
-        5. Các chi tiết đặc biệt (ví dụ: rách gối, cút vàng, túi hộp).
-
-        Chỉ trả về đoạn mô tả ngắn gọn chi tiết bằng tiếng Anh. Không chào hỏi.
-        """
-        
-        response = model.generate_content([prompt, analysis_img])
-        if not response or not response.text:
-            return f"a high quality {category}"
-        return response.text.strip()
-    except Exception as e:
-        return f"a high quality {category}"
+    from services.model_client import generate_content
+    from services.preprocess import prepare_image
+    from services.scheduler import PRIORITY_BACKGROUND
+
+    # Chuyển đổi RGB để Gemini dễ xử lý (loại bỏ alpha if needed), thu nhỏ và nén lại
+    analysis_img = await asyncio.to_thread(prepare_image, img)
 
-def generate_lookbook_prompt_with_vision(outfit_name, analyzed_items, rationale):
+    prompt = f"""
+    Đây là ảnh thực tế của một {category} trong tủ đồ. 
+    Hãy mô tả cực kỳ chi tiết các đặc điểm sau của nó để sinh ảnh AI:
+    1. Màu sắc chính xác (ví dụ: xanh navy, denim sáng, trắng kem).
+    2. Chất liệu (ví dụ: cotton, len, da, lụa).
+    3. Họa tiết/Họa tiết in (ví dụ: trơn, kẻ sọc, có hình in graphic ở ngực, thêu hoa).
+    4. Kiểu dáng/Form (ví dụ: cổ tròn, form rộng oversize, tay dài, quần suông).
+    5. Các chi tiết đặc biệt (ví dụ: rách gối, cút vàng, túi hộp).
+
+    Chỉ trả về đoạn mô tả ngắn gọn chi tiết bằng tiếng Anh. Không chào hỏi.
+    """
+
+    response = await generate_content([prompt, analysis_img], task="vision", priority=PRIORITY_BACKGROUND)
+    if not response or not response.text:
+        raise ValueError("Empty vision response")
+    return response.text.strip()
+
+def lookbook_prompt_key(outfit_name, analyzed_items, rationale):
+    payload = json.dumps(
+        [outfit_name, analyzed_items, rationale], sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return content_key(payload.encode("utf-8"), lookbook_prompt_cache.version)
+
+async def generate_lookbook_prompt_with_vision(outfit_name, analyzed_items, rationale):
+    key = lookbook_prompt_key(outfit_name, analyzed_items, rationale)
+    cached = lookbook_prompt_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        from services.config import model
+        from services.model_client import generate_content
+        from services.scheduler import PRIORITY_BACKGROUND
         
         items_detail = "\n".join([f"- {item['category']}: {item['vision_desc']}" for item in analyzed_items])
         
@@ -146,20 +230,82 @@ def generate_lookbook_prompt_with_vision(outfit_name, analyzed_items, rationale)
         4. Trả về DUY NHẤT prompt tiếng Anh.
         """
         
-        response = model.generate_content(prompt_request)
+        response = await generate_content(prompt_request, task="prompt", priority=PRIORITY_BACKGROUND)
         if not response or not response.text:
             return f"Professional fashion photography of a model wearing {outfit_name}"
-        return response.text.strip()
+        prompt = response.text.strip()
+        # Chỉ nhớ prompt thật từ Gemini, không nhớ prompt fallback
+        lookbook_prompt_cache.set(key, prompt)
+        return prompt
     except Exception as e:
         return f"Professional fashion photography of a model wearing {outfit_name}"
 
-def generate_lookbook_image_v2(outfit_name, items, rationale):
+async def describe_items_cached(items, images):
+    """
+    Mô tả Vision cho từng món đồ, dùng lại ảnh đã tách nền và mô tả đã cache
+    theo hash nội dung ảnh: món đã gặp thì không chạy lại rembg lẫn Gemini.
+    images: dict url -> bytes. Trả về list dict {category, vision_desc}.
+    """
+    from services.bg_removal import remove_backgrounds
+
+    categories = [item.get("category", "món đồ") for item in items]
+    datas = [images.get(item["image_url"]) for item in items]
+    image_keys = [content_key(data, VISION_CACHE_VERSION) if data is not None else None for data in datas]
+    desc_keys = [
+        content_key(f"{image_key}\n{category}".encode("utf-8"), VISION_CACHE_VERSION) if image_key else None
+        for image_key, category in zip(image_keys, categories)
+    ]
+    descriptions = [vision_cache.get(key) if key else None for key in desc_keys]
+
+    # 1. Tách nền (pool rembg, ngoài event loop) chỉ cho ảnh chưa có trong cache
+    isolated = [
+        isolated_cache.get(key) if key and desc is None else None
+        for key, desc in zip(image_keys, descriptions)
+    ]
+    missing = [
+        i for i, (data, desc, img) in enumerate(zip(datas, descriptions, isolated))
+        if data is not None and desc is None and img is None
+    ]
+    if missing:
+        try:
+            with metrics.span("rembg"):
+                removed = await remove_backgrounds([datas[i] for i in missing])
+        except Exception as e:
+            # Pool rembg lỗi: chỉ các món cần tách nền dùng mô tả dự phòng, món đã cache vẫn dùng cache
+            logger.warning("Background removal failed: %s", e)
+            removed = [None] * len(missing)
+        for i, img in zip(missing, removed):
+            isolated[i] = img
+            if img is not None:
+                isolated_cache.set(image_keys[i], img)
+
+    # 2. Phân tích Vision song song (scheduler lo việc giãn request theo quota)
+    async def describe(i):
+        if descriptions[i] is not None:
+            return descriptions[i]
+        try:
+            if isolated[i] is None:
+                raise ValueError("Background removal failed")
+            vision_desc = await describe_item_vision(isolated[i], categories[i])
+        except Exception as item_error:
+            logger.warning("Item analysis failed, using fallback: %s", item_error)
+            return f"a stylish {items[i].get('category', 'item')}"
+        vision_cache.set(desc_keys[i], vision_desc)
+        return vision_desc
+
+    with metrics.span("vision"):
+        vision_descs = await asyncio.gather(*(describe(i) for i in range(len(items))))
+    return [
+        {"category": category, "vision_desc": vision_desc}
+        for category, vision_desc in zip(categories, vision_descs)
+    ]
+
+async def generate_lookbook_image_v2(outfit_name, items, rationale, images=None):
     """
     Sinh ảnh Lookbook phiên bản Precision (Vision-Driven)
     Bao gồm retry và fallback để tránh rate limit
+    images: dict url -> bytes đã tải sẵn (dùng chung với create_moodboard).
     """
-    import time
-    
     try:
         analyzed_items = []
         
@@ -168,27 +314,11 @@ def generate_lookbook_image_v2(outfit_name, items, rationale):
         priority_items = [item for item in items if any(cat in item.get("category", "") for cat in priority_categories)][:2]
         other_items = [item for item in items if item not in priority_items]
         
-        for idx, item in enumerate(priority_items):
-            try:
-                # 1. Tải, tách nền và cắt sát món đồ
-                isolated_img = download_image(item["image_url"], remove_bg=True)
-                
-                # 2. Phân tích Vision (với delay để tránh rate limit)
-                if idx > 0:
-                    time.sleep(1)  # Delay 1s giữa các lần gọi
-                    
-                vision_desc = analyze_item_vision(isolated_img, item.get("category", "món đồ"))
-                
-                analyzed_items.append({
-                    "category": item.get("category", "món đồ"),
-                    "vision_desc": vision_desc
-                })
-            except Exception as item_error:
-                # print(f"[WARN] Item analysis failed, using fallback: {str(item_error)}")
-                analyzed_items.append({
-                    "category": item.get("category", "món đồ"),
-                    "vision_desc": f"a stylish {item.get('category', 'item')}"
-                })
+        if images is None:
+            images = await fetch_all_async([item["image_url"] for item in priority_items])
+        
+        # 1-2. Tách nền + phân tích Vision, dùng lại kết quả cache theo từng ảnh
+        analyzed_items.extend(await describe_items_cached(priority_items, images))
         
         # Thêm các item khác với mô tả đơn giản (không chạy Vision)
         for item in other_items:
@@ -198,19 +328,20 @@ def generate_lookbook_image_v2(outfit_name, items, rationale):
             })
         
         # 3. Tạo prompt tổng hợp từ Vision results
-        final_prompt = generate_lookbook_prompt_with_vision(outfit_name, analyzed_items, rationale)
+        with metrics.span("lookbook_prompt"):
+            final_prompt = await generate_lookbook_prompt_with_vision(outfit_name, analyzed_items, rationale)
         
         # 4. Sinh ảnh
-        encoded_prompt = requests.utils.quote(final_prompt)
-        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1024&height=1024&nologo=true&seed={np.random.randint(1000)}"
+        encoded_prompt = quote(final_prompt)
+        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1024&height=1024&nologo=true&seed={random.randrange(1000)}"
         
         return image_url
     except Exception as e:
-        # print(f"[ERROR] Precision Lookbook failed: {str(e)}")
+        logger.warning("Precision Lookbook failed: %s", e)
         # Fallback: Tạo prompt đơn giản
         try:
             simple_prompt = f"Professional fashion photography of a model wearing {outfit_name}, stylish outfit, 8k, cinematic"
-            encoded = requests.utils.quote(simple_prompt)
+            encoded = quote(simple_prompt)
             return f"https://image.pollinations.ai/prompt/{encoded}?width=1024&height=1024&nologo=true"
         except:
             return None
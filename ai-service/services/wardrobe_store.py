@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from services import config
+
+
+class SnapshotUnknown(Exception):
+    """Snapshot không còn (bị dọn/restart) hoặc lệch version => client phải gửi lại toàn bộ tủ đồ."""
+
+    def __init__(self, snapshot_id, message):
+        super().__init__(message)
+        self.snapshot_id = snapshot_id
+
+
+def _item_size(item):
+    # Ước lượng bộ nhớ của một món bằng độ dài JSON (đủ để giới hạn tổng, không cần chính xác)
+    return len(json.dumps(item, ensure_ascii=False)) + 64
+
+
+class WardrobeSnapshot:
+    __slots__ = ("snapshot_id", "version", "items", "size", "expires_at", "last_delta")
+
+    def __init__(self, snapshot_id, version, items):
+        self.snapshot_id = snapshot_id
+        self.version = version
+        self.items = items  # OrderedDict id -> dict món đồ
+        self.size = sum(_item_size(item) for item in items.values())
+        self.expires_at = None
+        self.last_delta = None  # (base_version, hash delta) của delta vừa áp dụng
+
+    def view(self):
+        return self.snapshot_id, self.version, list(self.items.values())
+
+
+class WardrobeSnapshots:
+    """
+    Snapshot tủ đồ theo phiên bản, để /suggest chỉ cần gửi phần thay đổi
+    (added/changed/removed) thay vì toàn bộ tủ đồ mỗi lần.
+    Loại bỏ theo LRU khi vượt max_entries hoặc max_bytes, và theo TTL (giây).
+    """
+
+    def __init__(self, max_entries=1000, ttl=None, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, snapshot_id):
+        snapshot = self._data.get(snapshot_id)
+        if snapshot is None:
+            return None
+        if snapshot.expires_at is not None and snapshot.expires_at < time.time():
+            self._drop(snapshot_id)
+            return None
+        self._data.move_to_end(snapshot_id)
+        return snapshot
+
+    def _drop(self, snapshot_id):
+        self._total -= self._data.pop(snapshot_id).size
+
+    def _touch(self, snapshot):
+        snapshot.expires_at = time.time() + self.ttl if self.ttl else None
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.max_entries or self._total > self.max_bytes):
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def put(self, snapshot_id, wardrobe):
+        """
+        Lưu toàn bộ tủ đồ (list dict). Trả về (snapshot_id, version, wardrobe);
+        version tăng nếu id đã tồn tại để delta dựa trên bản cũ bị từ chối.
+        """
+        items = OrderedDict((item["id"], item) for item in wardrobe)
+        with self._lock:
+            previous = self._data.get(snapshot_id)
+            if previous is not None:
+                self._drop(snapshot_id)
+            snapshot = WardrobeSnapshot(snapshot_id, previous.version + 1 if previous else 1, items)
+            self._touch(snapshot)
+            self._data[snapshot_id] = snapshot
+            self._total += snapshot.size
+            self._evict()
+            return snapshot.view()
+
+    def apply(self, snapshot_id, base_version=None, added=(), changed=(), removed=()):
+        """
+        Áp dụng delta lên snapshot. base_version (nếu có) phải khớp version hiện tại;
+        gửi lại đúng delta vừa áp dụng (retry) thì trả về snapshot hiện tại.
+        Trả về (snapshot_id, version, wardrobe) sau khi áp dụng.
+        Raise SnapshotUnknown nếu snapshot không còn hoặc version lệch.
+        """
+        delta_hash = hashlib.sha256(json.dumps(
+            [list(added), list(changed), list(removed)], sort_keys=True, ensure_ascii=False
+        ).encode("utf-8")).hexdigest()
+        with self._lock:
+            snapshot = self._get(snapshot_id)
+            if snapshot is None:
+                self.misses += 1
+                raise SnapshotUnknown(snapshot_id, f"Wardrobe snapshot '{snapshot_id}' is unknown or expired, resend the full wardrobe")
+            if base_version is not None and base_version != snapshot.version:
+                if snapshot.last_delta == (base_version, delta_hash):
+                    self.hits += 1
+                    return snapshot.view()
+                self.misses += 1
+                raise SnapshotUnknown(
+                    snapshot_id,
+                    f"Wardrobe snapshot '{snapshot_id}' is at version {snapshot.version}, not {base_version}; resend the full wardrobe"
+                )
+            self.hits += 1
+            if not (added or changed or removed):
+                self._touch(snapshot)
+                return snapshot.view()
+
+            for item_id in removed:
+                item = snapshot.items.pop(item_id, None)
+                if item is not None:
+                    snapshot.size -= _item_size(item)
+                    self._total -= _item_size(item)
+            # added và changed đều là upsert: món đã có giữ nguyên vị trí, món mới thêm vào cuối
+            for item in [*added, *changed]:
+                old = snapshot.items.get(item["id"])
+                delta = _item_size(item) - (_item_size(old) if old is not None else 0)
+                snapshot.items[item["id"]] = item
+                snapshot.size += delta
+                self._total += delta
+            snapshot.last_delta = (snapshot.version, delta_hash)
+            snapshot.version += 1
+            self._touch(snapshot)
+            self._evict()
+            return snapshot.view()
+
+    def delete(self, snapshot_id):
+        with self._lock:
+            if snapshot_id in self._data:
+                self._drop(snapshot_id)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "snapshots": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+wardrobe_snapshots = WardrobeSnapshots(
+    max_entries=config.WARDROBE_SNAPSHOT_MAX_ENTRIES,
+    ttl=config.WARDROBE_SNAPSHOT_TTL,
+    max_bytes=config.WARDROBE_SNAPSHOT_MAX_BYTES,
+)
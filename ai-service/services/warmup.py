@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+
+from services import bg_removal, config
+from services.fetcher import get_session
+from services.model_router import router
+
+logger = logging.getLogger(__name__)
+
+COLD = "cold"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class Component:
+    """
+    Một thành phần nặng được load ở nền sau khi khởi động (hoặc ở request đầu tiên).
+    load: hàm đồng bộ, chạy trong thread. loaded: tùy chọn, hàm kiểm tra đã load xong
+    chưa (để báo đúng trạng thái khi thành phần được load bởi request thay vì warm-up).
+    """
+
+    def __init__(self, name, load, loaded=None):
+        self.name = name
+        self.load = load
+        self.loaded = loaded
+        self.state = COLD
+        self.seconds = None
+        self.error = None
+
+    async def warm(self):
+        self.state = WARMING
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            logger.warning("Warm-up of %s failed: %s", self.name, e)
+        else:
+            self.state = READY
+        self.seconds = round(time.perf_counter() - started, 3)
+
+    def status(self):
+        state = self.state
+        if state in (COLD, FAILED) and self.loaded is not None and self.loaded():
+            state = READY
+        return {"state": state, "seconds": self.seconds, "error": self.error if state == FAILED else None}
+
+
+class WarmUp:
+    """Warm-up các thành phần nặng ở nền để /health trả lời ngay sau khi process khởi động."""
+
+    def __init__(self, components):
+        self.components = components
+        self._task = None
+        self.started_at = time.time()
+
+    async def _run(self):
+        # Lần lượt từng thành phần: rembg/onnxruntime và SDK Gemini cùng tranh CPU lúc import
+        for component in self.components:
+            await component.warm()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self):
+        components = {component.name: component.status() for component in self.components}
+        states = [component["state"] for component in components.values()]
+        return {
+            # Thành phần lỗi không chặn readiness: service vẫn chạy ở chế độ dự phòng (degraded)
+            "ready": WARMING not in states and (COLD not in states or not config.WARM_UP_ON_STARTUP),
+            "degraded": FAILED in states,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "components": components,
+        }
+
+
+warmup = WarmUp([
+    Component("model_client", router.load, router.loaded),
+    Component("fetcher", get_session),
+    Component("rembg", bg_removal.start_pool, bg_removal.is_ready),
+])
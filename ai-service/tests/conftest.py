@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Cấu hình phải có trước khi import services.config: fake model, không warm-up,
+# mọi thư mục ghi ra đĩa nằm trong thư mục tạm
+_tmp = tempfile.mkdtemp(prefix="ootd-tests-")
+os.environ.update({
+    "MODEL_BACKEND": "fake",
+    "FAKE_MODEL_LATENCY": "fixed:0.05",
+    "WARM_UP_ON_STARTUP": "false",
+    "GEMINI_RPM": "100000",
+    "GEMINI_BURST": "1000",
+    "ANALYZE_CACHE_DB": "",
+    "THUMBNAIL_CACHE_DIR": os.path.join(_tmp, "thumbnails"),
+    "BLOB_STORE_DIR": os.path.join(_tmp, "blobs"),
+    "PROFILE_SAMPLE_RATE": "0",
+    "VISUALIZE_JOB_STORE": "memory",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,52 @@
+import asyncio
+import base64
+import json
+
+import pytest
+
+from services.analyzer import decode_base64_image
+from services.preprocess import InvalidImage
+from tests.utils import app_client, noise_jpeg
+
+
+def post_batch(images):
+    async def run():
+        async with app_client() as client:
+            response = await client.post("/analyze/batch", json={
+                "images": [{"id": f"item{i}", "image_base64": image} for i, image in enumerate(images)]
+            })
+            return response.status_code, [json.loads(line) for line in response.text.splitlines()]
+
+    return asyncio.run(run())
+
+
+def test_corrupt_images_fail_only_their_own_index():
+    valid = [base64.b64encode(noise_jpeg(400 + seed)).decode("ascii") for seed in range(3)]
+    cut_header = base64.b64encode(noise_jpeg(410)[:300]).decode("ascii")
+    cut_pixels = noise_jpeg(411)
+    cut_pixels = base64.b64encode(cut_pixels[:len(cut_pixels) // 2]).decode("ascii")
+    not_an_image = base64.b64encode(b"definitely not a jpeg").decode("ascii")
+    # Cùng gói ANALYZE_BATCH_PACK_SIZE (4) với ảnh hợp lệ
+    images = [valid[0], cut_header, valid[1], cut_pixels, "!!!", valid[2], not_an_image]
+
+    status, lines = post_batch(images)
+    assert status == 200
+    by_index = {line["index"]: line for line in lines}
+    assert sorted(by_index) == list(range(len(images)))
+    for index in (0, 2, 5):
+        assert by_index[index]["success"] and by_index[index]["data"]["category"]
+    for index in (1, 3, 4, 6):
+        assert not by_index[index]["success"]
+        assert by_index[index]["status"] == 400
+        assert by_index[index]["id"] == f"item{index}"
+
+
+def test_decode_base64_image_is_strict():
+    data = noise_jpeg(420)
+    encoded = base64.b64encode(data).decode("ascii")
+    assert decode_base64_image("data:image/jpeg;base64," + encoded) == data
+    # Base64 xuống dòng mỗi 76 ký tự (MIME) vẫn hợp lệ
+    assert decode_base64_image("\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))) == data
+    for garbage in ("!!!", "", "abc"):
+        with pytest.raises(InvalidImage):
+            decode_base64_image(garbage)
@@ -0,0 +1,45 @@
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from services import analyzer
+from tests.utils import noise_jpeg
+
+
+def test_cache_miss_extracts_colors_once(monkeypatch):
+    calls = []
+    extract_colors = analyzer.extract_colors
+
+    def counting(source, *args, **kwargs):
+        calls.append(source)
+        return extract_colors(source, *args, **kwargs)
+
+    monkeypatch.setattr(analyzer, "extract_colors", counting)
+    result = asyncio.run(analyzer.analyze_image_bytes(noise_jpeg(201)))
+    assert result["color"]
+    # Màu tính khi tìm ảnh gần trùng được dùng lại khi đối chiếu màu của model
+    assert len(calls) == 1
+
+
+def test_batch_single_leftover_is_not_fingerprinted_twice(monkeypatch):
+    original = noise_jpeg(202)
+    cached = asyncio.run(analyzer.analyze_image_bytes(original))
+    # Cùng ảnh, nén lại: gần trùng với ảnh đã phân tích
+    img = Image.open(io.BytesIO(original))
+    recompressed = io.BytesIO()
+    img.save(recompressed, "JPEG", quality=60)
+    images = [base64.b64encode(data).decode("ascii") for data in (recompressed.getvalue(), noise_jpeg(203))]
+
+    calls = []
+    image_fingerprint = analyzer.image_fingerprint
+    monkeypatch.setattr(analyzer, "image_fingerprint", lambda data: calls.append(data) or image_fingerprint(data))
+
+    async def run():
+        return [item async for item in analyzer.analyze_batch(images)]
+
+    results = sorted(asyncio.run(run()), key=lambda item: item[0])
+    assert [error for _, _, error in results] == [None, None]
+    assert results[0][1] == cached  # Ảnh nén lại dùng kết quả của ảnh gần trùng
+    assert len(calls) == 2
@@ -0,0 +1,35 @@
+import asyncio
+import logging
+
+import pytest
+
+from services import bg_removal, config
+from tests.utils import noise_jpeg
+
+
+def test_rembg_failure_is_recorded_once_and_originals_are_used(monkeypatch, caplog):
+    monkeypatch.setattr(config, "REMBG_WORKERS", 0)
+    monkeypatch.setattr(bg_removal, "_pool", None)
+    monkeypatch.setattr(bg_removal, "_pool_error", None)
+    loads = []
+
+    def broken_warm_up():
+        loads.append(1)
+        raise ImportError("No module named 'onnxruntime'")
+
+    monkeypatch.setattr(bg_removal, "warm_up", broken_warm_up)
+    datas = [noise_jpeg(301), None, b"not an image"]
+
+    with caplog.at_level(logging.ERROR, logger="services.bg_removal"):
+        first = asyncio.run(bg_removal.remove_backgrounds(datas))
+        second = asyncio.run(bg_removal.remove_backgrounds(datas))
+
+    # Import/load lỗi chỉ được thử (và log) một lần; các lần sau dùng ngay ảnh gốc
+    assert len(loads) == 1
+    assert len([r for r in caplog.records if r.exc_info]) == 1
+    for images in (first, second):
+        assert images[0].mode == "RGBA" and images[0].size == (256, 256)
+        assert images[1:] == [None, None]
+    assert "onnxruntime" in bg_removal.stats()["error"]
+    with pytest.raises(bg_removal.RembgUnavailable):
+        bg_removal.start_pool()
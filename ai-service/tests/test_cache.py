@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import time
+
+from services.blob_store import BlobStore
+from services.cache import DiskCache
+
+
+def test_blob_store_dedups_and_prunes_oldest(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=250)
+    first, etag = store.put(b"a" * 100, "image/png")
+    assert first == f"{etag}.png"
+    assert store.put(b"a" * 100, "image/png") == (first, etag)
+    assert store.stats() == {"blobs": 1, "bytes": 100, "max_bytes": 250}
+
+    old = time.time() - 60
+    os.utime(tmp_path / first, (old, old))
+    second, _ = store.put(b"b" * 100, "image/jpeg")
+    os.utime(tmp_path / second, (old + 1, old + 1))
+    third, _ = store.put(b"c" * 100, "image/webp")
+
+    assert store.open(first) is None
+    assert store.open(second)[1:] == ("image/jpeg", second[:-4])
+    assert store.open(third) is not None
+    assert store.stats()["bytes"] == 200
+    # Mở lại: chỉ nhận file đúng dạng tên blob
+    (tmp_path / "junk.tmp").write_bytes(b"x")
+    assert BlobStore(str(tmp_path), 250).stats()["blobs"] == 2
+
+
+def test_disk_cache_touch_and_suffix(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000, suffix=".jpg")
+    assert not cache.touch("k")
+    cache.set("k", b"data")
+    assert cache.touch("k")
+    assert cache.get("k") == b"data"
+    assert os.listdir(tmp_path) == ["k.jpg"]
+
+
+def test_importing_visualizer_does_not_create_thumbnail_dir(tmp_path):
+    directory = tmp_path / "thumbs"
+    env = {**os.environ, "THUMBNAIL_CACHE_DIR": str(directory)}
+    subprocess.run(
+        [sys.executable, "-c", "import services.visualizer"],
+        cwd=os.path.dirname(os.path.dirname(__file__)), env=env, check=True,
+    )
+    assert not directory.exists()
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from services.jobs import STATUS_DONE, STATUS_FAILED, STATUS_RUNNING, JobQueue, MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobStore(str(tmp_path / "jobs.db"))
+    return MemoryJobStore()
+
+
+def test_finished_jobs_are_capped_oldest_first(store):
+    async def run():
+        queue = JobQueue(store, workers=1, max_pending=100, ttl=3600, max_finished=3)
+
+        async def lookbook(n):
+            return {"image_base64": "x" * 1000, "n": n}
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def slow():
+            await asyncio.sleep(3600)
+
+        job_ids = []
+        for n in range(5):
+            job_ids.append(queue.submit("visualize", lambda n=n: lookbook(n)))
+            await asyncio.sleep(0.01)
+        job_ids.append(queue.submit("visualize", fail))
+        await asyncio.sleep(0.01)
+        slow_id = queue.submit("visualize", slow)
+        await asyncio.sleep(0.01)
+        return queue, job_ids, slow_id
+
+    queue, job_ids, slow_id = asyncio.run(run())
+    # Chỉ còn 3 job đã xong mới nhất; job đang chạy không bị tính
+    assert [queue.get(job_id) for job_id in job_ids[:3]] == [None, None, None]
+    assert [queue.get(job_id)["status"] for job_id in job_ids[3:]] == [STATUS_DONE, STATUS_DONE, STATUS_FAILED]
+    assert queue.get(job_ids[4])["result"]["n"] == 4
+    assert queue.get(slow_id)["status"] == STATUS_RUNNING
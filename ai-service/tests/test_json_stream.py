@@ -0,0 +1,47 @@
+import json
+
+from services.json_stream import JsonArrayStream
+
+OUTFITS = [
+    {"outfit_name": "Công sở", "item_ids": ["i1", "i2"], "description": 'Áo "sơ mi" trắng {basic}'},
+    {"outfit_name": "Dạo phố", "item_ids": ["i3"], "description": "Quần jean \\ áo thun ] [ }"},
+    {"outfit_name": "Cuối tuần", "item_ids": [], "description": "Xuống dòng\nvà tab\té"},
+]
+
+
+def feed_chunks(chunks):
+    parser = JsonArrayStream()
+    parsed = []
+    for chunk in chunks:
+        parsed.extend(parser.feed(chunk))
+    return parser, parsed
+
+
+def test_every_split_point_gives_the_same_objects():
+    text = "```json\n" + json.dumps(OUTFITS, ensure_ascii=False) + "\n```"
+    # Cắt ở mọi vị trí: giữa token, giữa chuỗi, ngay sau dấu \ của escape
+    for cut in range(1, len(text)):
+        parser, parsed = feed_chunks([text[:cut], text[cut:]])
+        assert parsed == OUTFITS, cut
+        assert parser.done
+
+
+def test_one_char_chunks_with_escapes():
+    text = "Đây là gợi ý: " + json.dumps(OUTFITS) + " hết."
+    parser, parsed = feed_chunks(list(text))
+    assert parsed == OUTFITS
+    assert parser.done
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    first = json.dumps(OUTFITS[0], ensure_ascii=False)
+    parser = JsonArrayStream()
+    assert parser.feed("[" + first[:-1]) == []
+    assert parser.feed(first[-1] + ", {\"outfit_name\": \"Dạo") == [OUTFITS[0]]
+    assert not parser.done
+
+
+def test_broken_object_is_skipped():
+    parser, parsed = feed_chunks(['[{"a": 1,}, ', '{"b": "x\\"}"}', "]"])
+    assert parsed == [{"b": 'x"}'}]
+    assert parser.done
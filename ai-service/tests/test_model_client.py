@@ -0,0 +1,71 @@
+import asyncio
+import base64
+import time
+
+from services import config, model_client
+from services.model_backends import FakeModel
+from services.model_router import router
+from tests.utils import app_client, noise_jpeg
+
+LATENCY = 0.3
+REQUESTS = 50
+
+
+def test_concurrent_analyze_calls_overlap(monkeypatch):
+    # Model chậm cố định LATENCY giây: 50 request chạy tuần tự sẽ mất 50 * LATENCY
+    for target in router.targets():
+        model = target.get_model()
+        monkeypatch.setattr(model, "latency", lambda rng: LATENCY)
+    images = [base64.b64encode(noise_jpeg(seed)).decode("ascii") for seed in range(REQUESTS)]
+
+    async def run():
+        async with app_client() as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/analyze", json={"image_base64": image}) for image in images
+            ))
+            return time.perf_counter() - started, responses
+
+    wall, responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200] * REQUESTS
+    assert all(r.json()["success"] for r in responses)
+    # Bị chặn bởi GEMINI_MAX_CONCURRENCY lệnh gọi song song, không phải chạy tuần tự
+    assert wall < REQUESTS * LATENCY / 4
+    assert wall >= REQUESTS / config.GEMINI_MAX_CONCURRENCY * LATENCY * 0.9
+
+
+def test_stream_holds_slot_per_attempt_not_during_backoff(monkeypatch):
+    monkeypatch.setattr(model_client, "_semaphore", asyncio.Semaphore(1))
+    throttled = FakeModel(latency="fixed:0", rate_429=1.0)
+    model = FakeModel(latency="fixed:0", chunk_delay=0.01)
+    seen = {}
+
+    async def run(task, call, priority, deadline):
+        # Router giả: lần đầu bị 429, backoff rồi thử lại với cặp key/model khác
+        try:
+            await call(throttled)
+        except Exception:
+            pass
+        seen["backoff"] = model_client._semaphore.locked()
+        return await call(model)
+
+    monkeypatch.setattr(model_client.router, "run", run)
+
+    async def consume(limit=None):
+        locked = []
+        stream = model_client.stream_content("prompt", task="suggest")
+        async for _ in stream:
+            locked.append(model_client._semaphore.locked())
+            if len(locked) == limit:
+                break
+        await stream.aclose()
+        return locked
+
+    locked = asyncio.run(consume())
+    assert seen["backoff"] is False
+    assert len(locked) > 1 and all(locked)
+    assert not model_client._semaphore.locked()
+
+    # Caller ngừng đọc sớm: slot vẫn được trả lại
+    assert asyncio.run(consume(limit=1)) == [True]
+    assert not model_client._semaphore.locked()
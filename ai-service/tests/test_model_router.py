@@ -0,0 +1,110 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from services import config
+from services.model_backends import FakeModel
+from services.model_router import ModelRouter, Target
+from services.scheduler import QuotaExceededError, QuotaScheduler
+
+PROMPT = "item_ids\n i1|Áo|Đen"
+
+
+def target(label, model_name="flash", rate_429=0.0, latency="fixed:0"):
+    return Target(label, None, model_name, model=FakeModel(latency=latency, rate_429=rate_429, retry_after=2.0))
+
+
+def router(*tiers, seed=0):
+    return ModelRouter({"suggest": [list(tier) for tier in tiers]}, rng=random.Random(seed))
+
+
+async def generate(model):
+    return await model.generate_content_async(PROMPT)
+
+
+def run(r, call=generate, **kwargs):
+    return asyncio.run(r.run("suggest", call, **kwargs))
+
+
+def test_weighted_key_selection():
+    heavy, light = target("key1"), target("key2")
+    r = router([(heavy, 3), (light, 1)])
+    picks = [r.pick("suggest")[0] for _ in range(4000)]
+    assert 2.6 < picks.count(heavy) / picks.count(light) < 3.4
+
+
+def test_429_fails_over_to_other_key_in_same_tier():
+    throttled, healthy = target("key1", rate_429=1.0), target("key2")
+    lite = target("key1", "lite")
+    r = router([(throttled, 1000), (healthy, 1)], [(lite, 1)])
+    assert run(r).text
+    assert (throttled.calls, healthy.calls, lite.calls) == (1, 1, 0)
+    assert throttled.scheduler.throttled == 1
+    assert r.stats()["failovers"]["suggest"] == 0
+
+
+def test_429_on_every_key_fails_over_to_lite_tier_once():
+    flash = [target("key1", rate_429=1.0), target("key2", rate_429=1.0)]
+    lite_throttled, lite_ok = target("key1", "lite", rate_429=1.0), target("key2", "lite")
+    r = router([(t, 1) for t in flash], [(lite_throttled, 1000), (lite_ok, 1)])
+    assert run(r).text
+    assert [t.calls for t in (*flash, lite_throttled, lite_ok)] == [1, 1, 1, 1]
+    # Thử 2 cặp ở tầng lite nhưng chỉ 1 lệnh gọi được tầng dự phòng phục vụ
+    assert r.stats()["failovers"]["suggest"] == 1
+
+
+def test_queued_calls_are_rerouted_when_their_pair_gets_429():
+    # Cặp chính chỉ có 1 token: lệnh gọi thứ 2 xếp hàng chờ, lệnh đầu nhận 429
+    primary = target("key1", rate_429=1.0, latency="fixed:0.1")
+    primary.scheduler = QuotaScheduler(60, 1)
+    backup = target("key1", "lite")
+    r = router([(primary, 1)], [(backup, 1)])
+
+    async def both():
+        started = time.monotonic()
+        results = await asyncio.gather(r.run("suggest", generate), r.run("suggest", generate))
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(both())
+    assert all(result.text for result in results)
+    # Lệnh đang chờ không chờ hết lượt token của cặp bị 429 mà chuyển ngay sang tầng lite
+    assert elapsed < 0.5
+    assert (primary.calls, backup.calls) == (1, 2)
+    assert r.stats()["failovers"]["suggest"] == 2
+
+
+def test_health_cooldown_after_repeated_errors(monkeypatch):
+    monkeypatch.setattr(config, "MODEL_ROUTER_COOLDOWN", 0.2)
+    broken, backup = target("key1"), target("key1", "lite")
+    r = router([(broken, 1)], [(backup, 1)])
+
+    async def call(model):
+        if model is broken.model:
+            raise RuntimeError("500 internal error")
+        return await generate(model)
+
+    for _ in range(config.MODEL_ROUTER_FAILURE_THRESHOLD):
+        with pytest.raises(RuntimeError):
+            run(r, call)
+    assert not r.stats()["targets"][0]["healthy"]
+    # Đang tạm ngắt: lệnh gọi đi thẳng sang tầng lite
+    assert run(r, call).text
+    assert (broken.calls, backup.calls) == (config.MODEL_ROUTER_FAILURE_THRESHOLD, 1)
+
+    time.sleep(0.25)
+    assert r.pick("suggest") == (broken, 0)
+
+
+def test_quota_exceeded_when_every_pair_is_throttled():
+    pairs = [target("key1", rate_429=1.0), target("key2", rate_429=1.0), target("key1", "lite", rate_429=1.0)]
+    r = router([(t, 1) for t in pairs[:2]], [(pairs[2], 1)])
+    started = time.monotonic()
+    with pytest.raises(QuotaExceededError) as excinfo:
+        run(r, deadline=time.monotonic() + 0.5)
+    # Mọi cặp đều bị chặn ~2 s (retry hint), lâu hơn deadline => báo lỗi ngay, không ngủ chờ
+    assert time.monotonic() - started < 0.5
+    assert excinfo.value.retry_after >= 1
+    assert [t.calls for t in pairs] == [1, 1, 1]
+    assert r.stats()["rejected"] == 1
@@ -0,0 +1,29 @@
+import io
+
+from PIL import Image
+
+from services import config
+from services.colors import extract_colors
+from services.preprocess import prepare_image
+from tests.utils import garment_photo
+
+
+def test_phone_photo_is_shrunk_rotated_and_keeps_colors():
+    data = garment_photo((4032, 3024), (30, 60, 150), "JPEG", orientation=6)
+    prepared = prepare_image(data)
+
+    img = Image.open(io.BytesIO(prepared["data"]))
+    assert prepared["mime_type"] == "image/jpeg"
+    assert max(img.size) == config.MODEL_IMAGE_MAX_EDGE
+    assert img.height > img.width  # EXIF orientation 6 đã được áp dụng
+    assert len(prepared["data"]) < len(data) / 5
+    assert extract_colors(prepared["data"]) == extract_colors(data)
+
+
+def test_png_is_reencoded_and_keeps_colors():
+    data = garment_photo((1500, 2000), (180, 30, 40), "PNG")
+    prepared = prepare_image(data)
+
+    assert Image.open(io.BytesIO(prepared["data"])).format == "JPEG"
+    assert len(prepared["data"]) < len(data) / 5
+    assert extract_colors(prepared["data"]) == extract_colors(data)
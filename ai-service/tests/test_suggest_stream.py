@@ -0,0 +1,68 @@
+import asyncio
+import json
+import time
+
+from services.model_router import router
+
+CHUNK_DELAY = 0.05
+REQUEST = {
+    "style": "Minimalist",
+    "occasion": "Đi làm",
+    "weather": "Mát mẻ",
+    "wardrobe": [
+        {"id": f"item{i}", "name": f"Món {i}", "category": ["Áo", "Quần", "Giày", "Túi"][i % 4], "color": ["Đen"]}
+        for i in range(8)
+    ],
+}
+
+
+async def post_stream(path, payload):
+    """Gọi thẳng ASGI app, ghi lại thời điểm nhận từng đoạn body (httpx.ASGITransport gom cả body)."""
+    import main
+
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    received = []
+    sent = False
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            received.append((time.perf_counter() - started, message["status"]))
+        elif message.get("body"):
+            received.append((time.perf_counter() - started, message["body"].decode("utf-8")))
+
+    await main.app(scope, receive, send)
+    return received
+
+
+def test_first_outfit_arrives_before_stream_completes(monkeypatch):
+    for target in router.targets():
+        model = target.get_model()
+        monkeypatch.setattr(model, "chunk_chars", 16)
+        monkeypatch.setattr(model, "chunk_delay", CHUNK_DELAY)
+
+    received = asyncio.run(post_stream("/suggest/stream", REQUEST))
+    assert received[0][1] == 200
+    events = received[1:]
+    outfits = [at for at, body in events if body.startswith("event: outfit")]
+    done = [at for at, body in events if body.startswith("event: done")]
+
+    assert len(outfits) == 3 and len(done) == 1
+    assert json.loads(events[-1][1].split("data: ", 1)[1]) == {"success": True, "count": 3}
+    # Outfit đầu tiên được gửi ngay, còn nhiều chunk nữa mới hết phản hồi của model
+    assert outfits[0] < done[0] - 5 * CHUNK_DELAY
+    first = json.loads(events[0][1].split("data: ", 1)[1])
+    assert set(first["item_ids"]) <= {item["id"] for item in REQUEST["wardrobe"]}
@@ -0,0 +1,58 @@
+import asyncio
+
+from services import config
+from tests.utils import app_client, noise_jpeg
+
+BOUNDARY = "ootd-test-boundary"
+
+
+def multipart_body(field, data):
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="item.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def post_chunked(body, chunk_size=16 * 1024):
+    sent = 0
+
+    async def chunks():
+        # Generator không có Content-Length => httpx gửi chunked
+        nonlocal sent
+        for start in range(0, len(body), chunk_size):
+            sent += 1
+            yield body[start:start + chunk_size]
+
+    async def run():
+        async with app_client() as client:
+            return await client.post(
+                "/analyze/upload",
+                content=chunks(),
+                headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+            )
+
+    response = asyncio.run(run())
+    return response, sent, -(-len(body) // chunk_size)
+
+
+def test_multipart_upload_is_analyzed():
+    response, _, _ = post_chunked(multipart_body("file", noise_jpeg(1)))
+    assert response.status_code == 200
+    assert response.json()["success"]
+
+
+def test_missing_file_field_is_rejected():
+    response, _, _ = post_chunked(multipart_body("image", noise_jpeg(2)))
+    assert response.status_code == 400
+    assert '"file"' in response.json()["error"]
+
+
+def test_chunked_multipart_over_limit_stops_early(monkeypatch):
+    monkeypatch.setattr(config, "ANALYZE_MAX_UPLOAD_BYTES", 64 * 1024)
+    response, sent, total = post_chunked(multipart_body("file", b"\xff" * (2 * 1024 * 1024)))
+    assert response.status_code == 413
+    # Dừng đọc ngay sau khi vượt giới hạn, không nhận hết 2 MiB
+    assert sent < total // 4
@@ -0,0 +1,48 @@
+import asyncio
+
+from PIL import Image
+
+from services import bg_removal, visualizer
+from tests.utils import app_client, noise_jpeg
+
+
+def test_background_removal_failure_falls_back_per_item(monkeypatch):
+    items = [
+        {"image_url": "http://img/top.jpg", "category": "Áo"},
+        {"image_url": "http://img/pants.jpg", "category": "Quần"},
+    ]
+    images = {"http://img/top.jpg": noise_jpeg(101), "http://img/pants.jpg": noise_jpeg(102)}
+
+    async def remove_ok(datas):
+        return [Image.new("RGBA", (64, 64), (10, 20, 30, 255)) for _ in datas]
+
+    async def remove_broken(datas):
+        raise RuntimeError("rembg pool crashed")
+
+    async def describe(img, category="món đồ"):
+        return f"a navy cotton {category}"
+
+    monkeypatch.setattr(visualizer, "describe_item_vision", describe)
+    # Lần đầu: mô tả của áo được cache
+    monkeypatch.setattr(bg_removal, "remove_backgrounds", remove_ok)
+    asyncio.run(visualizer.describe_items_cached(items[:1], images))
+
+    # Pool rembg hỏng: áo vẫn dùng mô tả đã cache, chỉ quần dùng mô tả dự phòng
+    monkeypatch.setattr(bg_removal, "remove_backgrounds", remove_broken)
+    analyzed = asyncio.run(visualizer.describe_items_cached(items, images))
+    assert analyzed == [
+        {"category": "Áo", "vision_desc": "a navy cotton Áo"},
+        {"category": "Quần", "vision_desc": "a stylish Quần"},
+    ]
+
+
+def test_image_quality_out_of_range_is_rejected():
+    async def post(path, quality):
+        async with app_client() as client:
+            return await client.post(path, json={"items": [], "image_format": "JPEG", "image_quality": quality})
+
+    for path in ("/visualize", "/visualize/jobs"):
+        for quality in (0, 101, 500):
+            response = asyncio.run(post(path, quality))
+            assert response.status_code == 422
+            assert response.json()["detail"][0]["loc"][-1] == "image_quality"
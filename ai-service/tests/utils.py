@@ -0,0 +1,54 @@
+import contextlib
+import io
+
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def noise_jpeg(seed, size=256):
+    # Ảnh nhiễu khác nhau theo seed: không trúng cache kết quả lẫn chỉ mục ảnh gần trùng
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (size // 8, size // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).resize((size, size), Image.Resampling.BILINEAR)
+    buffered = io.BytesIO()
+    img.save(buffered, "JPEG", quality=85)
+    return buffered.getvalue()
+
+
+def garment_photo(size, color, fmt, orientation=None):
+    # Nền vải nhiễu nhẹ + một chiếc áo (thân + tay) màu đồng nhất, giống ảnh chụp tủ đồ
+    width, height = size
+    rng = np.random.default_rng(width * 31 + height)
+    background = np.clip(rng.normal(228, 10, (height // 4, width // 4, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(background).resize(size, Image.Resampling.BILINEAR)
+    draw = ImageDraw.Draw(img)
+    cx, top = width // 2, height // 6
+    body_w, body_h = width // 3, height * 2 // 3
+    draw.rectangle((cx - body_w // 2, top, cx + body_w // 2, top + body_h), fill=color)
+    draw.polygon([
+        (cx - body_w // 2, top), (cx - body_w, top + body_h // 3),
+        (cx - body_w * 3 // 4, top + body_h // 2), (cx - body_w // 2, top + body_h // 4),
+    ], fill=color)
+    draw.polygon([
+        (cx + body_w // 2, top), (cx + body_w, top + body_h // 3),
+        (cx + body_w * 3 // 4, top + body_h // 2), (cx + body_w // 2, top + body_h // 4),
+    ], fill=color)
+    buffered = io.BytesIO()
+    if fmt == "JPEG":
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        img.save(buffered, "JPEG", quality=92, exif=exif.tobytes())
+    else:
+        img.save(buffered, fmt)
+    return buffered.getvalue()
+
+
+@contextlib.asynccontextmanager
+async def app_client():
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=60) as client:
+        yield client
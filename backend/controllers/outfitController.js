@@ -6,6 +6,7 @@ const User = require("../models/User");
 const { uploadOutfitImage, isBase64Image } = require("../config/cloudinaryConfig");
 const axios = require("axios");
 const weatherService = require("../services/weatherService");
+const wardrobeSnapshotService = require("../services/wardrobeSnapshotService");
 
 // ========================================
 // 1. GET ALL OUTFITS (với filters)
@@ -731,16 +732,16 @@ exports.aiSuggest = async (req, res) => {
     };
 
     // 3. Gọi AI Service (bao gồm profile và custom_context nếu có)
+    // Tủ đồ gửi theo snapshot: lần đầu gửi toàn bộ, các lần sau chỉ gửi phần thay đổi
     const AI_SERVICE_URL = process.env.AI_SERVICE_URL || "http://localhost:8000";
-    const response = await axios.post(`${AI_SERVICE_URL}/suggest`, {
+    const response = await wardrobeSnapshotService.postSuggest(AI_SERVICE_URL, userId, {
       style,
       occasion,
       weather,
       skin_tone,
       custom_context,
       preferences, // Gửi thêm sở thích cá nhân từ profile
-      wardrobe: wardrobeForAI
-    });
+    }, wardrobeForAI);
 
     if (response.data.success) {
       // 4. Bổ sung thông tin item (hình ảnh, tên) vào kết quả trả về cho frontend
@@ -489,7 +489,8 @@ exports.analyzeImage = async (req, res) => {
       aiResponse = await axios.post(
         aiServiceUrl,
         { image_base64: imageBase64 },
-        { timeout: 50000 }
+        // AI service hủy việc đang làm khi quá deadline này (không chạy tiếp sau khi axios đã bỏ cuộc)
+        { timeout: 50000, headers: { "X-Request-Timeout": "50" } }
       );
       console.log("✅ [2/4] AI Service đã phản hồi");
     } catch (aiError) {
@@ -675,7 +676,8 @@ exports.analyzeImage = async (req, res) => {
       aiResponse = await axios.post(
         aiServiceUrl,
         { image_base64: imageBase64 },
-        { timeout: 60000 } // Tăng timeout lên 60s cho xử lý ảnh nặng
+        // Tăng timeout lên 60s cho xử lý ảnh nặng; AI service hủy việc đang làm khi quá deadline
+        { timeout: 60000, headers: { "X-Request-Timeout": "60" } }
       );
       console.log("✅ [2/4] AI Service đã phản hồi");
     } catch (aiError) {
@@ -702,8 +704,12 @@ exports.analyzeImage = async (req, res) => {
     const aiResult = aiResponseData.data;
     console.log("📝 [3/4] AI Raw Data:", JSON.stringify(aiResult, null, 2));
 
+    // Gemini hết quota: AI service chỉ trả màu tính tại chỗ (partial) => kết quả hạn chế,
+    // không điền category/ghi chú rỗng và đánh dấu món đồ chưa được AI phân tích đầy đủ
+    const partial = aiResult.partial === true;
+
     // 1. Tìm Category (Single)
-    const category = await findBestMatch("category", aiResult.category);
+    const category = partial ? null : await findBestMatch("category", aiResult.category);
 
     // 2. Tìm Colors (Multiple)
     const colorIds = await findMultipleMatches("color", aiResult.color);
@@ -715,15 +721,23 @@ exports.analyzeImage = async (req, res) => {
     console.log(`   - Category ID: ${category?._id || "null"}`);
     console.log(`   - Color IDs: [${colorIds.join(", ")}]`);
     console.log(`   - Season IDs: [${seasonIds.join(", ")}]`);
+    if (partial) console.log("   ⚠️ Kết quả partial (AI hết quota, chỉ có màu)");
 
     res.json({
       success: true,
+      ...(partial && {
+        message: "AI đang quá tải, mới nhận diện được màu sắc. Vui lòng nhập các thông tin còn lại.",
+      }),
       data: {
         category_id: category?._id || "",
         color_id: colorIds, // Trả về mảng ID
         season_id: seasonIds, // Trả về mảng ID
         style_tags: aiResult.tags || [],
         notes: aiResult.notes || "",
+        partial,
+        // Lưu cùng món đồ: món chỉ có kết quả partial có thể được phân tích lại sau
+        ai_analyzed: !partial,
+        ai_features: partial ? { partial: true } : null,
         raw_ai: aiResult,
       },
     });
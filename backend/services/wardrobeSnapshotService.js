@@ -0,0 +1,81 @@
+const axios = require("axios");
+
+// userId -> { version, items: Map(itemId -> JSON của món đã gửi) }
+// AI Service giữ bản tủ đồ tương ứng, nên lần sau chỉ cần gửi phần thay đổi
+const sentWardrobes = new Map();
+const MAX_USERS = 5000;
+
+/**
+ * Tính phần thay đổi của tủ đồ so với lần gửi trước
+ */
+const diffWardrobe = (previous, wardrobe) => {
+  const added = [];
+  const changed = [];
+  const seen = new Set();
+
+  for (const item of wardrobe) {
+    const id = String(item.id);
+    seen.add(id);
+    const before = previous.get(id);
+    if (before === undefined) {
+      added.push(item);
+    } else if (before !== JSON.stringify(item)) {
+      changed.push(item);
+    }
+  }
+  const removed = [...previous.keys()].filter((id) => !seen.has(id));
+  return { added, changed, removed };
+};
+
+const remember = (userId, wardrobe, version) => {
+  sentWardrobes.delete(userId);
+  sentWardrobes.set(userId, {
+    version,
+    items: new Map(wardrobe.map((item) => [String(item.id), JSON.stringify(item)])),
+  });
+  // Map giữ thứ tự chèn => xóa user lâu không dùng nhất
+  if (sentWardrobes.size > MAX_USERS) {
+    sentWardrobes.delete(sentWardrobes.keys().next().value);
+  }
+};
+
+/**
+ * Gọi /suggest của AI Service với snapshot tủ đồ theo user:
+ * đã gửi trước đó thì chỉ gửi delta (added/changed/removed); AI Service trả về
+ * 409 snapshot_unknown (restart, bị dọn, lệch version) thì gửi lại toàn bộ.
+ */
+exports.postSuggest = async (aiServiceUrl, userId, payload, wardrobe) => {
+  const snapshotId = String(userId);
+  const items = wardrobe.map((item) => ({ ...item, id: String(item.id) }));
+  const previous = sentWardrobes.get(snapshotId);
+
+  if (previous) {
+    const delta = diffWardrobe(previous.items, items);
+    try {
+      const response = await axios.post(`${aiServiceUrl}/suggest`, {
+        ...payload,
+        snapshot_id: snapshotId,
+        wardrobe_delta: { base_version: previous.version, ...delta },
+      });
+      if (response.data.snapshot_version) {
+        remember(snapshotId, items, response.data.snapshot_version);
+      }
+      return response;
+    } catch (error) {
+      if (error.response?.status !== 409 || !error.response.data?.snapshot_unknown) {
+        throw error;
+      }
+      sentWardrobes.delete(snapshotId);
+    }
+  }
+
+  const response = await axios.post(`${aiServiceUrl}/suggest`, {
+    ...payload,
+    snapshot_id: snapshotId,
+    wardrobe: items,
+  });
+  if (response.data.snapshot_version) {
+    remember(snapshotId, items, response.data.snapshot_version);
+  }
+  return response;
+};
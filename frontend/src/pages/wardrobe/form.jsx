@@ -53,6 +53,8 @@ export default function ItemForm() {
     style_tags: [],
     notes: "",
     is_favorite: false,
+    ai_analyzed: false,
+    ai_features: null,
   });
 
   // Load item data nếu đang edit
@@ -139,10 +141,17 @@ export default function ItemForm() {
               ...new Set([...prev.style_tags, ...(aiData.style_tags || [])]),
             ],
             notes: aiData.notes || prev.notes,
+            ai_analyzed: aiData.ai_analyzed ?? true,
+            ai_features: aiData.ai_features ?? null,
           }));
 
-          // Thông báo thành công
-          showToast("AI đã phân tích xong! Vui lòng kiểm tra lại thông tin.", "success");
+          if (aiData.partial) {
+            // AI hết quota: chỉ có màu, các trường còn lại giữ nguyên để người dùng tự nhập
+            showToast(response.data.message || "AI mới nhận diện được màu sắc, vui lòng nhập các thông tin còn lại.", "warning");
+          } else {
+            // Thông báo thành công
+            showToast("AI đã phân tích xong! Vui lòng kiểm tra lại thông tin.", "success");
+          }
         } else {
           showToast("AI không nhận diện được, vui lòng nhập thủ công.", "warning");
         }
@@ -184,6 +193,8 @@ export default function ItemForm() {
           season_id: [],
           style_tags: [],
           notes: "",
+          ai_analyzed: false,
+          ai_features: null,
         }));
         setErrors((prev) => ({ ...prev, image_url: null }));
 
@@ -296,6 +307,11 @@ export default function ItemForm() {
         style_tags: formData.style_tags,
         notes: formData.notes || null,
         is_favorite: formData.is_favorite,
+        // Cờ AI chỉ gửi khi tạo mới (lúc sửa không phân tích lại ảnh)
+        ...(!id && {
+          ai_analyzed: formData.ai_analyzed,
+          ai_features: formData.ai_features,
+        }),
       };
 
       let result;
@@ -82,7 +82,9 @@ export const createWardrobeItem = async (itemData) => {
       additional_images: itemData.additional_images || [],
       style_tags: itemData.style_tags || [],
       notes: itemData.notes || "",
-      is_favorite: itemData.is_favorite || false
+      is_favorite: itemData.is_favorite || false,
+      ai_analyzed: itemData.ai_analyzed || false,
+      ai_features: itemData.ai_features || null
     };
 
     const response = await axios.post(API_URL, payload);